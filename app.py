@@ -15,6 +15,9 @@ load_dotenv()
 
 from main_flow import create_main_flow
 
+# Máximo de mensajes que se conservan para mostrar en pantalla
+MAX_DISPLAY_MESSAGES = 100
+
 # ═══════════════════════════════════════════════════════════════════
 # 🎨 CONFIGURACIÓN DE PÁGINA
 # ═══════════════════════════════════════════════════════════════════
@@ -149,6 +152,8 @@ if user_input:
                 "agent": result['agent_used'],
                 "confidence": result['confidence']
             })
+            # Acotar la memoria de la sesión (el historial del modelo lo compacta main_flow)
+            del st.session_state.messages[:-MAX_DISPLAY_MESSAGES]
             
             # Mostrar la respuesta del agente con mejor formato
             with chat_container:
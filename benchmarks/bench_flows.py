@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+📊 Benchmark de flujos - VetCare AI
+Reproduce conversaciones guionizadas (booking, RAG, saludo, escalación) contra
+main_flow_traditional y graph_flow usando modelos simulados locales, sin
+llamadas a OpenAI.
+
+Uso:
+    python benchmarks/bench_flows.py                      # ambos flujos, 4 sesiones
+    python benchmarks/bench_flows.py --flow traditional --sessions 16
+    python benchmarks/bench_flows.py --update-baseline    # guarda baseline.json
+"""
+
+import os
+import io
+import math
+import sys
+import json
+import uuid
+import random
+import atexit
+import shutil
+import tempfile
+import resource
+import argparse
+import contextlib
+from time import perf_counter
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+CONVERSATIONS_FILE = BENCH_DIR / "conversations.json"
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+
+# Variación relativa a partir de la cual se marca una regresión
+REGRESSION_THRESHOLD = 0.10
+
+# Métricas comparadas contra el baseline: True = más alto es peor
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "turns_per_sec": False,
+    "llm_calls_per_turn": True,
+    "cost_usd_per_1k_turns": True,
+    "peak_rss_mb": True,
+}
+
+
+# =======================================================
+# 📐 Utilidades
+# =======================================================
+
+def percentile(values: list, p: float) -> float:
+    """Percentil por rango más cercano."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss está en KB en Linux)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+
+def load_conversations(path: Path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# =======================================================
+# 🏃 Ejecución
+# =======================================================
+
+def make_session(flow_name: str):
+    """Crea una sesión nueva del flujo indicado (estado independiente)."""
+    if flow_name == "traditional":
+        from main_flow import main_flow_traditional
+        return main_flow_traditional()
+    from graph_flow import create_graph_session
+    return create_graph_session(uuid.uuid4().hex)
+
+
+def close_session(flow):
+    """Libera el estado de una sesión de graph_flow (registro y hilo del checkpointer)."""
+    session_id = getattr(flow, "session_id", None)
+    if session_id is not None:
+        from graph_flow import drop_session
+        drop_session(session_id)
+
+
+def run_conversation(flow, conversation: dict) -> list:
+    """Ejecuta una conversación completa y retorna las mediciones por turno."""
+    history = []
+    turns = []
+    for text in conversation["turns"]:
+        start = perf_counter()
+        error = None
+        agent = "error"
+        timings = {}
+        try:
+            result, history = flow(text, history)
+            agent = result["agent_used"]
+            timings = result.get("timings", {})
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        turns.append({
+            "conversation": conversation["name"],
+            "agent": agent,
+            "latency_ms": (perf_counter() - start) * 1000,
+            "llm_calls": timings.get("llm_calls", 0),
+            "input_tokens": timings.get("input_tokens", 0),
+            "cached_tokens": timings.get("cached_tokens", 0),
+            "cost_usd": timings.get("cost_usd", 0.0),
+            "error": error,
+        })
+    close_session(flow)
+    return turns
+
+
+def run_benchmark(flow_name: str, conversations: list, sessions: int, rounds: int, verbose: bool) -> dict:
+    """
+    Reproduce `rounds` veces cada conversación con `sessions` sesiones concurrentes.
+    La creación de sesiones (índice RAG incluido) queda fuera de la medición.
+    """
+    from fake_models import call_counts, reset_call_counts
+
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with sink:
+        jobs = [(make_session(flow_name), conv) for _ in range(rounds) for conv in conversations]
+
+        reset_call_counts()
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            results = list(pool.map(lambda job: run_conversation(*job), jobs))
+        elapsed = perf_counter() - start
+
+    turns = [t for conv_turns in results for t in conv_turns]
+    calls = call_counts()
+    latencies = [t["latency_ms"] for t in turns]
+    llm_calls = sum(v for k, v in calls.items() if k != "embedding")
+
+    input_tokens = sum(t["input_tokens"] for t in turns)
+    cached_tokens = sum(t["cached_tokens"] for t in turns)
+    cost_usd = sum(t["cost_usd"] for t in turns)
+
+    by_agent = defaultdict(list)
+    for t in turns:
+        by_agent[t["agent"]].append(t["latency_ms"])
+
+    return {
+        "flow": flow_name,
+        "sessions": sessions,
+        "turns": len(turns),
+        "errors": sum(1 for t in turns if t["error"]),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "turns_per_sec": round(len(turns) / elapsed, 3) if elapsed > 0 else 0.0,
+        "llm_calls_per_turn": round(llm_calls / len(turns), 3) if turns else 0.0,
+        "embedding_calls_per_turn": round(calls.get("embedding", 0) / len(turns), 3) if turns else 0.0,
+        "input_tokens_per_turn": round(input_tokens / len(turns), 1) if turns else 0.0,
+        # Fracción de tokens de prompt servidos desde la caché de prefijos del proveedor
+        "prompt_cache_hit_rate": round(cached_tokens / input_tokens, 4) if input_tokens else 0.0,
+        # Costo estimado con los precios de la política de modelos (model_policy.py)
+        "cost_usd_per_1k_turns": round(cost_usd / len(turns) * 1000, 4) if turns else 0.0,
+        "model_calls": calls,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "p50_ms_by_agent": {agent: round(percentile(v, 50), 2) for agent, v in by_agent.items()},
+        "sample_errors": [t["error"] for t in turns if t["error"]][:3],
+    }
+
+
+# =======================================================
+# 📋 Reporte y baseline
+# =======================================================
+
+def print_report(stats: dict):
+    print(f"\n=== {stats['flow']} ({stats['sessions']} sesiones concurrentes) ===")
+    print(f"Turnos: {stats['turns']}  Errores: {stats['errors']}")
+    print(f"Latencia p50/p95/p99: {stats['p50_ms']:.1f} / {stats['p95_ms']:.1f} / {stats['p99_ms']:.1f} ms")
+    print(f"Throughput: {stats['turns_per_sec']:.2f} turnos/s")
+    print(f"Llamadas LLM por turno: {stats['llm_calls_per_turn']:.2f}  "
+          f"Embeddings por turno: {stats['embedding_calls_per_turn']:.2f}")
+    print(f"Tokens de entrada por turno: {stats['input_tokens_per_turn']:.0f}  "
+          f"Prompt cache: {stats['prompt_cache_hit_rate']:.1%}")
+    print(f"Costo estimado: ${stats['cost_usd_per_1k_turns']:.4f} por 1000 turnos")
+    print(f"Pico RSS: {stats['peak_rss_mb']:.1f} MB")
+    print(f"p50 por agente: {stats['p50_ms_by_agent']}")
+    for error in stats["sample_errors"]:
+        print(f"   ⚠️ {error}")
+
+
+def compare_with_baseline(results: dict, baseline: dict) -> list:
+    """Compara contra el baseline y retorna la lista de regresiones detectadas."""
+    regressions = []
+    for flow_name, stats in results["flows"].items():
+        base = baseline.get("flows", {}).get(flow_name)
+        if base is None:
+            print(f"\n[BASELINE] Sin baseline para {flow_name}")
+            continue
+        if base.get("sessions") != stats["sessions"]:
+            print(f"\n[BASELINE] ⚠️ {flow_name}: baseline medido con {base.get('sessions')} sesiones")
+        print(f"\n[BASELINE] {flow_name}")
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            old, new = base.get(metric), stats[metric]
+            if not old:
+                continue
+            delta = (new - old) / old
+            worse = delta > REGRESSION_THRESHOLD if higher_is_worse else delta < -REGRESSION_THRESHOLD
+            flag = "❌ REGRESIÓN" if worse else "✅"
+            print(f"   {metric:<20} {old:>10.2f} → {new:>10.2f} ({delta:+.1%}) {flag}")
+            if worse:
+                regressions.append(f"{flow_name}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline de main_flow y graph_flow")
+    parser.add_argument("--flow", choices=["traditional", "graph", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=4, help="Sesiones concurrentes")
+    parser.add_argument("--rounds", type=int, default=2, help="Repeticiones de cada conversación")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Latencia simulada por llamada LLM")
+    parser.add_argument("--tokens-per-sec", type=float, default=80, help="Velocidad de generación simulada")
+    parser.add_argument("--embed-latency-ms", type=float, default=50, help="Latencia simulada de embeddings")
+    parser.add_argument("--conversations", type=Path, default=CONVERSATIONS_FILE)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="Guarda los resultados como baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Sale con código 1 si hay regresiones")
+    parser.add_argument("--output", type=Path, help="Archivo JSON con los resultados")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Muestra los logs de los agentes")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Ejecuta la rama probable en paralelo con el router (VETCARE_SPECULATION=1)")
+    parser.add_argument("--faq", action="store_true",
+                        help="Precalcula el FAQ store antes de medir y lo usa en el RAG")
+    args = parser.parse_args()
+
+    # Los modelos simulados se configuran por entorno antes de importar los agentes
+    os.environ["VETCARE_FAKE_MODELS"] = "1"
+    os.environ["VETCARE_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["VETCARE_FAKE_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+    os.environ["VETCARE_FAKE_EMBED_LATENCY_MS"] = str(args.embed_latency_ms)
+    if args.speculative:
+        os.environ["VETCARE_SPECULATION"] = "1"
+    # Sin --faq se mide el pipeline RAG completo (comparable con el baseline).
+    # Con --faq el store se genera antes de medir, en un archivo aparte: las
+    # respuestas simuladas nunca llegan a data/index
+    os.environ["VETCARE_FAQ"] = "1" if args.faq else "0"
+    os.environ["VETCARE_FAQ_AUTOBUILD"] = "0"
+    os.environ["VETCARE_FAQ_STORE"] = str(BENCH_DIR / ".faq_answers.json")
+    # Checkpoints de graph_flow en un archivo temporal, nunca en data/checkpoints.sqlite
+    checkpoint_dir = tempfile.mkdtemp(prefix="vetcare-bench-")
+    atexit.register(shutil.rmtree, checkpoint_dir, ignore_errors=True)
+    os.environ["VETCARE_CHECKPOINT_DB"] = str(Path(checkpoint_dir) / "checkpoints.sqlite")
+    random.seed(args.seed)
+
+    if args.faq:
+        from rag_agent import DOCS_DIR, build_rag
+        from faq_store import build_faq_store
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_faq_store(build_rag(use_faq=False), DOCS_DIR)
+
+    conversations = load_conversations(args.conversations)
+    flows = ["traditional", "graph"] if args.flow == "both" else [args.flow]
+
+    results = {
+        "config": {
+            "sessions": args.sessions,
+            "rounds": args.rounds,
+            "latency_ms": args.latency_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "embed_latency_ms": args.embed_latency_ms,
+            "faq": args.faq,
+        },
+        "flows": {},
+    }
+    for flow_name in flows:
+        stats = run_benchmark(flow_name, conversations, args.sessions, args.rounds, args.verbose)
+        results["flows"][flow_name] = stats
+        print_report(stats)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[INFO] Resultados guardados en {args.output}")
+
+    regressions = []
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[INFO] Baseline actualizado: {args.baseline}")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(results, baseline)
+
+    if regressions and args.fail_on_regression:
+        print(f"\n❌ Regresiones: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
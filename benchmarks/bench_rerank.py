@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+🥇 Benchmark de reranking - VetCare AI
+Compara, sobre el set de consultas etiquetadas (rag_queries.json), el
+contexto que llega al LLM con y sin reranker:
+
+    baseline   top-12 de FAISS (comportamiento anterior)
+    none       top-N de FAISS sin reordenar
+    lexical    top-N tras el reranker léxico
+    cross_encoder (si sentence-transformers está instalado)
+
+Reporta hit@N, MRR, tokens de contexto promedio (y su reducción frente al
+baseline) y latencia p50/p95 del reranker.
+
+Uso:
+    python benchmarks/bench_rerank.py --fake
+    python benchmarks/bench_rerank.py --rerankers none,lexical,cross_encoder --top-n 3
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import math
+import argparse
+import contextlib
+from time import perf_counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+QUERIES_FILE = BENCH_DIR / "rag_queries.json"
+BASELINE_K = 12
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower())
+
+
+def first_hit(docs: list, expected: list):
+    """Posición (1-based) del primer chunk que contiene algún texto esperado."""
+    for i, doc in enumerate(docs, start=1):
+        content = _normalize(doc.page_content)
+        if any(_normalize(e) in content for e in expected):
+            return i
+    return None
+
+
+def evaluate(name: str, labeled: list, candidates: list, select, count_tokens) -> dict:
+    """Aplica `select(query, docs)` a los candidatos de cada consulta y mide el contexto resultante."""
+    hits, reciprocal, tokens, latencies, sizes = 0, [], [], [], []
+    for item, docs in zip(labeled, candidates):
+        t0 = perf_counter()
+        chosen = select(item["query"], docs)
+        latencies.append((perf_counter() - t0) * 1000)
+        sizes.append(len(chosen))
+        rank = first_hit(chosen, item["expected"])
+        hits += rank is not None
+        reciprocal.append(1 / rank if rank else 0.0)
+        tokens.append(count_tokens("\n\n---\n\n".join(d.page_content for d in chosen)))
+    return {
+        "reranker": name,
+        "chunks": round(sum(sizes) / len(sizes), 1),
+        "hit": round(hits / len(labeled), 4),
+        "mrr": round(sum(reciprocal) / len(labeled), 4),
+        "context_tokens": round(sum(tokens) / len(tokens), 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del reranker del RAG")
+    parser.add_argument("--rerankers", type=lambda s: s.split(","), default=["none", "lexical", "cross_encoder"])
+    parser.add_argument("--retrieve-k", type=int, default=None, help="Candidatos de FAISS (default: VETCARE_RETRIEVE_K)")
+    parser.add_argument("--top-n", type=int, default=None, help="Chunks al prompt (default: VETCARE_CONTEXT_K)")
+    parser.add_argument("--labels", type=Path, default=QUERIES_FILE)
+    parser.add_argument("--fake", action="store_true", help="Usa embeddings simulados")
+    parser.add_argument("--output", type=Path, help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ["VETCARE_FAKE_MODELS"] = "1"
+        os.environ.setdefault("VETCARE_FAKE_EMBED_LATENCY_MS", "0")
+
+    from history_manager import count_tokens
+    from rag_agent import create_vectorstore
+    from vector_index import search_ids, get_documents
+    from reranker import RETRIEVE_K, CONTEXT_K, get_reranker
+
+    retrieve_k = args.retrieve_k or RETRIEVE_K
+    top_n = args.top_n or CONTEXT_K
+
+    with open(args.labels, encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        vectordb = create_vectorstore()
+
+    # Los candidatos se recuperan una vez; cada reranker ve exactamente los mismos
+    candidates = []
+    for item in labeled:
+        vector = vectordb.embedding_function.embed_query(item["query"])
+        candidates.append(get_documents(vectordb, search_ids(vectordb, vector, k=max(retrieve_k, BASELINE_K))))
+
+    rows = [evaluate(f"baseline k={BASELINE_K}", labeled, candidates,
+                     lambda q, docs: docs[:BASELINE_K], count_tokens)]
+    for name in args.rerankers:
+        with contextlib.redirect_stdout(io.StringIO()):
+            reranker = get_reranker(name)
+        if reranker.name != name:
+            print(f"[WARNING] Reranker {name} no disponible, se omite")
+            continue
+        rows.append(evaluate(name, labeled, [c[:retrieve_k] for c in candidates],
+                             lambda q, docs: reranker.rerank(q, docs, top_n=top_n), count_tokens))
+
+    baseline_tokens = rows[0]["context_tokens"] or 1
+    print(f"\n=== Reranking ({len(labeled)} consultas, {retrieve_k} candidatos → top {top_n}) ===")
+    print(f"   {'reranker':<16} {'chunks':>6} {'hit':>6} {'mrr':>6} {'ctx tokens':>11} {'ahorro':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        row["token_reduction"] = round(1 - row["context_tokens"] / baseline_tokens, 4)
+        print(f"   {row['reranker']:<16} {row['chunks']:>6} {row['hit']:>6.3f} {row['mrr']:>6.3f} "
+              f"{row['context_tokens']:>11.0f} {row['token_reduction']:>6.0%} {row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f}")
+
+    if args.output:
+        args.output.write_text(json.dumps({"retrieve_k": retrieve_k, "top_n": top_n, "results": rows},
+                                          indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[INFO] Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
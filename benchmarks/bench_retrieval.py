@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+🔎 Benchmark de recuperación - VetCare AI
+Mide cómo escala la búsqueda vectorial antes de crecer la base de conocimientos.
+
+Modo sintético (default): genera corpus de 10k–1M chunks con embeddings
+aleatorios fijos (mezcla de gaussianas, semilla fija) y compara el índice
+plano actual contra IVF, HNSW, IVF-PQ y SQ8: tiempo de construcción,
+tamaño del índice, memoria, latencia de consulta y recall@k frente a la
+búsqueda exacta.
+
+Modo real (--real): construye el vectorstore de data/info-mascotas y evalúa
+el set de consultas etiquetadas de rag_queries.json (hit@k y MRR).
+
+Uso:
+    python benchmarks/bench_retrieval.py --sizes 10000,100000
+    python benchmarks/bench_retrieval.py --sizes 1000000 --dim 512 --indexes flat,ivf_pq,hnsw
+    python benchmarks/bench_retrieval.py --real --fake
+"""
+
+import os
+import io
+import re
+import sys
+import json
+import math
+import argparse
+import tempfile
+import contextlib
+from time import perf_counter
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+QUERIES_FILE = BENCH_DIR / "rag_queries.json"
+
+# Dimensión de text-embedding-3-small
+DEFAULT_DIM = 1536
+
+
+# =======================================================
+# 📐 Utilidades
+# =======================================================
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def current_rss_mb() -> float:
+    """Memoria residente actual (Linux); 0 si no está disponible."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+def index_size_mb(index) -> float:
+    """Tamaño serializado del índice, escrito a disco para no duplicarlo en RAM."""
+    import faiss
+    with tempfile.NamedTemporaryFile(suffix=".faiss") as tmp:
+        faiss.write_index(index, tmp.name)
+        return os.path.getsize(tmp.name) / (1024 * 1024)
+
+
+# =======================================================
+# 🧬 Corpus sintético
+# =======================================================
+
+def synthetic_corpus(n: int, dim: int, seed: int, block: int = 100_000) -> np.ndarray:
+    """
+    Mezcla de gaussianas: los embeddings reales forman clusters por tema, por lo
+    que vectores uniformes subestimarían el recall de los índices aproximados.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(16, n // 500)
+    centroids = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    data = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, block):
+        end = min(n, start + block)
+        labels = rng.integers(0, n_clusters, end - start)
+        data[start:end] = centroids[labels] + 0.6 * rng.standard_normal((end - start, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data
+
+
+def synthetic_queries(corpus: np.ndarray, nq: int, seed: int) -> np.ndarray:
+    """Consultas = chunks del corpus con ruido (parecidas pero no idénticas)."""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(len(corpus), nq, replace=False)
+    queries = corpus[picks] + 0.05 * rng.standard_normal((nq, corpus.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype(np.float32)
+
+
+# =======================================================
+# 🗂️ Tipos de índice
+# =======================================================
+
+def factory_string(index_type: str, n: int, dim: int) -> str:
+    nlist = max(16, int(4 * math.sqrt(n)))
+    pq_m = max(8, dim // 16)
+    while dim % pq_m:
+        pq_m -= 1
+    return {
+        "flat": "Flat",
+        "sq8": "SQ8",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "hnsw": "HNSW32",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m}",
+    }[index_type]
+
+
+def build_index(index_type: str, corpus: np.ndarray, nprobe: int, ef_search: int):
+    import faiss
+    n, dim = corpus.shape
+    index = faiss.index_factory(dim, factory_string(index_type, n, dim))
+    if not index.is_trained:
+        train_size = min(n, max(100_000, 64 * int(4 * math.sqrt(n))))
+        index.train(corpus[:train_size])
+    index.add(corpus)
+
+    params = faiss.ParameterSpace()
+    if index_type.startswith("ivf"):
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if index_type == "hnsw":
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+
+def recall_at_k(approx: np.ndarray, exact: np.ndarray, k: int) -> float:
+    hits = sum(len(set(a[:k]) & set(e[:k])) for a, e in zip(approx, exact))
+    return hits / (len(exact) * k)
+
+
+def bench_synthetic(args) -> list:
+    import faiss
+    rows = []
+    for n in args.sizes:
+        print(f"\n[INFO] Generando corpus sintético: {n:,} chunks x {args.dim} dims")
+        corpus = synthetic_corpus(n, args.dim, args.seed)
+        queries = synthetic_queries(corpus, args.queries, args.seed)
+
+        exact_index = faiss.IndexFlatL2(args.dim)
+        exact_index.add(corpus)
+        _, ground_truth = exact_index.search(queries, args.k)
+        del exact_index
+
+        for index_type in args.indexes:
+            rss_before = current_rss_mb()
+            start = perf_counter()
+            index = build_index(index_type, corpus, args.nprobe, args.ef_search)
+            build_s = perf_counter() - start
+            rss_delta = current_rss_mb() - rss_before
+
+            latencies = []
+            for q in queries:
+                t0 = perf_counter()
+                index.search(q.reshape(1, -1), args.k)
+                latencies.append((perf_counter() - t0) * 1000)
+
+            t0 = perf_counter()
+            _, approx = index.search(queries, args.k)
+            batch_qps = len(queries) / (perf_counter() - t0)
+
+            row = {
+                "chunks": n,
+                "index": index_type,
+                "factory": factory_string(index_type, n, args.dim),
+                "build_s": round(build_s, 3),
+                "index_mb": round(index_size_mb(index), 1),
+                "rss_delta_mb": round(rss_delta, 1),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p95_ms": round(percentile(latencies, 95), 3),
+                "batch_qps": round(batch_qps, 1),
+                f"recall@{args.k}": round(recall_at_k(approx, ground_truth, args.k), 4),
+            }
+            rows.append(row)
+            print_row(row, args.k)
+            del index
+        del corpus
+    return rows
+
+
+def print_row(row: dict, k: int):
+    print(f"   {row['index']:<9} build {row['build_s']:>8.2f}s  index {row['index_mb']:>9.1f} MB  "
+          f"rss +{row['rss_delta_mb']:>8.1f} MB  p50 {row['p50_ms']:>7.3f} ms  p95 {row['p95_ms']:>7.3f} ms  "
+          f"{row['batch_qps']:>9.0f} qps  recall@{k} {row[f'recall@{k}']:.3f}")
+
+
+# =======================================================
+# 📚 Corpus real con consultas etiquetadas
+# =======================================================
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower())
+
+
+def bench_real(args) -> dict:
+    """Evalúa hit@k y MRR del vectorstore real sobre rag_queries.json."""
+    if args.fake:
+        os.environ["VETCARE_FAKE_MODELS"] = "1"
+        os.environ.setdefault("VETCARE_FAKE_EMBED_LATENCY_MS", "0")
+    from rag_agent import create_vectorstore
+
+    with open(args.labels, encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = perf_counter()
+        vectordb = create_vectorstore()
+        build_s = perf_counter() - start
+
+    hits, reciprocal_ranks, latencies = 0, [], []
+    for item in labeled:
+        t0 = perf_counter()
+        docs = vectordb.similarity_search(item["query"], k=args.k)
+        latencies.append((perf_counter() - t0) * 1000)
+
+        rank = None
+        for i, doc in enumerate(docs, start=1):
+            content = _normalize(doc.page_content)
+            if any(_normalize(e) in content for e in item["expected"]):
+                rank = i
+                break
+        if rank is not None:
+            hits += 1
+            reciprocal_ranks.append(1 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+            print(f"   ❌ Sin acierto en top-{args.k}: {item['query']}")
+
+    result = {
+        "chunks": vectordb.index.ntotal,
+        "queries": len(labeled),
+        "build_s": round(build_s, 3),
+        f"hit@{args.k}": round(hits / len(labeled), 4),
+        "mrr": round(sum(reciprocal_ranks) / len(labeled), 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+    }
+    print(f"\n=== Corpus real ({result['chunks']} chunks, {result['queries']} consultas) ===")
+    for key, value in result.items():
+        print(f"   {key:<10} {value}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación vectorial")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--indexes", type=lambda s: s.split(","), default=["flat", "sq8", "ivf_flat", "hnsw", "ivf_pq"])
+    parser.add_argument("--queries", type=int, default=200, help="Consultas sintéticas")
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--real", action="store_true", help="Evalúa el corpus real con consultas etiquetadas")
+    parser.add_argument("--labels", type=Path, default=QUERIES_FILE)
+    parser.add_argument("--fake", action="store_true", help="Usa embeddings simulados en modo --real")
+    parser.add_argument("--output", type=Path, help="Archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    results = {"k": args.k}
+    if args.real:
+        results["real"] = bench_real(args)
+    else:
+        results["synthetic"] = bench_synthetic(args)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[INFO] Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+🔥 Load test - VetCare AI
+Genera carga con sesiones que llegan en el tiempo (proceso de Poisson o log
+reproducido), con pausas de "pensar" entre turnos y un máximo de sesiones
+activas, contra el flujo en este proceso (create_main_flow / sesión de
+LangGraph, con modelos simulados) o contra un servidor (src/server.py).
+
+A diferencia de bench_flows.py (ráfaga de conversaciones guionizadas), aquí
+interesa el comportamiento sostenido: throughput, histogramas de latencia por
+agente, tasa de errores y la memoria a lo largo del tiempo, para detectar
+fugas (historial sin acotar, sesiones que no se liberan) y el punto de
+saturación antes de desplegar.
+
+Fuentes de tráfico:
+    - sintético: guiones de conversations.json encadenados hasta
+      --session-turns turnos, llegadas Poisson (--arrival-rate) y pausas
+      exponenciales (--think-time)
+    - --replay log.jsonl: log anonimizado, una línea por mensaje de usuario
+      {"session": "a1", "t": 12.5, "message": "Hola"} (t en segundos o ISO 8601)
+
+Uso:
+    python benchmarks/load_test.py --arrival-rate 2 --duration 120 --think-time 3
+    python benchmarks/load_test.py --session-turns 60 --sessions 20 --think-time 0.5   # fugas de historial
+    python benchmarks/load_test.py --replay logs.jsonl --time-scale 0.1 --concurrency 64
+    python benchmarks/load_test.py --target http://127.0.0.1:8000 --arrival-rate 5 --server-pid 1234
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+import contextlib
+import tracemalloc
+from time import perf_counter
+from pathlib import Path
+from datetime import datetime
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+from bench_flows import CONVERSATIONS_FILE, load_conversations, percentile, peak_rss_mb
+
+# Respuestas degradadas: el flujo capturó un error y respondió igual
+DEGRADED_PREFIXES = ("Error en RAG", "Error al procesar")
+# Fracción inicial de las muestras que no entra en la pendiente de memoria (cachés llenándose)
+WARMUP_FRACTION = 0.2
+# Turnos (1-based) en los que se reporta el tamaño del historial
+HISTORY_CHECKPOINTS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+# =======================================================
+# 📜 Carga de trabajo
+# =======================================================
+
+def parse_time(value) -> float:
+    """Segundos desde un número o un timestamp ISO 8601."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def load_replay(path: Path) -> list:
+    """
+    Sesiones de un log JSONL anonimizado. La llegada de cada sesión es su
+    primer mensaje y las pausas son la diferencia entre mensajes consecutivos
+    (incluyen la latencia de la respuesta original).
+    """
+    by_session = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                by_session[str(record["session"])].append((parse_time(record["t"]), record["message"]))
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{path}:{line_no}: registro inválido ({e})")
+    if not by_session:
+        raise ValueError(f"{path}: sin mensajes")
+
+    for messages in by_session.values():
+        messages.sort(key=lambda m: m[0])
+    origin = min(messages[0][0] for messages in by_session.values())
+
+    sessions = []
+    for name, messages in by_session.items():
+        times = [t for t, _ in messages]
+        sessions.append({
+            "name": name,
+            "arrival": times[0] - origin,
+            "turns": [message for _, message in messages],
+            "think": [b - a for a, b in zip(times, times[1:])],
+        })
+    return sorted(sessions, key=lambda s: s["arrival"])
+
+
+def synthetic_sessions(conversations: list, arrival_rate: float, max_sessions: float, duration: float,
+                       think_time: float, session_turns: int, rng: random.Random) -> list:
+    """
+    Sesiones sintéticas con llegadas Poisson (`arrival_rate` por segundo; 0 =
+    todas al inicio) hasta `max_sessions` sesiones o `duration` segundos. Cada
+    sesión encadena guiones al azar hasta tener `session_turns` turnos.
+    """
+    sessions = []
+    clock = 0.0
+    while len(sessions) < max_sessions:
+        if arrival_rate > 0:
+            clock += rng.expovariate(arrival_rate)
+        if duration and clock > duration:
+            break
+        scripts = [rng.choice(conversations)]
+        while sum(len(c["turns"]) for c in scripts) < session_turns:
+            scripts.append(rng.choice(conversations))
+        turns = [text for c in scripts for text in c["turns"]]
+        sessions.append({
+            "name": "+".join(c["name"] for c in scripts),
+            "arrival": clock,
+            "turns": turns,
+            "think": [rng.expovariate(1 / think_time) if think_time > 0 else 0.0 for _ in turns[1:]],
+        })
+    return sessions
+
+
+def save_workload(sessions: list, path: Path):
+    """Guarda la carga generada en formato de replay (para repetir exactamente la misma corrida)."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i, session in enumerate(sessions):
+            t = session["arrival"]
+            for j, message in enumerate(session["turns"]):
+                if j:
+                    t += session["think"][j - 1]
+                record = {"session": f"{i}-{session['name']}", "t": round(t, 3), "message": message}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# =======================================================
+# 🎯 Targets
+# =======================================================
+
+class TurnFailed(Exception):
+    """El target respondió con error (p. ej. HTTP 503 por cola llena)."""
+
+    def __init__(self, kind: str, detail: str = ""):
+        super().__init__(detail or kind)
+        self.kind = kind
+
+
+class InProcessTarget:
+    """Flujos creados en este proceso, uno por sesión, como los crea el servidor."""
+
+    tracks_history = True
+
+    def __init__(self, orchestrator: str):
+        self.orchestrator = orchestrator
+
+    def warm_up(self):
+        """Carga el índice RAG antes de medir (no cuenta como crecimiento de memoria)."""
+        from rag_agent import create_vectorstore
+        create_vectorstore()
+
+    def open(self) -> dict:
+        session_id = uuid.uuid4().hex
+        if self.orchestrator == "graph":
+            from graph_flow import create_graph_session
+            flow = create_graph_session(session_id)
+        else:
+            from main_flow import create_main_flow
+            flow = create_main_flow()
+        return {"id": session_id, "flow": flow, "history": []}
+
+    def turn(self, session: dict, message: str) -> dict:
+        result, session["history"] = session["flow"](message, session["history"])
+        return result
+
+    def close(self, session: dict):
+        if self.orchestrator == "graph":
+            from graph_flow import drop_session
+            drop_session(session["id"])
+
+
+class HTTPTarget:
+    """Servidor de src/server.py: POST /sessions, POST /chat y DELETE /sessions/{id}."""
+
+    tracks_history = False
+
+    def __init__(self, base_url: str, timeout: float):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def warm_up(self):
+        response = self.requests.get(f"{self.base_url}/health", timeout=self.timeout)
+        response.raise_for_status()
+        print(f"[INFO] Servidor: {response.json()}")
+
+    def open(self) -> dict:
+        client = self.requests.Session()
+        response = client.post(f"{self.base_url}/sessions", timeout=self.timeout)
+        if response.status_code != 200:
+            client.close()
+            raise TurnFailed(f"http_{response.status_code}", response.text[:200])
+        return {"id": response.json()["session_id"], "client": client}
+
+    def turn(self, session: dict, message: str) -> dict:
+        response = session["client"].post(f"{self.base_url}/chat", timeout=self.timeout,
+                                          json={"message": message, "session_id": session["id"]})
+        if response.status_code != 200:
+            raise TurnFailed(f"http_{response.status_code}", response.text[:200])
+        return response.json()
+
+    def close(self, session: dict):
+        try:
+            session["client"].delete(f"{self.base_url}/sessions/{session['id']}", timeout=self.timeout)
+        finally:
+            session["client"].close()
+
+
+# =======================================================
+# 🧠 Memoria
+# =======================================================
+
+def rss_mb(pid: int = None):
+    """Memoria residente actual (Linux, /proc). Sin /proc: pico del proceso propio o None."""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None if pid else peak_rss_mb()
+
+
+def growth_per_minute(samples: list, key: str) -> float:
+    """Pendiente (mínimos cuadrados) de `key` en MB/min, sin el calentamiento inicial."""
+    points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    points = points[int(len(points) * WARMUP_FRACTION):]
+    if len(points) < 3:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / var * 60
+
+
+# =======================================================
+# 🏃 Ejecución
+# =======================================================
+
+class LoadRun:
+    """Estado compartido de una corrida: turnos medidos, sesiones activas y muestras."""
+
+    def __init__(self, target, keep_sessions: bool, time_scale: float, server_pid: int = None):
+        self.target = target
+        self.keep_sessions = keep_sessions
+        self.time_scale = time_scale
+        self.server_pid = server_pid
+        self.lock = threading.Lock()
+        self.turns = []
+        self.samples = []
+        self.start_delays = []
+        self.retained = []
+        self.submitted = 0
+        self.started = 0
+        self.active = 0
+        self.finished = 0
+        self.open_errors = Counter()
+        self.start = perf_counter()
+
+    def run_session(self, spec: dict, scheduled_at: float):
+        with self.lock:
+            self.started += 1
+            self.active += 1
+            # Demora por falta de capacidad (--concurrency)
+            self.start_delays.append((perf_counter() - scheduled_at) * 1000)
+        try:
+            try:
+                session = self.target.open()
+            except Exception as e:
+                with self.lock:
+                    self.open_errors[getattr(e, "kind", type(e).__name__)] += 1
+                return
+            for index, message in enumerate(spec["turns"]):
+                if index:
+                    time.sleep(spec["think"][index - 1] * self.time_scale)
+                self.run_turn(session, message, index + 1)
+            if self.keep_sessions:
+                # Como clientes que se van sin cerrar la sesión
+                self.retained.append(session)
+            else:
+                with contextlib.suppress(Exception):
+                    self.target.close(session)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.finished += 1
+
+    def run_turn(self, session: dict, message: str, index: int):
+        start = perf_counter()
+        agent, error, detail, degraded = "error", None, None, False
+        try:
+            result = self.target.turn(session, message)
+            agent = result.get("agent_used") or "unknown"
+            degraded = (str(result.get("response", "")).startswith(DEGRADED_PREFIXES)
+                        or str(result.get("reason", "")).startswith("Error"))
+        except TurnFailed as e:
+            error, detail = e.kind, f"{e.kind}: {e}"
+        except Exception as e:
+            error = type(e).__name__
+            detail = f"{error}: {e}"
+        end = perf_counter()
+
+        record = {
+            "t": end - self.start,
+            "index": index,
+            "agent": agent,
+            "latency_ms": (end - start) * 1000,
+            "error": error,
+            "degraded": degraded,
+        }
+        if detail:
+            record["detail"] = detail
+        if self.target.tracks_history:
+            history = session.get("history") or []
+            record["history_msgs"] = len(history)
+            record["history_chars"] = sum(len(str(getattr(m, "content", ""))) for m in history)
+        with self.lock:
+            self.turns.append(record)
+
+    def take_sample(self) -> dict:
+        with self.lock:
+            sample = {
+                "t": round(perf_counter() - self.start, 3),
+                "active_sessions": self.active,
+                "waiting_sessions": self.submitted - self.started,
+                "finished_sessions": self.finished,
+                "turns": len(self.turns),
+                "errors": sum(1 for t in self.turns if t["error"]),
+            }
+        sample["rss_mb"] = rss_mb()
+        if self.server_pid:
+            sample["server_rss_mb"] = rss_mb(self.server_pid)
+        self.samples.append(sample)
+        return sample
+
+
+def run_load(target, sessions: list, concurrency: int, time_scale: float, sample_interval: float,
+             keep_sessions: bool = False, server_pid: int = None) -> LoadRun:
+    """
+    Lanza cada sesión en su instante de llegada (escalado por `time_scale`)
+    sobre un pool de `concurrency` sesiones activas; las que no caben esperan
+    y esa espera se reporta aparte. Muestrea memoria y progreso cada
+    `sample_interval` segundos.
+    """
+    run = LoadRun(target, keep_sessions, time_scale, server_pid)
+    stop = threading.Event()
+
+    def sampler():
+        while not stop.wait(sample_interval):
+            s = run.take_sample()
+            rss = f"{s['rss_mb']:.0f} MB" if s["rss_mb"] is not None else "n/d"
+            print(f"[LOAD] t={s['t']:>7.1f}s activas={s['active_sessions']:>4} "
+                  f"en espera={s['waiting_sessions']:>4} turnos={s['turns']:>6} "
+                  f"errores={s['errors']:>4} rss={rss}", file=sys.stderr)
+
+    run.take_sample()
+    sampler_thread = threading.Thread(target=sampler, name="load-sampler", daemon=True)
+    sampler_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="session") as pool:
+            for spec in sessions:
+                scheduled_at = run.start + spec["arrival"] * time_scale
+                wait = scheduled_at - perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                with run.lock:
+                    run.submitted += 1
+                pool.submit(run.run_session, spec, scheduled_at)
+    finally:
+        stop.set()
+        sampler_thread.join()
+        run.take_sample()
+    return run
+
+
+# =======================================================
+# 📋 Reporte
+# =======================================================
+
+def latency_histogram(latencies_ms: list) -> dict:
+    """Conteo por bucket (no acumulado) con los mismos límites que las métricas de tracing."""
+    from tracing import DURATION_BUCKETS
+
+    counts = Counter()
+    for value in latencies_ms:
+        seconds = value / 1000
+        label = next((f"<={bound:g}s" for bound in DURATION_BUCKETS if seconds <= bound), "+Inf")
+        counts[label] += 1
+    labels = [f"<={bound:g}s" for bound in DURATION_BUCKETS] + ["+Inf"]
+    return {label: counts[label] for label in labels if counts[label]}
+
+
+def latency_stats(latencies_ms: list) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms, default=0.0), 2),
+    }
+
+
+def history_by_turn(turns: list) -> dict:
+    """Tamaño medio del historial tras el turno N: debe estabilizarse si la compactación funciona."""
+    by_index = defaultdict(list)
+    for t in turns:
+        if "history_msgs" in t and t["index"] in HISTORY_CHECKPOINTS:
+            by_index[t["index"]].append(t)
+    return {
+        index: {
+            "msgs": round(sum(t["history_msgs"] for t in values) / len(values), 1),
+            "chars": round(sum(t["history_chars"] for t in values) / len(values)),
+        }
+        for index, values in sorted(by_index.items())
+    }
+
+
+def summarize(run: LoadRun, sessions: list, elapsed: float) -> dict:
+    turns = run.turns
+    latencies = [t["latency_ms"] for t in turns]
+    errors = [t for t in turns if t["error"]]
+
+    by_agent = defaultdict(list)
+    for t in turns:
+        by_agent[t["agent"]].append(t)
+
+    # Throughput por ventana de muestreo
+    timeline = []
+    for prev, cur in zip(run.samples, run.samples[1:]):
+        window = cur["t"] - prev["t"]
+        timeline.append({
+            **cur,
+            "turns_per_sec": round((cur["turns"] - prev["turns"]) / window, 3) if window > 0 else 0.0,
+            "window_errors": cur["errors"] - prev["errors"],
+        })
+
+    rss_values = [s["rss_mb"] for s in run.samples if s["rss_mb"] is not None]
+    server_rss = [s["server_rss_mb"] for s in run.samples if s.get("server_rss_mb") is not None]
+    return {
+        "sessions": len(sessions),
+        "sessions_failed_to_open": sum(run.open_errors.values()),
+        "turns": len(turns),
+        "duration_s": round(elapsed, 2),
+        "turns_per_sec": round(len(turns) / elapsed, 3) if elapsed > 0 else 0.0,
+        "error_rate": round(len(errors) / len(turns), 4) if turns else 0.0,
+        "degraded_rate": round(sum(t["degraded"] for t in turns) / len(turns), 4) if turns else 0.0,
+        "errors_by_kind": dict(Counter(t["error"] for t in errors) + run.open_errors),
+        "sample_errors": [t["detail"] for t in errors if "detail" in t][:3],
+        **latency_stats(latencies),
+        "start_delay_p95_ms": round(percentile(run.start_delays, 95), 2),
+        "by_agent": {
+            agent: {
+                "turns": len(values),
+                "errors": sum(1 for t in values if t["error"]),
+                **latency_stats([t["latency_ms"] for t in values]),
+                "histogram": latency_histogram([t["latency_ms"] for t in values]),
+            }
+            for agent, values in sorted(by_agent.items())
+        },
+        "rss_start_mb": round(rss_values[0], 1) if rss_values else None,
+        "rss_end_mb": round(rss_values[-1], 1) if rss_values else None,
+        "rss_growth_mb_per_min": round(growth_per_minute(run.samples, "rss_mb"), 2),
+        "server_rss_growth_mb_per_min": round(growth_per_minute(run.samples, "server_rss_mb"), 2) if server_rss else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "history_by_turn": history_by_turn(turns),
+        "timeline": timeline,
+    }
+
+
+def print_report(stats: dict, max_rows: int = 20):
+    print(f"\n=== Load test: {stats['sessions']} sesiones, {stats['turns']} turnos en {stats['duration_s']:.1f}s ===")
+    print(f"Throughput: {stats['turns_per_sec']:.2f} turnos/s")
+    print(f"Latencia p50/p95/p99: {stats['p50_ms']:.1f} / {stats['p95_ms']:.1f} / {stats['p99_ms']:.1f} ms  "
+          f"(espera por capacidad p95: {stats['start_delay_p95_ms']:.0f} ms)")
+    print(f"Errores: {stats['error_rate']:.2%} {stats['errors_by_kind'] or ''}  "
+          f"Respuestas degradadas: {stats['degraded_rate']:.2%}")
+    for error in stats["sample_errors"]:
+        print(f"   ⚠️ {error}")
+
+    print("\nLatencia por agente:")
+    for agent, agent_stats in stats["by_agent"].items():
+        print(f"   {agent:<14} n={agent_stats['turns']:<6} p50={agent_stats['p50_ms']:>8.1f}  "
+              f"p95={agent_stats['p95_ms']:>8.1f}  p99={agent_stats['p99_ms']:>8.1f} ms  "
+              f"errores={agent_stats['errors']}")
+        top = max(agent_stats["histogram"].values(), default=1)
+        for label, count in agent_stats["histogram"].items():
+            print(f"      {label:>8} {'█' * max(1, round(count / top * 30))} {count}")
+
+    print(f"\nMemoria: {stats['rss_start_mb']} → {stats['rss_end_mb']} MB "
+          f"({stats['rss_growth_mb_per_min']:+.2f} MB/min tras el calentamiento)")
+    if stats["server_rss_growth_mb_per_min"] is not None:
+        print(f"Memoria del servidor: {stats['server_rss_growth_mb_per_min']:+.2f} MB/min")
+    if stats["history_by_turn"]:
+        sizes = "  ".join(f"#{index}: {h['msgs']} msgs/{h['chars']} chars"
+                          for index, h in stats["history_by_turn"].items())
+        print(f"Historial tras el turno {sizes}")
+
+    timeline = stats["timeline"]
+    if timeline:
+        print("\n     t(s)  activas  espera  turnos/s  errores   rss(MB)")
+        step = max(1, math.ceil(len(timeline) / max_rows))
+        for s in timeline[::step]:
+            rss = f"{s['rss_mb']:.0f}" if s["rss_mb"] is not None else "n/d"
+            print(f"   {s['t']:>6.1f}  {s['active_sessions']:>7}  {s['waiting_sessions']:>6}  "
+                  f"{s['turns_per_sec']:>8.2f}  {s['window_errors']:>7}  {rss:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test de VetCare AI con tráfico sintético o reproducido")
+    parser.add_argument("--target", default="inprocess",
+                        help="'inprocess' o la URL de src/server.py (p. ej. http://127.0.0.1:8000)")
+    parser.add_argument("--orchestrator", choices=["traditional", "graph"], default="traditional",
+                        help="Flujo en proceso (con --target URL lo decide el servidor)")
+    parser.add_argument("--replay", type=Path, help="Log JSONL anonimizado a reproducir")
+    parser.add_argument("--conversations", type=Path, default=CONVERSATIONS_FILE,
+                        help="Guiones para el tráfico sintético")
+    parser.add_argument("--sessions", type=int, help="Sesiones sintéticas (por defecto 50 sin --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Segundos de llegadas sintéticas")
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="Sesiones nuevas por segundo (0 = todas juntas)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="Pausa media entre turnos (s)")
+    parser.add_argument("--session-turns", type=int, default=0,
+                        help="Turnos mínimos por sesión sintética (encadena guiones)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Escala de llegadas y pausas (0.1 = 10x más rápido)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Máximo de sesiones activas a la vez")
+    parser.add_argument("--no-close", action="store_true",
+                        help="No cierra las sesiones al terminar (clientes que se van sin DELETE)")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="Segundos entre muestras de memoria")
+    parser.add_argument("--server-pid", type=int, help="PID del servidor para muestrear su memoria (HTTP)")
+    parser.add_argument("--timeout", type=float, default=60, help="Timeout por request HTTP (s)")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Reporta las líneas de código con más memoria nueva (en proceso)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="Latencia simulada por llamada LLM")
+    parser.add_argument("--tokens-per-sec", type=float, default=80, help="Velocidad de generación simulada")
+    parser.add_argument("--embed-latency-ms", type=float, default=50, help="Latencia simulada de embeddings")
+    parser.add_argument("--save-workload", type=Path, help="Guarda la carga generada como log de replay")
+    parser.add_argument("--output", type=Path, help="Archivo JSON con los resultados")
+    parser.add_argument("--max-error-rate", type=float, help="Sale con código 1 si la tasa de errores la supera")
+    parser.add_argument("--max-growth-mb-min", type=float,
+                        help="Sale con código 1 si la memoria crece más que esto (MB/min)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Muestra los logs de los agentes")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    if args.replay:
+        sessions = load_replay(args.replay)
+    else:
+        max_sessions = args.sessions or (math.inf if args.duration and args.arrival_rate > 0 else 50)
+        sessions = synthetic_sessions(load_conversations(args.conversations), args.arrival_rate, max_sessions,
+                                      args.duration, args.think_time, args.session_turns, rng)
+    if not sessions:
+        parser.error("La carga no tiene sesiones")
+    if args.save_workload:
+        save_workload(sessions, args.save_workload)
+        print(f"[INFO] Carga guardada en {args.save_workload}")
+
+    if args.target == "inprocess":
+        # Los modelos simulados se configuran por entorno antes de importar los agentes
+        os.environ["VETCARE_FAKE_MODELS"] = "1"
+        os.environ["VETCARE_FAKE_LATENCY_MS"] = str(args.latency_ms)
+        os.environ["VETCARE_FAKE_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+        os.environ["VETCARE_FAKE_EMBED_LATENCY_MS"] = str(args.embed_latency_ms)
+        # Las respuestas simuladas nunca deben terminar en el FAQ store de data/index
+        os.environ["VETCARE_FAQ"] = "0"
+        os.environ["VETCARE_FAQ_AUTOBUILD"] = "0"
+        # Checkpoints de graph_flow en un archivo temporal, nunca en data/checkpoints.sqlite
+        checkpoint_dir = tempfile.mkdtemp(prefix="vetcare-load-")
+        atexit.register(shutil.rmtree, checkpoint_dir, ignore_errors=True)
+        os.environ["VETCARE_CHECKPOINT_DB"] = str(Path(checkpoint_dir) / "checkpoints.sqlite")
+        target = InProcessTarget(args.orchestrator)
+    else:
+        print("[INFO] Target HTTP: inicie el servidor con VETCARE_FAKE_MODELS=1 "
+              "(o apuntando a fake_openai_server.py) para no llamar a OpenAI")
+        target = HTTPTarget(args.target, args.timeout)
+
+    turns_total = sum(len(s["turns"]) for s in sessions)
+    print(f"[INFO] {len(sessions)} sesiones, {turns_total} turnos, "
+          f"última llegada a los {sessions[-1]['arrival'] * args.time_scale:.1f}s")
+
+    # Los logs de los agentes van a /dev/null (un StringIO crecería y falsearía la memoria)
+    with open(os.devnull, "w") as devnull:
+        sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with sink:
+            target.warm_up()
+            if args.tracemalloc:
+                tracemalloc.start()
+                before = tracemalloc.take_snapshot()
+            start = perf_counter()
+            run = run_load(target, sessions, args.concurrency, args.time_scale, args.sample_interval,
+                           keep_sessions=args.no_close, server_pid=args.server_pid)
+            elapsed = perf_counter() - start
+            if args.tracemalloc:
+                growth = tracemalloc.take_snapshot().compare_to(before, "lineno")[:10]
+                tracemalloc.stop()
+
+    stats = summarize(run, sessions, elapsed)
+    stats["config"] = {
+        "target": args.target,
+        "orchestrator": args.orchestrator if args.target == "inprocess" else None,
+        "replay": str(args.replay) if args.replay else None,
+        "arrival_rate": None if args.replay else args.arrival_rate,
+        "think_time": None if args.replay else args.think_time,
+        "session_turns": args.session_turns,
+        "time_scale": args.time_scale,
+        "concurrency": args.concurrency,
+        "keep_sessions": args.no_close,
+        "latency_ms": args.latency_ms,
+        "seed": args.seed,
+    }
+    if args.tracemalloc:
+        stats["tracemalloc_top"] = [str(stat) for stat in growth]
+    print_report(stats)
+    for line in stats.get("tracemalloc_top", []):
+        print(f"   📈 {line}")
+
+    if args.output:
+        args.output.write_text(json.dumps(stats, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"\n[INFO] Resultados guardados en {args.output}")
+
+    failures = []
+    if args.max_error_rate is not None and stats["error_rate"] > args.max_error_rate:
+        failures.append(f"tasa de errores {stats['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.max_growth_mb_min is not None:
+        for key in ("rss_growth_mb_per_min", "server_rss_growth_mb_per_min"):
+            if stats[key] is not None and stats[key] > args.max_growth_mb_min:
+                failures.append(f"{key} {stats[key]:+.2f} > {args.max_growth_mb_min}")
+    if failures:
+        print(f"\n❌ {'; '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,17 @@ import json
 import random
 import re
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from model_policy import get_stage_llm
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.tools import tool
 
+from history_manager import create_history_manager, serialize_messages, deserialize_messages
+from state_backends import get_ledger
+from conversation_state import is_booking_confirmed
+from rate_limiter import priority
+from tracing import span, record_usage
+
 load_dotenv()
 
 # =======================================================
@@ -59,16 +65,16 @@ def request_human_agent_tool(nombre: str, telefono: str, email: str = "sin email
 # =======================================================
 # 🤖 Crear Agente con LangChain + Tool Calling + Memoria
 # =======================================================
-def create_agente_agendamiento():
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-    
-    # Vincular herramientas al LLM
+def create_agente_agendamiento(session_id: str = None):
+    """
+    Crea el agente de agendamiento de una sesión.
+
+    `session_id` identifica la sesión ante el registro de reservas compartido:
+    un horario verificado como disponible queda retenido para ella.
+    """
+    # Vincular herramientas al LLM (a cada modelo de la política, fallbacks incluidos)
     tools = [check_availability_tool, request_human_agent_tool]
-    llm_with_tools = llm.bind_tools(tools)
+    llm_with_tools = get_stage_llm("booking", tools=tools)
 
     system_prompt = """
 Eres VetCare AI, un asistente veterinario amable. Tu objetivo es agendar citas veterinarias.
@@ -131,10 +137,23 @@ REGLAS CRÍTICAS:
 
     chain = prompt | llm_with_tools
 
+    def invoke_llm(inputs: dict):
+        """Invoca el LLM registrando latencia y tokens (con prioridad sobre el resto)."""
+        with span("llm.booking"), priority("booking"):
+            response = chain.invoke(inputs)
+            record_usage(response)
+        return response
+
     # 🧠 Historial de conversación (memoria)
     chat_history = []
     # Guardar qué horarios ya fueron verificados
     verified_slots = set()
+    # Último horario retenido en el registro de reservas (se confirma con la cita)
+    held_slot = {}
+    ledger = get_ledger()
+    owner = session_id or os.urandom(8).hex()
+    # Mantiene acotado el historial que se envía al modelo en cada turno
+    compact_history = create_history_manager()
 
     def agent(query: str):
         nonlocal chat_history, verified_slots
@@ -193,11 +212,12 @@ REGLAS CRÍTICAS:
             print(f"📋 INFO USUARIO PARA ESCALACIÓN: {user_info}")
             
             # Llamar a la herramienta (Tool) de escalación
-            escalation_result = request_human_agent_tool.invoke({
-                "nombre": user_info.get("nombre", "Desconocido"),
-                "telefono": user_info.get("telefono", "sin teléfono"),
-                "email": user_info.get("email", "sin email")
-            })
+            with span("tool.request_human_agent"):
+                escalation_result = request_human_agent_tool.invoke({
+                    "nombre": user_info.get("nombre", "Desconocido"),
+                    "telefono": user_info.get("telefono", "sin teléfono"),
+                    "email": user_info.get("email", "sin email")
+                })
             
             # Limpiar historial para nueva conversación
             chat_history.clear()
@@ -216,7 +236,7 @@ REGLAS CRÍTICAS:
             messages = chat_history.copy()
             
             # Primera invocación
-            response = chain.invoke({
+            response = invoke_llm({
                 "input": query,
                 "chat_history": messages
             })
@@ -235,7 +255,14 @@ REGLAS CRÍTICAS:
                     if slot_key in verified_slots:
                         tool_result = f"⚠️ Este horario ya fue verificado anteriormente."
                     else:
-                        tool_result = check_availability_tool.invoke(tool_args)
+                        with span("tool.check_availability"):
+                            tool_result = check_availability_tool.invoke(tool_args)
+                            # Otra sesión (en cualquier réplica) puede tener retenido el horario
+                            if tool_result.startswith("✅"):
+                                if ledger.hold(tool_args["dia"], tool_args["hora"], owner):
+                                    held_slot.update(dia=tool_args["dia"], hora=tool_args["hora"])
+                                else:
+                                    tool_result = f"❌ El horario {tool_args['hora']} del {tool_args['dia']} NO está disponible."
                         verified_slots.add(slot_key)
                     
                     # Agregar tool result al historial
@@ -243,14 +270,15 @@ REGLAS CRÍTICAS:
                     messages.append(HumanMessage(content=f"Resultado de validación: {tool_result}"))
                     
                     # Una sola invocación más después del tool
-                    response = chain.invoke({
+                    response = invoke_llm({
                         "input": f"El horario fue validado. {tool_result}. Continúa recopilando datos del usuario para confirmar la cita.",
                         "chat_history": messages
                     })
                 
                 # Ejecutar request_human_agent_tool
                 elif tool_name == "request_human_agent_tool":
-                    tool_result = request_human_agent_tool.invoke(tool_args)
+                    with span("tool.request_human_agent"):
+                        tool_result = request_human_agent_tool.invoke(tool_args)
                     print(f"✅ Tool de escalación ejecutado: {tool_result}")
                     
                     # Limpiar historial para nueva conversación
@@ -269,23 +297,51 @@ REGLAS CRÍTICAS:
                 if "Fecha:" not in response_text or "Mascota:" not in response_text:
                     # Solicitar confirmación final formateada
                     messages.append(AIMessage(content=response_text))
-                    response = chain.invoke({
+                    response = invoke_llm({
                         "input": "Por favor, haz la CONFIRMACIÓN FINAL con el resumen completo en el formato especificado.",
                         "chat_history": messages
                     })
                     response_text = response.content.strip() if response.content else response_text
+                # Solo la frase exacta del PASO 7 reserva el horario ("aún no está confirmada" no)
+                if is_booking_confirmed(response_text) and held_slot:
+                    if not ledger.confirm(held_slot["dia"], held_slot["hora"], owner):
+                        response_text = (
+                            f"❌ Lo siento, el horario {held_slot['hora']} del {held_slot['dia']} acaba de ser "
+                            "reservado por otra persona. ¿Qué otro día u hora te acomoda?"
+                        )
+                        verified_slots.discard(f"{held_slot['dia']}_{held_slot['hora']}")
+                    held_slot.clear()
             
             # Actualizar histórico global
             chat_history.clear()
             chat_history.extend(messages)
             chat_history.append(AIMessage(content=response_text))
+            compact_history(chat_history)
             
             return response_text
         except Exception as e:
             error_msg = f"Error al procesar tu solicitud: {str(e)}"
             chat_history.append(AIMessage(content=error_msg))
+            compact_history(chat_history)
             return error_msg
 
+    def export_state() -> dict:
+        """Estado serializable de la sesión (historial, horarios verificados y retenido)."""
+        return {
+            "chat_history": serialize_messages(chat_history),
+            "verified_slots": sorted(verified_slots),
+            "held_slot": dict(held_slot),
+        }
+
+    def restore_state(state: dict):
+        chat_history[:] = deserialize_messages(state.get("chat_history"))
+        verified_slots.clear()
+        verified_slots.update(state.get("verified_slots", []))
+        held_slot.clear()
+        held_slot.update(state.get("held_slot", {}))
+
+    agent.export_state = export_state
+    agent.restore_state = restore_state
     return agent
 
 
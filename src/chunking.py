@@ -0,0 +1,308 @@
+"""
+✂️ Chunking - Segmentación según la estructura del documento
+
+En vez de cortar cada N caracteres, los chunks siguen las secciones:
+
+    Markdown  →  encabezados "#", "**Título**" subrayado con ---/=== y
+                 líneas en negrita como subtítulos
+    PDF / OCR →  secciones "I.- ..." y subsecciones "1.- Título", limpiando
+                 números de página, índices, encabezados/pies repetidos y
+                 líneas basura del OCR
+
+Cada chunk lleva la ruta de encabezados en la metadata (heading_path) y como
+primera línea del texto, así es autocontenido para el embedding y para el LLM.
+Las secciones cortas se agrupan con sus vecinas y solo las largas se
+subdividen.
+"""
+
+import re
+from collections import Counter
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+# Cambiar al modificar la segmentación: invalida los índices guardados
+CHUNKING_VERSION = "structure-v1"
+
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 100
+# Secciones más cortas que esto se agrupan con la siguiente
+MIN_CHUNK_CHARS = 300
+
+HEADING_SEPARATOR = " > "
+
+# Un encabezado/pie que aparece en esta fracción de páginas se elimina
+REPEATED_LINE_MIN_PAGES = 0.3
+
+# Markdown
+MD_ATX = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+MD_UNDERLINE = re.compile(r"^\s*(-{3,}|={3,})\s*$")
+MD_BOLD_LINE = re.compile(r"^\*\*([^*].*?)\*\*:?\s*$")
+
+# PDF / OCR: el OCR lee la "I" romana como "|", "l" o "!"
+PDF_SECTION = re.compile(r"^([IVX|l!]{1,4})\.-\s*(.+)$")
+PDF_SUBSECTION = re.compile(r"^(\d{1,2})\.-\s*(.+)$")
+PAGE_NUMBER = re.compile(r"^\s*\d{1,3}\s*$")
+# Líneas de índice: puntos guía (que el OCR a veces lee como "eee ce") y número de página
+TOC_LEADER = re.compile(r"(\.\s*){4,}|(\b[ce]{1,5}\s+){3,}\S*\s*\d+\s*$")
+OCR_ALLOWED = set(".,;:()¿?¡!\"'-%/«»“”°#")
+SENTENCE_END = re.compile(r"[.:;?!»”\"]\s*$")
+
+
+# =======================================================
+# 📝 Markdown
+# =======================================================
+
+def markdown_sections(text: str) -> list:
+    """
+    Divide un Markdown en secciones.
+
+    Returns:
+        list: [(heading_path: list, texto)]
+    """
+    lines = text.splitlines()
+    sections = []
+    path = []           # [(nivel, título)]
+    body = []
+
+    def flush():
+        content = "\n".join(body).strip()
+        if content:
+            sections.append(([title for _, title in path], content))
+        body.clear()
+
+    def push(level: int, title: str):
+        flush()
+        while path and path[-1][0] >= level:
+            path.pop()
+        path.append((level, title))
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+
+        atx = MD_ATX.match(line)
+        bold = MD_BOLD_LINE.match(line.strip())
+        if atx:
+            push(len(atx.group(1)), atx.group(2).strip())
+        elif line.strip() and MD_UNDERLINE.match(next_line):
+            # Setext: "===" nivel 1, "---" nivel 2 (el título puede venir en negrita)
+            level = 1 if next_line.strip().startswith("=") else 2
+            push(level, line.strip().strip("*").strip())
+            i += 1
+        elif bold:
+            # Línea completa en negrita: subtítulo bajo la sección actual
+            push(3, bold.group(1).strip().rstrip(":"))
+        else:
+            body.append(line)
+        i += 1
+
+    flush()
+    return sections
+
+
+# =======================================================
+# 📄 PDF / OCR
+# =======================================================
+
+def _text_ratio(line: str) -> float:
+    stripped = line.replace(" ", "")
+    if not stripped:
+        return 0.0
+    return sum(c.isalnum() or c in OCR_ALLOWED for c in stripped) / len(stripped)
+
+
+def _is_noise(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped or PAGE_NUMBER.match(stripped) or TOC_LEADER.search(stripped):
+        return True
+    if PDF_SECTION.match(stripped) or PDF_SUBSECTION.match(stripped):
+        return False
+    if stripped.isalpha() and stripped.islower():
+        return False  # palabra suelta que continúa el párrafo ("a", "de")
+    letters = sum(c.isalpha() for c in stripped)
+    # Restos del OCR: pocas letras o mayoría de símbolos extraños
+    return letters < 3 or _text_ratio(stripped) < 0.8
+
+
+def _repeated_lines(pages: list) -> set:
+    """Líneas de borde (primeras/últimas de cada página) repetidas en muchas páginas."""
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = [l.strip() for l in page.splitlines() if l.strip()]
+        edges = set(lines[:2] + lines[-2:])
+        counts.update(re.sub(r"\d+", "#", l) for l in edges)
+    threshold = max(3, int(len(pages) * REPEATED_LINE_MIN_PAGES))
+    return {line for line, n in counts.items() if n >= threshold}
+
+
+def clean_pages(pages: list) -> list:
+    """
+    Limpia páginas de PDF/OCR y las reagrupa en párrafos.
+
+    Returns:
+        list: [(número de página, párrafo)]
+    """
+    repeated = _repeated_lines(pages)
+    paragraphs = []
+    for page_number, page in enumerate(pages):
+        current = []
+        for line in page.splitlines() + [""]:
+            stripped = line.strip()
+            if stripped and (re.sub(r"\d+", "#", stripped) in repeated or _is_noise(stripped)):
+                continue
+            if stripped and current and (PDF_SECTION.match(stripped) or PDF_SUBSECTION.match(stripped)):
+                # Un marcador de sección siempre abre un párrafo nuevo
+                paragraphs.append((page_number, current))
+                current = []
+            if stripped:
+                current.append(stripped)
+                continue
+            if current:
+                paragraphs.append((page_number, current))
+                current = []
+
+    # Unir líneas cortadas (guion de fin de línea) y párrafos partidos por el OCR
+    merged = []
+    for page_number, lines in paragraphs:
+        # Título de subsección pegado a su primer párrafo ("2.- Vacunacion\nLa edad...")
+        if len(lines) > 1 and _pdf_heading(lines[0]) and lines[1][:1].isupper():
+            merged.append((page_number, lines[0]))
+            lines = lines[1:]
+        text = lines[0]
+        for line in lines[1:]:
+            text = text[:-1] + line if text.endswith("-") and line[:1].islower() else text + " " + line
+        starts_new = PDF_SECTION.match(text) or PDF_SUBSECTION.match(text)
+        if merged and not starts_new and text[:1].islower() and not SENTENCE_END.search(merged[-1][1]):
+            prev_page, prev = merged[-1]
+            merged[-1] = (prev_page, prev[:-1] + text if prev.endswith("-") else prev + " " + text)
+        else:
+            merged.append((page_number, text))
+    return merged
+
+
+def _pdf_heading(paragraph: str):
+    """Retorna (nivel, título) si el párrafo es un encabezado de sección."""
+    if len(paragraph) > 100 or paragraph.endswith((".", ":")):
+        return None
+    section = PDF_SECTION.match(paragraph)
+    if section:
+        return 1, section.group(2).strip()
+    sub = PDF_SUBSECTION.match(paragraph)
+    if sub and len(paragraph) <= 60 and sub.group(2)[:1].isupper():
+        return 2, sub.group(2).strip()
+    return None
+
+
+def pdf_sections(pages: list) -> list:
+    """
+    Divide páginas de PDF/OCR en secciones.
+
+    Returns:
+        list: [(heading_path: list, texto, página inicial)]
+    """
+    sections = []
+    path = []
+    body, body_page = [], 0
+
+    def flush():
+        if body:
+            sections.append(([title for _, title in path], "\n\n".join(body), body_page))
+        body.clear()
+
+    for page_number, paragraph in clean_pages(pages):
+        heading = _pdf_heading(paragraph)
+        if heading:
+            flush()
+            level, title = heading
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+            continue
+        if not body:
+            body_page = page_number
+        body.append(paragraph)
+
+    flush()
+    return sections
+
+
+# =======================================================
+# 🧩 Secciones → chunks
+# =======================================================
+
+def sections_to_chunks(sections: list, metadata: dict, chunk_size: int = CHUNK_SIZE,
+                       chunk_overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Agrupa secciones cortas (dentro de la misma sección de primer nivel) y
+    subdivide las largas. Cada chunk empieza con su ruta de encabezados.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    group, group_path, group_page = [], None, None
+
+    def emit(path: list, text: str, page):
+        heading = HEADING_SEPARATOR.join(path)
+        meta = {**metadata, "heading_path": heading, "section": path[-1] if path else ""}
+        if page is not None:
+            meta["page"] = page
+        prefix = f"{heading}\n\n" if heading else ""
+        for piece in splitter.split_text(text):
+            chunks.append(Document(page_content=prefix + piece, metadata=dict(meta)))
+
+    def flush_group():
+        nonlocal group, group_path, group_page
+        if group:
+            emit(group_path, "\n\n".join(group), group_page)
+        group, group_path, group_page = [], None, None
+
+    for section in sections:
+        path, text = section[0], section[1]
+        page = section[2] if len(section) > 2 else None
+        top = path[:1]
+
+        if group and (top != group_path[:1] or sum(map(len, group)) + len(text) > chunk_size):
+            flush_group()
+        if len(text) >= MIN_CHUNK_CHARS and not group:
+            emit(path, text, page)
+            continue
+
+        if not group:
+            group_path, group_page = path, page
+        else:
+            # Subtítulo dentro del grupo para no perder la estructura
+            text = f"{path[-1]}\n{text}" if path and path != group_path else text
+        group.append(text)
+        if sum(map(len, group)) >= MIN_CHUNK_CHARS:
+            flush_group()
+
+    flush_group()
+    return chunks
+
+
+def split_documents(docs: list, suffix: str, chunk_size: int = CHUNK_SIZE,
+                    chunk_overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Segmenta los Documents de un archivo según su estructura.
+
+    Args:
+        docs: Documents cargados de un archivo (una página por Document en PDF)
+        suffix: Extensión del archivo (.md, .txt, .pdf)
+    """
+    if not docs:
+        return []
+    metadata = {k: v for k, v in docs[0].metadata.items() if k != "page"}
+
+    if suffix == ".md":
+        text = "\n\n".join(d.page_content for d in docs)
+        sections = markdown_sections(text)
+    else:
+        # TXT de OCR: las páginas vienen separadas por form feed
+        pages = [p for d in docs for p in d.page_content.split("\f")]
+        sections = pdf_sections(pages)
+
+    return sections_to_chunks(sections, metadata, chunk_size, chunk_overlap)
@@ -0,0 +1,261 @@
+"""
+🗜️ Compact Store - Vectorstore compacto para contenedores pequeños
+
+Frente al FAISS de LangChain (float32 en RAM + un Document Python por chunk):
+
+    - Vectores en RAM cuantizados con FAISS ScalarQuantizer: float16 (2 bytes/dim)
+      o int8 (1 byte/dim), opcionalmente truncados a menos dimensiones
+      (Matryoshka: text-embedding-3 admite recortar y renormalizar)
+    - Texto y metadata de los chunks en archivos columnares mapeados con mmap
+    - Vectores float32 completos solo en disco (mmap) para re-puntuar a precisión
+      completa los mejores candidatos
+
+Con int8 y 512 dimensiones cada chunk ocupa ~0.5 KB en RAM en vez de ~6 KB
+más el objeto Document.
+"""
+
+import os
+import json
+import mmap
+import time
+import shutil
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_index import (
+    INDEX_DIR,
+    IVF_NPROBE,
+    TRAIN_SAMPLE_SIZE,
+    MIN_POINTS_PER_CENTROID,
+    ivf_nlist,
+    note_nlist_cap,
+    apply_search_params,
+    search_parameters,
+    read_index_config,
+    read_faiss_index,
+)
+
+
+# Configuración por entorno
+VECTOR_DTYPE = os.getenv("VETCARE_VECTOR_DTYPE", "int8")          # float16 | int8
+MATRYOSHKA_DIMS = int(os.getenv("VETCARE_MATRYOSHKA_DIMS", "0"))   # 0 = dimensiones completas
+# Candidatos re-puntuados a precisión completa por cada resultado pedido
+RESCORE_FACTOR = int(os.getenv("VETCARE_RESCORE_FACTOR", "4"))
+
+COMPACT_DIR = INDEX_DIR / "compact"
+
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.f32"
+TEXTS_FILE = "texts.bin"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+META_FILE = "meta.bin"
+META_OFFSETS_FILE = "meta_offsets.npy"
+
+
+def reduce_vectors(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """Trunca a `dims` dimensiones (Matryoshka) y renormaliza."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dims and dims < vectors.shape[1]:
+        vectors = np.ascontiguousarray(vectors[:, :dims])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+    return vectors
+
+
+def _factory_string(index_type: str, dtype: str, n: int, expected_total: int = None) -> str:
+    sq = "SQfp16" if dtype == "float16" else "SQ8"
+    if index_type == "ivf_flat" and n >= 2 * MIN_POINTS_PER_CENTROID:
+        nlist, _ = ivf_nlist(n, expected_total)
+        return f"IVF{nlist},{sq}"
+    if index_type not in ("flat", "ivf_flat"):
+        print(f"[WARNING] El store compacto no soporta {index_type}; usando índice plano cuantizado")
+    return sq
+
+
+class CompactVectorStore:
+    """
+    Vectorstore de solo lectura con la misma interfaz de búsqueda que el FAISS
+    de LangChain (similarity_search, similarity_search_by_vector, embedding_function).
+    """
+
+    def __init__(self, path: Path, embedding_function, config: dict):
+        self.path = Path(path)
+        self.embedding_function = embedding_function
+        self.config = config
+        self.dims = config["dims"]
+        self.full_dim = config["full_dim"]
+
+        self.index = read_faiss_index(self.path / INDEX_FILE)
+        apply_search_params(self.index, config.get("params", {}))
+
+        n = self.index.ntotal
+        self.vectors = np.memmap(self.path / VECTORS_FILE, dtype=np.float32, mode="r", shape=(n, self.full_dim))
+        self.text_offsets = np.load(self.path / TEXT_OFFSETS_FILE, mmap_mode="r")
+        self.meta_offsets = np.load(self.path / META_OFFSETS_FILE, mmap_mode="r")
+        self._texts = self._map(self.path / TEXTS_FILE)
+        self._meta = self._map(self.path / META_FILE)
+
+    @staticmethod
+    def _map(path: Path):
+        if path.stat().st_size == 0:
+            return b""
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def get_document(self, position: int) -> Document:
+        """Reconstruye el Document de un chunk leyendo solo sus bytes del mmap."""
+        t0, t1 = int(self.text_offsets[position]), int(self.text_offsets[position + 1])
+        m0, m1 = int(self.meta_offsets[position]), int(self.meta_offsets[position + 1])
+        metadata = json.loads(self._meta[m0:m1].decode("utf-8")) if m1 > m0 else {}
+        metadata["chunk_id"] = position
+        return Document(page_content=self._texts[t0:t1].decode("utf-8"), metadata=metadata)
+
+    def search_positions(self, query_vector, k: int = 4, positions: np.ndarray = None) -> list:
+        """
+        Busca en el índice cuantizado (opcionalmente solo entre `positions`) y
+        re-puntúa los candidatos con los vectores float32 completos.
+        Retorna [(posición, distancia_l2)].
+        """
+        full = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        reduced = reduce_vectors(full, self.dims)
+        fetch = max(k, k * RESCORE_FACTOR)
+
+        if positions is not None:
+            params = search_parameters(self.index, positions)
+            _, ids = self.index.search(reduced, min(fetch, len(positions)), params=params)
+        else:
+            _, ids = self.index.search(reduced, fetch)
+        candidates = [int(i) for i in ids[0] if i >= 0]
+        if not candidates:
+            return []
+
+        exact = np.asarray(self.vectors[sorted(candidates)])
+        distances = ((exact - full) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:k]
+        ordered = sorted(candidates)
+        return [(ordered[i], float(distances[i])) for i in order]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs) -> list:
+        return [self.get_document(pos) for pos, _ in self.search_positions(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> list:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+
+# =======================================================
+# 🏗️ Construcción en streaming
+# =======================================================
+
+def build_compact_store(embedded_batches, embeddings, path: Path = COMPACT_DIR, index_type: str = "flat",
+                        dtype: str = VECTOR_DTYPE, dims: int = MATRYOSHKA_DIMS, expected_total: int = None):
+    """
+    Construye el store consumiendo lotes (chunks, vectores) y lo escribe en `path`.
+
+    IVF se entrena con los primeros TRAIN_SAMPLE_SIZE vectores; nlist se
+    dimensiona con `expected_total` si se conoce (ver vector_index.ivf_nlist).
+
+    Se escribe primero en un directorio temporal y se reemplaza al final, así
+    un proceso que lee el store anterior nunca ve archivos a medio escribir.
+
+    Returns:
+        tuple: (CompactVectorStore, config)
+    """
+    import faiss
+
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"VETCARE_VECTOR_DTYPE inválido: {dtype} (float16 | int8)")
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    start = time.perf_counter()
+
+    text_offsets, meta_offsets = [0], [0]
+    index, sample, sample_size = None, [], 0
+    full_dim = None
+
+    with open(tmp_path / VECTORS_FILE, "wb") as vectors_f, \
+            open(tmp_path / TEXTS_FILE, "wb") as texts_f, \
+            open(tmp_path / META_FILE, "wb") as meta_f:
+
+        def add_to_index(reduced_batches: list):
+            nonlocal index
+            reduced = np.vstack(reduced_batches)
+            if index is None:
+                factory = _factory_string(index_type, dtype, len(reduced), expected_total)
+                index = faiss.index_factory(reduced.shape[1], factory)
+                if not index.is_trained:
+                    index.train(reduced)
+            index.add(reduced)
+
+        for chunks, vectors in embedded_batches:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            full_dim = vectors.shape[1]
+            vectors_f.write(vectors.tobytes())
+
+            for chunk in chunks:
+                text = chunk.page_content.encode("utf-8")
+                meta = json.dumps(chunk.metadata, ensure_ascii=False).encode("utf-8")
+                texts_f.write(text)
+                meta_f.write(meta)
+                text_offsets.append(text_offsets[-1] + len(text))
+                meta_offsets.append(meta_offsets[-1] + len(meta))
+
+            reduced = reduce_vectors(vectors, dims)
+            if index is not None:
+                index.add(reduced)
+                continue
+            sample.append(reduced)
+            sample_size += len(reduced)
+            if sample_size >= TRAIN_SAMPLE_SIZE:
+                add_to_index(sample)
+                sample = []
+
+        if index is None:
+            if not sample:
+                raise ValueError("No hay chunks para indexar.")
+            add_to_index(sample)
+
+    np.save(tmp_path / TEXT_OFFSETS_FILE, np.asarray(text_offsets, dtype=np.int64))
+    np.save(tmp_path / META_OFFSETS_FILE, np.asarray(meta_offsets, dtype=np.int64))
+    faiss.write_index(index, str(tmp_path / INDEX_FILE))
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    params = {}
+    if ivf is not None:
+        params = {"nprobe": IVF_NPROBE, "nlist": int(ivf.nlist)}
+        note_nlist_cap(params, sample_size, int(index.ntotal))
+    config = {
+        "store_type": "compact",
+        "index_type": "ivf_flat" if ivf is not None else "flat",
+        "params": params,
+        "vector_dtype": dtype,
+        "dims": int(index.d),
+        "full_dim": int(full_dim),
+        "ntotal": int(index.ntotal),
+        "created_at": time.time(),
+    }
+    print(f"[INFO] Store compacto {dtype} x {index.d} dims con {index.ntotal} chunks "
+          f"({time.perf_counter() - start:.2f}s)")
+    del index, ivf  # el store reabre el índice desde disco
+    return CompactVectorStore(path, embeddings, config), config
+
+
+def load_compact_store(embeddings, path: Path = COMPACT_DIR, config: dict = None,
+                       search_params: dict = None) -> CompactVectorStore:
+    """Abre un store compacto guardado (índice en RAM, texto y vectores completos vía mmap)."""
+    if config is None:
+        config = read_index_config(Path(path).parent)
+    if config is None or config.get("store_type") != "compact":
+        raise FileNotFoundError(f"No hay store compacto guardado en {path}")
+    config = {**config, "params": {**config.get("params", {}), **(search_params or {})}}
+    return CompactVectorStore(path, embeddings, config)
@@ -2,28 +2,67 @@ import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+from single_flight import coalescing, coalescing_embeddings
+from rate_limiter import RATE_LIMIT_ENABLED, rate_limited, rate_limited_embeddings
+
 # Cargar variables desde .env
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("Falta OPENAI_API_KEY en el archivo .env")
+
+
+def use_fake_models() -> bool:
+    """
+    Indica si se deben usar modelos simulados locales (VETCARE_FAKE_MODELS=1).
+    Se usa en benchmarks y pruebas de carga para no llamar a OpenAI.
+    """
+    return os.getenv("VETCARE_FAKE_MODELS", "") == "1"
+
+
+def _require_api_key():
+    if not OPENAI_API_KEY:
+        raise RuntimeError("Falta OPENAI_API_KEY en el archivo .env")
+
 
 def get_llm(model: str = "gpt-4.1-mini", temperature: float = 0.2):
     """
     Retorna un modelo LLM de OpenAI para toda la app.
+
+    Con temperature=0 las llamadas idénticas en vuelo se coalescen en una
+    sola (single_flight.py, VETCARE_SINGLE_FLIGHT). Todas las llamadas pasan
+    por el limitador compartido del modelo (rate_limiter.py), que también se
+    encarga de reintentar los 429.
     """
-    return ChatOpenAI(
+    if use_fake_models():
+        from fake_models import FakeChatModel
+        return coalescing(rate_limited(FakeChatModel))(model_name=model, temperature=temperature)
+
+    _require_api_key()
+    return coalescing(rate_limited(ChatOpenAI))(
         model=model,
         temperature=temperature,
         api_key=OPENAI_API_KEY,
+        max_retries=0 if RATE_LIMIT_ENABLED else 2,
     )
 
-def get_embeddings():
+def get_embeddings(**kwargs):
     """
     Retorna el modelo de embeddings para el RAG.
+
+    Los kwargs se pasan a OpenAIEmbeddings (ej: chunk_size). Con el limitador
+    activo el cliente no reintenta (max_retries=0): reintenta el limitador,
+    tanto en consultas como en la ingesta. Las consultas idénticas en vuelo
+    comparten una sola llamada (single_flight.py).
     """
-    return OpenAIEmbeddings(
+    if use_fake_models():
+        from fake_models import FakeEmbeddings
+        return coalescing_embeddings(rate_limited_embeddings(FakeEmbeddings()))
+
+    _require_api_key()
+    if RATE_LIMIT_ENABLED:
+        kwargs.setdefault("max_retries", 0)
+    return coalescing_embeddings(rate_limited_embeddings(OpenAIEmbeddings(
         model="text-embedding-3-small",
         api_key=OPENAI_API_KEY,
-    )
+        **kwargs,
+    )))
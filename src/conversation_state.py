@@ -0,0 +1,173 @@
+"""
+🧭 Conversation State - Máquina de estados de la conversación
+
+Compartida por main_flow y graph_flow:
+
+    LIBRE ──router elige booking──▶ BOOKING ──cita confirmada / escalación──▶ LIBRE
+                                      │
+                 cambio de tema ──────┘ (clasificador local) ──▶ router LLM
+
+Mientras hay un agente fijado, los turnos van directo a él sin pagar la
+clasificación del router. El router solo se consulta cuando el clasificador
+local (reglas, sin LLM) detecta que el usuario salió del agendamiento o
+cambió de tema.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from metadata_index import normalize_text
+from tracing import increment
+
+
+# Agentes con estado de varios turnos que se mantienen fijados
+PINNED_AGENTS = ("booking",)
+
+# Sesiones en memoria por proceso (LRU)
+MAX_SESSIONS = 1000
+
+# Salida explícita del agendamiento
+EXIT_PATTERNS = (
+    r"\bcancel(ar|a|o)\b", r"\bsalir\b", r"\btermin(ar|amos)\b", r"\badios\b", r"\bchao\b",
+    r"\bolvidalo\b", r"\bya no\b", r"\bno quiero (agendar|reservar|la cita|la hora)\b",
+)
+# Mensajes de cierre cortos ("gracias", "listo") sin datos de la cita
+CLOSING_WORDS = ("gracias", "listo", "nada mas", "eso es todo")
+# Respuestas que solo tienen sentido dentro del agendamiento
+CONFIRM_PATTERN = r"^(si|ok|okay|dale|confirmo|confirma|correcto|perfecto|de acuerdo|claro)\b"
+BOOKING_CUES = (
+    r"\b(lunes|martes|miercoles|jueves|viernes|sabado|domingo|manana|hoy|pasado)\b",
+    r"\b(hora|horario|am|pm|tarde|cita|agend\w*|reserv\w*|turno|consulta|confirm\w*|disponib\w*)\b",
+    r"\b\d{1,2}([:.]\d{2})?\s*(hrs?|h|am|pm)\b", r"\b(a las|el|dia) \d{1,2}\b",
+    r"\b(me llamo|mi nombre|soy|telefono|celular|correo|email|mail)\b", r"@", r"\+?\d[\d\s\-]{7,}",
+    r"\b(se llama|anos|meses|raza)\b",
+    # La escalación la resuelve el agente de booking
+    r"\b(humano|persona|agente|representante|frustrad\w*|escal\w*)\b",
+)
+QUESTION_STARTS = ("que ", "como ", "cual", "cuando", "cuanto", "donde", "por que", "porque", "quien", "es normal", "es bueno")
+
+# Frase exacta con la que el agente de booking cierra una cita (la exige su prompt)
+BOOKING_CONFIRMED_PHRASE = "Tu cita ha sido confirmada exitosamente"
+# Marcas en la respuesta del agente que cierran la sesión de agendamiento. Son
+# frases completas: "aún no está confirmada" o "si quieres te derivo a un
+# agente humano" no cierran nada
+FINISHED_MARKERS = (BOOKING_CONFIRMED_PHRASE, "🚨", "He solicitado a un agente humano")
+
+
+def is_booking_confirmed(response: str) -> bool:
+    """Indica si la respuesta del agente de booking confirma la cita."""
+    return normalize_text(BOOKING_CONFIRMED_PHRASE) in normalize_text(response)
+
+
+def classify_turn(query: str) -> str:
+    """
+    Clasificador local de un turno dentro del agendamiento:
+        "continue"  sigue en el agente fijado
+        "exit"      el usuario cancela o cierra la conversación
+        "switch"    pregunta de otro tema (se consulta al router)
+    """
+    text = normalize_text(query).strip(" ¿¡.!")
+    if any(re.search(p, text) for p in EXIT_PATTERNS):
+        return "exit"
+
+    if re.search(CONFIRM_PATTERN, text) or any(re.search(p, text) for p in BOOKING_CUES):
+        return "continue"
+    words = re.findall(r"\w+", text)
+    if len(words) <= 4 and any(text.startswith(w) for w in CLOSING_WORDS):
+        return "exit"
+    if "?" in text or text.startswith(QUESTION_STARTS):
+        return "switch"
+    return "continue"
+
+
+class ConversationState:
+    """
+    Estado de una conversación: agente fijado y transiciones entre turnos.
+
+    Uso por turno:
+        agent = state.before_turn(query)   # agente fijado o None (rutear)
+        ...
+        state.after_turn(agent_used, response)
+    """
+
+    def __init__(self):
+        self.active_agent = None
+        self.pinned_turns = 0
+        self.last_transition = None
+
+    def before_turn(self, query: str):
+        """Retorna el agente que atiende el turno sin router, o None si hay que rutear."""
+        self.last_transition = None
+        if self.active_agent is None:
+            return None
+
+        kind = classify_turn(query)
+        self.last_transition = kind
+        if kind == "continue":
+            self.pinned_turns += 1
+            increment("vetcare_router_skipped_total", agent=self.active_agent)
+            return self.active_agent
+
+        increment("vetcare_topic_switch_total", agent=self.active_agent, kind=kind)
+        if kind == "exit":
+            self.release()
+        return None
+
+    def after_turn(self, agent: str, response: str):
+        """Actualiza el estado según el agente que respondió y su respuesta."""
+        if agent in PINNED_AGENTS:
+            if self.active_agent != agent:
+                self.active_agent = agent
+                self.pinned_turns = 0
+            text = normalize_text(response)
+            if any(normalize_text(marker) in text for marker in FINISHED_MARKERS):
+                self.release()
+        elif agent in ("rag", "greeting"):
+            # El router confirmó el cambio de tema
+            self.release()
+
+    def release(self):
+        self.active_agent = None
+        self.pinned_turns = 0
+
+    def to_dict(self) -> dict:
+        return {"active_agent": self.active_agent, "pinned_turns": self.pinned_turns}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversationState":
+        state = cls()
+        state.active_agent = (data or {}).get("active_agent")
+        state.pinned_turns = (data or {}).get("pinned_turns", 0)
+        return state
+
+
+class SessionRegistry:
+    """
+    Sesiones por ID (estado + agentes con memoria propia), LRU acotado y
+    thread-safe. `factory(session_id)` crea el contenido de una sesión nueva.
+    """
+
+    def __init__(self, factory, maxsize: int = MAX_SESSIONS):
+        self.factory = factory
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.factory(session_id)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
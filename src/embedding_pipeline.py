@@ -0,0 +1,135 @@
+"""
+🔢 Embedding Pipeline - Embeddings del corpus por lotes, concurrentes y reanudables
+
+    chunks ──▶ lotes por tokens ──▶ N requests en vuelo ──▶ (chunks, vectores) en orden
+                                        │
+                                        ├─ limitador compartido (rate_limiter) con prioridad batch:
+                                        │  429/5xx → backoff y reintento, AIMD de concurrencia
+                                        └─ cada lote se guarda en disco → una construcción
+                                           interrumpida se reanuda sin volver a pagar embeddings
+
+Los embeddings de get_embeddings() ya pasan por el limitador del modelo,
+que es el mismo que usan las consultas: la ingesta no lleva un límite de
+concurrencia propio (un 429 lo reduciría dos veces).
+
+Se puede probar contra el servidor simulado (fake_openai_server.py)
+apuntando OPENAI_BASE_URL a él.
+"""
+
+import os
+import shutil
+import hashlib
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from history_manager import count_tokens
+from rate_limiter import priority
+from tracing import span, mark_cache_hit
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CHECKPOINT_DIR = BASE_DIR / "data" / "index" / "embedding_checkpoint"
+
+# Límites por request de la API de embeddings (máx. 300k tokens y 2048 inputs)
+MAX_TOKENS_PER_REQUEST = int(os.getenv("VETCARE_EMBED_MAX_TOKENS", "100000"))
+MAX_INPUTS_PER_REQUEST = 2048
+# Lotes de embeddings en preparación simultáneamente (el limitador compartido decide cuántos van al proveedor)
+EMBED_CONCURRENCY = int(os.getenv("VETCARE_EMBED_CONCURRENCY", "4"))
+
+
+# =======================================================
+# 📦 Empaquetado por tokens
+# =======================================================
+
+def pack_batches(chunk_batches, max_tokens: int = MAX_TOKENS_PER_REQUEST, max_inputs: int = MAX_INPUTS_PER_REQUEST):
+    """
+    Reagrupa los chunks en lotes que llenan cada request hasta el límite de tokens.
+    El orden de los chunks se conserva, por lo que el plan de lotes es estable
+    entre ejecuciones (requisito para reanudar desde el checkpoint).
+    """
+    batch, batch_tokens = [], 0
+    for chunks in chunk_batches:
+        for chunk in chunks:
+            tokens = count_tokens(chunk.page_content)
+            if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(chunk)
+            batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+# =======================================================
+# 🚦 Llamada al proveedor
+# =======================================================
+
+def embed_texts(embeddings, texts: list) -> list:
+    """
+    Embebe un lote. La concurrencia, los 429 (pausa y reintento), los 5xx y
+    los timeouts los maneja el limitador compartido de get_embeddings().
+    """
+    # La ingesta cede el paso a los turnos de usuarios en el limitador compartido
+    with priority("batch"):
+        return embeddings.embed_documents(texts)
+
+
+# =======================================================
+# 💾 Checkpoint por lote
+# =======================================================
+
+def _batch_path(checkpoint_dir: Path, position: int, texts: list, model_name: str) -> Path:
+    """El nombre incluye un hash del contenido: si el lote cambia, no se reutiliza."""
+    digest = hashlib.sha1(model_name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\x1f" + text.encode("utf-8"))
+    return checkpoint_dir / f"batch_{position:06d}_{digest.hexdigest()[:16]}.npy"
+
+
+def clear_checkpoint(checkpoint_dir: Path = CHECKPOINT_DIR):
+    """Elimina el checkpoint una vez que el índice quedó guardado."""
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def embed_corpus_batches(chunk_batches, embeddings, checkpoint_dir: Path = CHECKPOINT_DIR,
+                         concurrency: int = EMBED_CONCURRENCY, max_tokens: int = MAX_TOKENS_PER_REQUEST):
+    """
+    Embebe el corpus con requests concurrentes y entrega los lotes en orden.
+
+    Como máximo hay `2 * concurrency` lotes pendientes, así que el consumo de
+    memoria no depende del tamaño del corpus.
+
+    Yields:
+        tuple: (chunks, vectores np.float32)
+    """
+    checkpoint_dir = Path(checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    model_name = getattr(embeddings, "model", None) or type(embeddings).__name__
+
+    def embed_batch(position: int, chunks: list) -> np.ndarray:
+        texts = [c.page_content for c in chunks]
+        path = _batch_path(checkpoint_dir, position, texts, model_name)
+        with span("ingest.embed_batch", chunks=len(chunks)):
+            if path.exists():
+                mark_cache_hit(True)
+                return np.load(path)
+            mark_cache_hit(False)
+            vectors = np.asarray(embed_texts(embeddings, texts), dtype=np.float32)
+            tmp = path.with_suffix(".tmp.npy")
+            np.save(tmp, vectors)
+            os.replace(tmp, path)
+            return vectors
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed") as pool:
+        pending = deque()
+        for position, chunks in enumerate(pack_batches(chunk_batches, max_tokens)):
+            pending.append((chunks, pool.submit(embed_batch, position, chunks)))
+            while len(pending) >= 2 * concurrency:
+                chunks_done, future = pending.popleft()
+                yield chunks_done, future.result()
+        while pending:
+            chunks_done, future = pending.popleft()
+            yield chunks_done, future.result()
@@ -0,0 +1,253 @@
+"""
+🧪 Fake Models - Modelos locales determinísticos para benchmarks
+Sustituyen a ChatOpenAI / OpenAIEmbeddings (VETCARE_FAKE_MODELS=1) con
+latencia y velocidad de generación configurables, sin llamadas de red.
+
+Configuración por entorno:
+    VETCARE_FAKE_LATENCY_MS        Latencia fija por llamada al LLM (default 300)
+    VETCARE_FAKE_TOKENS_PER_SEC    Velocidad de generación (default 80)
+    VETCARE_FAKE_EMBED_LATENCY_MS  Latencia por llamada de embeddings (default 50)
+    VETCARE_FAKE_EMBED_DIM         Dimensión de los embeddings (default 1536)
+
+El LLM simulado también imita el prompt caching del proveedor (prefijos de
+1024+ tokens, en bloques de 128) y reporta los tokens cacheados en
+usage_metadata, para medir el efecto del orden de los prompts.
+"""
+
+import os
+import re
+import time
+import uuid
+import hashlib
+import json
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+_lock = threading.Lock()
+_calls = Counter()
+
+
+def record_call(kind: str):
+    with _lock:
+        _calls[kind] += 1
+
+
+def call_counts() -> dict:
+    """Retorna el número de llamadas simuladas por tipo (router, rag, booking, ...)."""
+    with _lock:
+        return dict(_calls)
+
+
+def reset_call_counts():
+    with _lock:
+        _calls.clear()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# =======================================================
+# 🗃️ Prompt caching simulado
+# =======================================================
+
+# Como el proveedor: solo prompts de 1024+ tokens, cacheados en bloques de 128
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+PROMPT_CACHE_MAX_ENTRIES = 50000
+
+_prefix_cache = OrderedDict()
+
+
+def _serialize_prompt(messages, tools) -> str:
+    parts = [json.dumps(tools, sort_keys=True, ensure_ascii=False)] if tools else []
+    parts.extend(f"{m.type}:{m.content}" for m in messages)
+    return "\n".join(parts)
+
+
+def cached_prefix_tokens(text: str) -> int:
+    """
+    Tokens del prompt cuyo prefijo ya se vio en una llamada anterior.
+    Registra los prefijos de este prompt para las siguientes llamadas.
+    """
+    block_chars = PROMPT_CACHE_BLOCK_TOKENS * 4
+    if _estimate_tokens(text) < PROMPT_CACHE_MIN_TOKENS:
+        return 0
+
+    digest = hashlib.sha1()
+    cached, matching = 0, True
+    with _lock:
+        for start in range(0, len(text) - block_chars + 1, block_chars):
+            digest.update(text[start:start + block_chars].encode("utf-8"))
+            key = digest.hexdigest()
+            if matching and key in _prefix_cache:
+                _prefix_cache.move_to_end(key)
+                cached += PROMPT_CACHE_BLOCK_TOKENS
+                continue
+            matching = False
+            _prefix_cache[key] = True
+            if len(_prefix_cache) > PROMPT_CACHE_MAX_ENTRIES:
+                _prefix_cache.popitem(last=False)
+    return cached if cached >= PROMPT_CACHE_MIN_TOKENS else 0
+
+
+# =======================================================
+# 💬 LLM simulado
+# =======================================================
+
+BOOKING_WORDS = ("agendar", "cita", "reservar", "consulta para", "humano", "hablar con", "persona")
+GREETING_WORDS = ("hola", "buenos", "buenas", "saludos", "gracias", "hey")
+HOUR_PATTERN = re.compile(r"\b(\d{1,2}(?::\d{2})?\s*(?:am|pm|hrs|h)?)\b", re.IGNORECASE)
+
+
+APPOINTMENT_WORDS = ("agendar", "cita", "reservar", "consulta para")
+
+
+def classify_query(query: str) -> tuple:
+    """Clasificación por palabras clave que imita al router (incluye mensajes multi-intención)."""
+    q = query.lower()
+    if any(w in q for w in BOOKING_WORDS):
+        # "Mi perro tose, ¿puedo agendar?" → una cláusula de cuidados + una de cita
+        clauses = [c for c in re.split(r"[,.;¿?]", q) if len(c.split()) >= 2]
+        if (any(w in q for w in APPOINTMENT_WORDS)
+                and any(not any(w in c for w in BOOKING_WORDS) for c in clauses)):
+            return "RAG, BOOKING", 0.9
+        return "BOOKING", 0.95
+    if any(q.startswith(w) for w in GREETING_WORDS) and "?" not in q:
+        return "GREETING", 0.9
+    return "RAG", 0.9
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model determinístico: reconoce el prompt de cada agente y responde
+    con una salida plausible (incluidas tool calls del booking agent).
+    """
+
+    model_name: str = "fake-gpt"
+    temperature: float = 0.0
+    latency_ms: float = float(os.getenv("VETCARE_FAKE_LATENCY_MS", "300"))
+    tokens_per_second: float = float(os.getenv("VETCARE_FAKE_TOKENS_PER_SEC", "80"))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _respond(self, messages, tools) -> tuple:
+        """Retorna (tipo_de_llamada, contenido, tool_calls)."""
+        prompt = "\n".join(str(m.content) for m in messages)
+        last = str(messages[-1].content) if messages else ""
+
+        if "INTENCIÓN:" in prompt and "CONFIANZA:" in prompt:
+            match = re.search(r"Mensaje del usuario:\s*(.*)", prompt)
+            query = match.group(1) if match else last
+            intent, confidence = classify_query(query)
+            return "router", f"INTENCIÓN: {intent}\nCONFIANZA: {confidence}\nRAZÓN: clasificación simulada", []
+
+        if "módulo de memoria" in prompt:
+            return "summary", "Resumen simulado: " + last[-200:], []
+
+        if "Contexto disponible" in prompt:
+            context = prompt.split("Contexto disponible:", 1)[-1]
+            return "rag", "Según la base de conocimientos:\n" + context.strip()[:400], []
+
+        if tools:
+            if "Resultado de validación" not in prompt and HOUR_PATTERN.search(last):
+                hour = HOUR_PATTERN.search(last).group(1)
+                tool_call = {
+                    "name": "check_availability_tool",
+                    "args": {"dia": "mañana", "hora": hour},
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+                return "booking", "", [tool_call]
+            return "booking", "Perfecto, ¿me indicas tu nombre completo, teléfono y email?", []
+
+        if "El usuario saludó" in prompt:
+            match = re.search(r"Mensaje del usuario:\s*(.*)", prompt)
+            question = match.group(1).strip() if match else last
+            return "greeting", (
+                f"¡Hola! Sobre tu consulta ({question}): te respondo con gusto. 🐾 "
+                "También puedo agendar citas, responder dudas sobre tus mascotas "
+                "o escalar tu caso a atención humana."
+            ), []
+
+        return "other", "Respuesta simulada.", []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        kind, content, tool_calls = self._respond(messages, kwargs.get("tools"))
+        record_call(kind)
+
+        input_tokens = sum(_estimate_tokens(str(m.content)) for m in messages)
+        output_tokens = _estimate_tokens(content) if content else 20
+        cached_tokens = min(input_tokens, cached_prefix_tokens(_serialize_prompt(messages, kwargs.get("tools"))))
+        time.sleep(self.latency_ms / 1000 + output_tokens / self.tokens_per_second)
+
+        message = AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            response_metadata={"model_name": self.model_name},
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "input_token_details": {"cache_read": cached_tokens},
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# =======================================================
+# 🔢 Embeddings simulados
+# =======================================================
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeddings determinísticos tipo bag-of-words: cada palabra se proyecta a un
+    vector aleatorio fijo (semilla = hash de la palabra), así textos con palabras
+    en común quedan cerca y la recuperación es realista.
+    """
+
+    def __init__(self, dim: int = None, latency_ms: float = None):
+        self.dim = dim or int(os.getenv("VETCARE_FAKE_EMBED_DIM", "1536"))
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv("VETCARE_FAKE_EMBED_LATENCY_MS", "50"))
+        self._word_vectors = {}
+
+    def _word_vector(self, word: str) -> np.ndarray:
+        vec = self._word_vectors.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            if len(self._word_vectors) < 50000:
+                self._word_vectors[word] = vec
+        return vec
+
+    def _embed(self, text: str) -> list:
+        words = re.findall(r"\w+", text.lower())
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in words:
+            vec += self._word_vector(word)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        record_call("embedding")
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list:
+        record_call("embedding")
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
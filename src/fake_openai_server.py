@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+🧪 Fake OpenAI Server - Servidor HTTP local compatible con la API de OpenAI
+Permite probar los clientes reales (OpenAIEmbeddings y ChatOpenAI) sin red:
+reintentos, backoff, el limitador compartido y la concurrencia adaptativa,
+inyectando 429 de forma aleatoria o cuando se supera un límite de requests
+por minuto. Las respuestas de chat las genera el LLM simulado de fake_models.
+
+Uso:
+    python src/fake_openai_server.py --port 8089 --error-rate 0.2 --rpm 120
+
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python benchmarks/bench_retrieval.py --real
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python src/main_flow.py
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import convert_to_messages
+
+from fake_models import FakeEmbeddings, FakeChatModel
+
+
+def create_fake_openai_server(port: int = 8089, host: str = "127.0.0.1", latency_ms: float = 50,
+                              error_rate: float = 0.0, rpm: int = 0, retry_after: float = 1.0, seed: int = 0):
+    """
+    Crea el servidor simulado (sin iniciarlo).
+
+    Args:
+        latency_ms: Latencia fija por request
+        error_rate: Probabilidad de responder 429 a cualquier request
+        rpm: Límite de requests por minuto (0 = sin límite); al superarlo responde 429
+        retry_after: Valor del header Retry-After en los 429
+
+    Returns:
+        ThreadingHTTPServer con `server.stats` (requests, throttled, embeddings, completions)
+    """
+    embedder = FakeEmbeddings(latency_ms=0)
+    chat_model = FakeChatModel(latency_ms=0, tokens_per_second=1e9)
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    window = deque()  # timestamps de requests aceptados en el último minuto
+    stats = {"requests": 0, "throttled": 0, "embeddings": 0, "completions": 0}
+
+    def should_throttle() -> bool:
+        now = time.monotonic()
+        with lock:
+            stats["requests"] += 1
+            if error_rate and rng.random() < error_rate:
+                stats["throttled"] += 1
+                return True
+            while window and now - window[0] > 60:
+                window.popleft()
+            if rpm and len(window) >= rpm:
+                stats["throttled"] += 1
+                return True
+            window.append(now)
+            return False
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency_ms / 1000)
+
+            if should_throttle():
+                self._send_json(429, {
+                    "error": {"message": "Rate limit reached (simulated)", "type": "rate_limit_exceeded"}
+                }, {"Retry-After": str(retry_after)})
+                return
+
+            if self.path.endswith("/embeddings"):
+                self._handle_embeddings(request)
+            elif self.path.endswith("/chat/completions"):
+                self._handle_chat(request)
+            else:
+                self._send_json(404, {"error": {"message": f"Ruta no soportada: {self.path}"}})
+
+        def _handle_embeddings(self, request: dict):
+            inputs = request.get("input", [])
+            if isinstance(inputs, (str, int)) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            data = []
+            for i, item in enumerate(inputs):
+                # OpenAIEmbeddings puede enviar listas de token ids en vez de texto
+                text = " ".join(str(t) for t in item) if isinstance(item, list) else str(item)
+                vector = embedder._embed(text)
+                if request.get("dimensions"):
+                    vector = vector[:request["dimensions"]]
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            with lock:
+                stats["embeddings"] += len(data)
+            tokens = sum(len(str(item)) // 4 + 1 for item in inputs)
+            self._send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": request.get("model", "fake-embedding"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+
+        def _handle_chat(self, request: dict):
+            messages = convert_to_messages([
+                {k: v for k, v in m.items() if k in ("role", "content", "tool_calls", "tool_call_id")}
+                for m in request.get("messages", [])
+            ])
+            generation = chat_model.invoke(messages, tools=request.get("tools"))
+            tool_calls = [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["args"], ensure_ascii=False)},
+                }
+                for call in generation.tool_calls
+            ]
+            message = {"role": "assistant", "content": generation.content or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            usage = generation.usage_metadata or {}
+            with lock:
+                stats["completions"] += 1
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-gpt"),
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": usage.get("input_tokens", 0),
+                    "completion_tokens": usage.get("output_tokens", 0),
+                    "total_tokens": usage.get("total_tokens", 0),
+                    "prompt_tokens_details": {
+                        "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read", 0),
+                    },
+                },
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.stats = stats
+    return server
+
+
+def start_fake_openai_server(**kwargs):
+    """Inicia el servidor simulado en un hilo daemon y lo retorna."""
+    server = create_fake_openai_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de 429 aleatorio")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite de requests por minuto")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = create_fake_openai_server(
+        port=args.port, host=args.host, latency_ms=args.latency_ms,
+        error_rate=args.error_rate, rpm=args.rpm, retry_after=args.retry_after,
+    )
+    print(f"[INFO] Servidor OpenAI simulado en http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
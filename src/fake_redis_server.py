@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+🧪 Fake Redis Server - Servidor local compatible con el protocolo RESP
+Implementa el subconjunto que usa state_backends.RedisBackend (PING, AUTH,
+SELECT, GET, SET con EX/PX/NX, DEL, EXISTS y EVAL del script compare-and-set)
+para probar varias réplicas compartiendo estado sin instalar Redis.
+
+Uso:
+    python src/fake_redis_server.py --port 6390
+
+    VETCARE_STATE_BACKEND=redis VETCARE_REDIS_URL=redis://127.0.0.1:6390/0 python src/server.py
+"""
+
+import time
+import argparse
+import threading
+import socketserver
+
+
+def create_fake_redis_server(port: int = 6390, host: str = "127.0.0.1"):
+    """
+    Crea el servidor simulado (sin iniciarlo).
+
+    Returns:
+        ThreadingTCPServer con `server.stats` (commands por nombre) y `server.data`
+    """
+    data = {}  # key -> (value: bytes, expires_at | None)
+    lock = threading.Lock()
+    stats = {}
+
+    def alive(key: bytes):
+        entry = data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del data[key]
+            return None
+        return entry
+
+    def execute(args: list) -> bytes:
+        command = args[0].upper().decode()
+        with lock:
+            stats[command] = stats.get(command, 0) + 1
+            if command == "PING":
+                return b"+PONG\r\n"
+            if command in ("AUTH", "SELECT"):
+                return b"+OK\r\n"
+            if command == "GET":
+                entry = alive(args[1])
+                return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if command == "SET":
+                key, value, expires_at, only_new = args[1], args[2], None, False
+                options = [a.upper() for a in args[3:]]
+                for i, option in enumerate(options):
+                    if option == b"EX":
+                        expires_at = time.time() + float(options[i + 1])
+                    elif option == b"PX":
+                        expires_at = time.time() + float(options[i + 1]) / 1000
+                    elif option == b"NX":
+                        only_new = True
+                if only_new and alive(key) is not None:
+                    return b"$-1\r\n"
+                data[key] = (value, expires_at)
+                return b"+OK\r\n"
+            if command in ("DEL", "EXISTS"):
+                found = sum(alive(key) is not None for key in args[1:])
+                if command == "DEL":
+                    for key in args[1:]:
+                        data.pop(key, None)
+                return b":%d\r\n" % found
+            if command == "EVAL":
+                # Sin intérprete Lua: solo el compare-and-set de RedisBackend.replace_if_equal
+                key, expected, value, ttl_ms = args[3], args[4], args[5], float(args[6])
+                entry = alive(key)
+                if entry is None or entry[0] != expected:
+                    return b":0\r\n"
+                data[key] = (value, time.time() + ttl_ms / 1000 if ttl_ms else None)
+                return b":1\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def _read_command(self):
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b"*"):
+                return line.split()  # comandos inline (p. ej. desde telnet)
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            return args
+
+        def handle(self):
+            while True:
+                args = self._read_command()
+                if args is None:
+                    return
+                if args:
+                    self.wfile.write(execute(args))
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    server.data = data
+    return server
+
+
+def start_fake_redis_server(**kwargs):
+    """Inicia el servidor simulado en un hilo daemon y lo retorna."""
+    server = create_fake_redis_server(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Redis (RESP) simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    server = create_fake_redis_server(port=args.port, host=args.host)
+    print(f"[INFO] Servidor Redis simulado en redis://{args.host}:{args.port}/0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+📚 FAQ Store - Respuestas precalculadas para las preguntas frecuentes
+
+El corpus no cambia entre releases y las preguntas más comunes del RAG
+(vacunas, desparasitación, deberes de la TRM, rabia) son predecibles. Un job
+offline genera sus respuestas con el mismo pipeline RAG (run_rag) y las
+guarda junto con la huella del corpus; en runtime una búsqueda del vecino más
+cercano las sirve en milisegundos, sin embedding, búsqueda ni LLM:
+
+    pregunta ──▶ match léxico (o por embedding) contra las FAQ ──▶ score ≥ umbral → respuesta guardada
+                                                                   └─ si no → RAG normal
+
+Preguntas:
+    - curadas: data/faq_questions.json (con "answer" opcional para fijar una respuesta revisada a mano)
+    - minadas: preguntas "¿...?" que aparecen en el propio corpus
+
+Solo se sirven respuestas verificadas (no vacías ni "no tengo información"),
+y solo a preguntas sobre la misma especie: "vacunar a mi gato" nunca recibe
+la respuesta de "vacunar a mi perro" aunque el resto de las palabras coincida.
+Si cambia el corpus, la lista curada o el modelo del RAG, el store guardado
+deja de servirse hasta regenerarlo con el job offline. VETCARE_FAQ_AUTOBUILD=1
+lo regenera en segundo plano desde el primer build_rag() del proceso (llama
+al LLM por cada pregunta de la lista: no conviene en cada worker del servidor).
+
+Uso (job offline):
+    python src/faq_store.py --build
+    python src/faq_store.py --query "¿Cada cuánto desparasito a mi perro?"
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from metadata_index import normalize_text, detect_query_filter
+from retrieval_cache import normalize_query
+from config import use_fake_models
+from vector_index import INDEX_DIR, corpus_hash
+from model_policy import stage_models
+from rate_limiter import priority
+from tracing import increment
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+FAQ_QUESTIONS_FILE = BASE_DIR / "data" / "faq_questions.json"
+FAQ_STORE_FILE = Path(os.getenv("VETCARE_FAQ_STORE", str(INDEX_DIR / "faq_answers.json")))
+
+FAQ_ENABLED = os.getenv("VETCARE_FAQ", "1") == "1"
+FAQ_MATCH = os.getenv("VETCARE_FAQ_MATCH", "lexical")              # lexical | embedding
+# Umbral del match léxico (coeficiente de Dice sobre palabras de contenido)
+FAQ_MIN_SCORE = float(os.getenv("VETCARE_FAQ_MIN_SCORE", "0.8"))
+# Umbral del match por embedding (similitud coseno)
+FAQ_MIN_SIMILARITY = float(os.getenv("VETCARE_FAQ_MIN_SIMILARITY", "0.92"))
+FAQ_AUTOBUILD = os.getenv("VETCARE_FAQ_AUTOBUILD", "0") == "1"
+
+# Respuesta del RAG cuando el contexto no alcanza: nunca se guarda como FAQ
+NO_ANSWER_MARKER = "no tengo informacion"
+MIN_MINED_WORDS = 4
+
+STOPWORDS = {
+    "a", "al", "de", "del", "el", "la", "las", "lo", "los", "un", "una", "unos", "unas", "y", "o", "e",
+    "en", "con", "por", "para", "que", "se", "su", "sus", "mi", "mis", "tu", "tus", "es", "son",
+    "me", "le", "les", "nos", "muy", "mas", "hay", "esta", "este", "esto", "ese", "esa",
+}
+
+
+# =======================================================
+# 🔤 Match léxico
+# =======================================================
+
+def content_words(text: str) -> frozenset:
+    """Palabras de contenido normalizadas (sin stopwords, plural simple recortado)."""
+    words = set()
+    for word in normalize_query(text).split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("es"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def species_of(text: str) -> frozenset:
+    """Especies mencionadas en la pregunta (vacío si no menciona ninguna)."""
+    return frozenset(detect_query_filter(text).get("species", []))
+
+
+def lexical_score(a: frozenset, b: frozenset) -> float:
+    """Coeficiente de Dice entre dos conjuntos de palabras."""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+# =======================================================
+# ❓ Lista de preguntas
+# =======================================================
+
+def load_curated_questions(path: Path = FAQ_QUESTIONS_FILE) -> list:
+    if not Path(path).exists():
+        return []
+    items = json.loads(Path(path).read_text(encoding="utf-8"))
+    return [{**item, "source": "curated"} for item in items]
+
+
+def mine_questions(docs_dir: Path) -> list:
+    """Preguntas bien formadas ("¿...?") presentes en los documentos del corpus."""
+    mined = []
+    for file in sorted(p for p in Path(docs_dir).glob("**/*") if p.suffix in (".md", ".txt")):
+        text = file.read_text(encoding="utf-8", errors="ignore")
+        for match in re.finditer(r"¿[^¿?\n]{8,150}\?", text):
+            question = match.group(0).replace("*", "").strip()
+            words = question.strip("¿?").split()
+            letters = sum(c.isalpha() for c in question)
+            # Descarta preguntas sin contexto ("¿Qué síntomas produce?") y ruido de OCR
+            if len(words) >= MIN_MINED_WORDS and letters >= 0.75 * len(question.replace(" ", "")):
+                mined.append({"question": question, "source": "mined", "file": file.name})
+    return mined
+
+
+def faq_questions(docs_dir: Path, curated_path: Path = FAQ_QUESTIONS_FILE) -> list:
+    """Curadas primero, luego minadas; sin duplicados."""
+    seen, questions = set(), []
+    for item in load_curated_questions(curated_path) + mine_questions(docs_dir):
+        key = normalize_query(item["question"])
+        if key and key not in seen:
+            seen.add(key)
+            questions.append(item)
+    return questions
+
+
+def questions_hash(questions: list) -> str:
+    raw = json.dumps(questions, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# =======================================================
+# 🏗️ Construcción offline
+# =======================================================
+
+def generator_name() -> str:
+    """Modelo que genera las respuestas (las simuladas nunca se sirven con modelos reales)."""
+    model = stage_models("rag")[0]
+    return f"fake:{model}" if use_fake_models() else model
+
+
+def is_vetted(answer: str) -> bool:
+    """Respuesta apta para servirse sin pasar por el RAG."""
+    return bool(answer.strip()) and NO_ANSWER_MARKER not in normalize_text(answer)
+
+
+def build_faq_store(generate, docs_dir: Path, path: Path = FAQ_STORE_FILE, embeddings=None,
+                    curated_path: Path = FAQ_QUESTIONS_FILE) -> "FAQStore":
+    """
+    Genera las respuestas de todas las FAQ con `generate(pregunta)` (run_rag
+    sin FAQ) y las guarda en `path` con la huella del corpus.
+
+    Con `embeddings` también guarda los vectores de las preguntas (match por embedding).
+    """
+    start = time.perf_counter()
+    questions = faq_questions(docs_dir, curated_path)
+    entries = []
+    for item in questions:
+        if item.get("answer"):
+            answer, source, error = item["answer"], "manual", None
+        else:
+            try:
+                response = generate(item["question"])
+                answer, error = getattr(response, "content", str(response)), None
+            except Exception as e:
+                answer, error = "", str(e)
+            source = item["source"]
+        entries.append({
+            "question": item["question"],
+            "answer": answer,
+            "source": source,
+            "vetted": error is None and is_vetted(answer),
+        })
+        print(f"[INFO] FAQ {'✅' if entries[-1]['vetted'] else '⚠️'} {item['question']}")
+
+    if embeddings is not None and entries:
+        vectors = embeddings.embed_documents([e["question"] for e in entries])
+        for entry, vector in zip(entries, vectors):
+            entry["vector"] = [round(float(v), 6) for v in vector]
+
+    data = {
+        "corpus_hash": corpus_hash(docs_dir),
+        "questions_hash": questions_hash(questions),
+        "generator": generator_name(),
+        "created_at": time.time(),
+        "entries": entries,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+    vetted = sum(e["vetted"] for e in entries)
+    print(f"[INFO] FAQ store con {vetted}/{len(entries)} respuestas verificadas en {path} "
+          f"({time.perf_counter() - start:.1f}s)")
+    return FAQStore(data)
+
+
+# =======================================================
+# 🔎 Store de runtime
+# =======================================================
+
+class FAQStore:
+    """Respuestas verificadas con su índice léxico (y vectores, si se guardaron)."""
+
+    def __init__(self, data: dict):
+        self.corpus_hash = data.get("corpus_hash")
+        self.questions_hash = data.get("questions_hash")
+        self.generator = data.get("generator")
+        self.entries = [e for e in data.get("entries", []) if e.get("vetted")]
+        self.words = [content_words(e["question"]) for e in self.entries]
+        self.species = [species_of(e["question"]) for e in self.entries]
+        self.vectors = None
+        if self.entries and all("vector" in e for e in self.entries):
+            vectors = np.asarray([e["vector"] for e in self.entries], dtype=np.float32)
+            self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    @classmethod
+    def load(cls, path: Path = FAQ_STORE_FILE):
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            return cls(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] No se pudo leer el FAQ store {path}: {e}")
+            return None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, question: str, embed_query=None, match: str = FAQ_MATCH):
+        """
+        Retorna (entrada, score) de la FAQ más parecida si supera el umbral,
+        o None. Solo compiten las FAQ que mencionan exactamente las mismas
+        especies que la pregunta. El match por embedding necesita `embed_query`
+        y vectores guardados.
+        """
+        species = species_of(question)
+        candidates = [i for i, faq_species in enumerate(self.species) if faq_species == species]
+        if not candidates:
+            return None
+        if match == "embedding" and self.vectors is not None and embed_query is not None:
+            vector = np.asarray(embed_query(question), dtype=np.float32)
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+            scores = {i: float(self.vectors[i] @ vector) for i in candidates}
+            threshold = FAQ_MIN_SIMILARITY
+        else:
+            words = content_words(question)
+            scores = {i: lexical_score(words, self.words[i]) for i in candidates}
+            threshold = FAQ_MIN_SCORE
+        best = max(candidates, key=scores.__getitem__)
+        if scores[best] < threshold:
+            return None
+        return self.entries[best], scores[best]
+
+
+_store = None
+_store_lock = threading.Lock()
+_building = threading.Event()
+
+
+def get_faq_store():
+    """Store vigente (None si no hay uno al día con el corpus)."""
+    return _store
+
+
+def ensure_faq_store(generate, docs_dir: Path, embeddings=None, path: Path = FAQ_STORE_FILE):
+    """
+    Carga el FAQ store si corresponde al corpus, a la lista de preguntas y al
+    modelo del RAG actuales. Si falta o quedó viejo, no se sirve y (con VETCARE_FAQ_AUTOBUILD)
+    se regenera en segundo plano con `generate`.
+    """
+    global _store
+    if not FAQ_ENABLED:
+        return None
+
+    store = FAQStore.load(path)
+    expected = (corpus_hash(docs_dir), questions_hash(faq_questions(docs_dir)), generator_name())
+    with _store_lock:
+        if store is not None and (store.corpus_hash, store.questions_hash, store.generator) == expected:
+            _store = store
+            print(f"[INFO] FAQ store cargado: {len(store)} respuestas")
+            return store
+        _store = None
+
+    print("[INFO] FAQ store inexistente o desactualizado (cambió el corpus, las preguntas o el modelo)")
+    if not FAQ_AUTOBUILD:
+        print("[INFO] Regenéralo con: python src/faq_store.py --build")
+    if FAQ_AUTOBUILD and not _building.is_set():
+        _building.set()
+
+        def rebuild():
+            global _store
+            try:
+                # Cede el paso a los turnos de usuarios en el limitador compartido
+                with priority("batch"):
+                    fresh = build_faq_store(generate, docs_dir, path,
+                                            embeddings if FAQ_MATCH == "embedding" else None)
+                with _store_lock:
+                    _store = fresh
+                increment("vetcare_faq_builds_total")
+            except Exception as e:
+                print(f"[WARNING] No se pudo regenerar el FAQ store: {e}")
+            finally:
+                _building.clear()
+
+        threading.Thread(target=rebuild, name="faq-build", daemon=True).start()
+    return None
+
+
+# =======================================================
+# 🧪 CLI
+# =======================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="FAQ store precalculado")
+    parser.add_argument("--build", action="store_true", help="Genera las respuestas con el pipeline RAG")
+    parser.add_argument("--query", help="Busca una pregunta en el store guardado")
+    args = parser.parse_args()
+
+    from rag_agent import DOCS_DIR, build_rag
+
+    if args.build:
+        generate = build_rag(use_faq=False)
+        embeddings = None
+        if FAQ_MATCH == "embedding":
+            from config import get_embeddings
+            embeddings = get_embeddings()
+        build_faq_store(generate, DOCS_DIR, embeddings=embeddings)
+
+    if args.query:
+        store = FAQStore.load()
+        if store is None:
+            print("[WARNING] No hay FAQ store guardado; ejecuta con --build")
+            return
+        start = time.perf_counter()
+        hit = store.lookup(args.query, match="lexical")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if hit is None:
+            print(f"Sin coincidencia ({elapsed_ms:.2f} ms)")
+        else:
+            entry, score = hit
+            print(f"📌 {entry['question']} (score {score:.2f}, {elapsed_ms:.2f} ms)\n\n{entry['answer']}")
+
+
+if __name__ == "__main__":
+    main()
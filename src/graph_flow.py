@@ -5,6 +5,10 @@ Sistema multi-agente usando LangGraph para manejo de flujos complejos
 
 import os
 import sys
+import uuid
+import sqlite3
+import contextlib
+from functools import lru_cache
 from pathlib import Path
 from typing import TypedDict, Literal, Annotated
 from dotenv import load_dotenv
@@ -14,56 +18,57 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.types import Send
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langgraph.graph.message import add_messages
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, RemoveMessage
 
 from router_agent import create_router_agent
 from booking_agent import create_agente_agendamiento
 from rag_agent import build_rag
+from greeting_agent import create_greeting_agent
+from history_manager import create_history_manager, is_summary_message, apply_refreshed_summary
+from conversation_state import ConversationState, SessionRegistry
+from tracing import span, trace_turn, turn_timings, increment
 
 load_dotenv()
 
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Checkpoints de LangGraph (historial por thread_id) en SQLite
+CHECKPOINT_DB = os.getenv("VETCARE_CHECKPOINT_DB", str(BASE_DIR / "data" / "checkpoints.sqlite"))
+# Checkpoints que se conservan por conversación (para reanudar basta el último)
+CHECKPOINT_KEEP = int(os.getenv("VETCARE_CHECKPOINT_KEEP", "2"))
+
 # ═══════════════════════════════════════════════════════════════════
-# 🤖 GREETING AGENT AUXILIAR
+# 📊 ESTADO DEL GRAFO
 # ═══════════════════════════════════════════════════════════════════
 
-def create_greeting_agent():
-    """Crea un agente para responder saludos iniciales."""
-    from langchain_openai import ChatOpenAI
-    from langchain_core.prompts import ChatPromptTemplate
-    
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-    
-    greeting_prompt = ChatPromptTemplate.from_template("""
-Eres un asistente amable de una clínica veterinaria. El usuario ha saludado.
-Responde de manera cálida y ofrece tus servicios principales.
+def merge_history(left: list, right: list) -> list:
+    """
+    Reducer del historial: add_messages (agrega, reemplaza por ID, RemoveMessage)
+    manteniendo el resumen de la compactación como primer mensaje.
+    """
+    merged = add_messages(left, right)
+    summaries = [m for m in merged if is_summary_message(m)]
+    if not summaries:
+        return merged
+    return summaries[-1:] + [m for m in merged if not is_summary_message(m)]
 
-Mensaje del usuario: {query}
 
-Mantén la respuesta breve (2-3 líneas) y en español.
-Menciona que puedes: agendar citas, responder dudas sobre mascotas, o escalar a atención humana.
-""")
-    
-    chain = greeting_prompt | llm
-    
-    def agent(query: str):
-        response = chain.invoke({"query": query})
-        return response.content
-    
-    return agent
+def collect_answers(left: list, right: list) -> list:
+    """Respuestas de las ramas del turno; un None al iniciar el turno las reinicia."""
+    if right is None:
+        return []
+    return (left or []) + right
 
-# ═══════════════════════════════════════════════════════════════════
-# 📊 ESTADO DEL GRAFO
-# ═══════════════════════════════════════════════════════════════════
 
 class AgentState(TypedDict):
     """Estado compartido entre nodos del grafo"""
     query: str                      # Mensaje del usuario
-    chat_history: list[BaseMessage] # Historial de conversación
+    session_id: str                 # Sesión (estado de conversación y agente de booking)
+    chat_history: Annotated[list[BaseMessage], merge_history]  # Historial (persistido por el checkpointer)
     agent_type: Literal["booking", "rag", "greeting", "escalation"]
+    intents: list[str]              # Intenciones del turno (varias → ramas en paralelo)
+    answers: Annotated[list[dict], collect_answers]  # {"agent", "response"} de cada rama
     response: str                   # Respuesta final
     confidence: float               # Confianza del router
     reason: str                     # Razón de la clasificación
@@ -71,11 +76,88 @@ class AgentState(TypedDict):
     metadata: dict                  # Información adicional
 
 
+# ═══════════════════════════════════════════════════════════════════
+# 🗂️ AGENTES COMPARTIDOS Y SESIONES
+# ═══════════════════════════════════════════════════════════════════
+
+# Router, RAG y saludo no guardan estado por usuario: se construyen una vez
+@lru_cache(maxsize=None)
+def get_router():
+    return create_router_agent()
+
+
+@lru_cache(maxsize=None)
+def get_rag():
+    return build_rag()
+
+
+@lru_cache(maxsize=None)
+def get_greeting_agent():
+    return create_greeting_agent()
+
+
+def _new_session(session_id: str) -> dict:
+    # El agente de booking tiene memoria propia del agendamiento en curso
+    return {"conversation": ConversationState(), "booking_agent": create_agente_agendamiento(session_id)}
+
+
+_sessions = SessionRegistry(_new_session)
+
+
+def drop_session(session_id: str):
+    """Descarta el estado, el agente de booking y los checkpoints de una sesión."""
+    _sessions.drop(session_id)
+    checkpointer = get_checkpointer()
+    if hasattr(checkpointer, "delete_thread"):
+        checkpointer.delete_thread(session_id)
+
+
+def export_session(session_id: str) -> dict:
+    """Estado serializable de la sesión (para state_backends.SessionStore)."""
+    session = _sessions.get(session_id)
+    return {"conversation": session["conversation"].to_dict(), "booking": session["booking_agent"].export_state()}
+
+
+def restore_session(session_id: str, state: dict):
+    session = _sessions.get(session_id)
+    session["conversation"] = ConversationState.from_dict(state.get("conversation"))
+    session["booking_agent"].restore_state(state.get("booking", {}))
+
+
 # ═══════════════════════════════════════════════════════════════════
 # 🧭 NODOS DEL GRAFO
 # ═══════════════════════════════════════════════════════════════════
+# Los nodos retornan solo los campos que cambian; chat_history se acumula
+# con el reducer add_messages
 
-def router_node(state: AgentState) -> AgentState:
+def agent_reply(agent: str, response: str) -> dict:
+    """Actualización de estado de un nodo agente; el nodo merge arma la respuesta final."""
+    return {"answers": [{"agent": agent, "response": response}]}
+
+
+def session_node(state: AgentState) -> dict:
+    """
+    Nodo Sesión: si hay un agendamiento en curso y el clasificador local no
+    detecta cambio de tema, fija el agente y el grafo se salta el router.
+    """
+    conversation = _sessions.get(state["session_id"])["conversation"]
+    pinned_agent = conversation.before_turn(state["query"])
+    
+    if pinned_agent:
+        print(f"\n[SESSION] Manteniendo {pinned_agent.upper()} activo (sin router)")
+        return {
+            "agent_type": pinned_agent,
+            "intents": [pinned_agent],
+            "confidence": 1.0,
+            "reason": "Continuando en sesión de agendamiento",
+            "metadata": {"pinned": True},
+        }
+    if conversation.last_transition is not None:
+        print(f"\n[SESSION] Cambio de tema detectado ({conversation.last_transition}), consultando router")
+    return {"metadata": {"pinned": False}}
+
+
+def router_node(state: AgentState) -> dict:
     """
     Nodo Router: Clasifica la intención del usuario
     
@@ -83,25 +165,28 @@ def router_node(state: AgentState) -> AgentState:
         state: Estado actual del grafo
         
     Returns:
-        Estado actualizado con clasificación
+        Campos de clasificación actualizados
     """
     print(f"\n[ROUTER] Procesando: {state['query'][:50]}...")
     
-    router = create_router_agent()
-    result = router(state["query"])
-    
-    # Actualizar estado con clasificación
-    state["agent_type"] = result["intent"]
-    state["confidence"] = result["confidence"]
-    state["reason"] = result["reason"]
+    router = get_router()
+    with span("router.classify"):
+        result = router(state["query"])
     
-    print(f"[ROUTER] → {result['intent'].upper()} (confidence: {result['confidence']:.0%})")
+    intents = result.get("intents", [result["intent"]])
+    print(f"[ROUTER] → {' + '.join(i.upper() for i in intents)} (confidence: {result['confidence']:.0%})")
     print(f"[ROUTER] Razón: {result['reason']}")
     
-    return state
+    # Actualizar estado con clasificación
+    return {
+        "agent_type": result["intent"],
+        "intents": intents,
+        "confidence": result["confidence"],
+        "reason": result["reason"],
+    }
 
 
-def booking_node(state: AgentState) -> AgentState:
+def booking_node(state: AgentState) -> dict:
     """
     Nodo Booking: Maneja agendamiento de citas
     
@@ -109,21 +194,18 @@ def booking_node(state: AgentState) -> AgentState:
         state: Estado actual del grafo
         
     Returns:
-        Estado con respuesta de booking
+        Respuesta de booking
     """
     print(f"\n[BOOKING] Procesando solicitud de cita...")
     
-    agent = create_agente_agendamiento()
+    agent = _sessions.get(state["session_id"])["booking_agent"]
     # El agente retorna solo response
     response = agent(state["query"])
     
-    state["response"] = response
-    state["agent_used"] = "booking"
-    
-    return state
+    return agent_reply("booking", response)
 
 
-def rag_node(state: AgentState) -> AgentState:
+def rag_node(state: AgentState) -> dict:
     """
     Nodo RAG: Responde preguntas sobre cuidados de mascotas
     
@@ -131,12 +213,12 @@ def rag_node(state: AgentState) -> AgentState:
         state: Estado actual del grafo
         
     Returns:
-        Estado con respuesta RAG
+        Respuesta RAG
     """
     print(f"\n[RAG] Buscando información relevante...")
     
-    # Construir la cadena RAG
-    rag_func, rag_retriever = build_rag()
+    # Cadena RAG (construida una sola vez)
+    rag_func = get_rag()
     
     # Invocar la función RAG con el query
     response = rag_func(state["query"])
@@ -147,17 +229,10 @@ def rag_node(state: AgentState) -> AgentState:
     else:
         response_text = response.content if hasattr(response, 'content') else str(response)
     
-    state["response"] = response_text
-    if state["chat_history"] is None:
-        state["chat_history"] = []
-    state["chat_history"].append(HumanMessage(content=state["query"]))
-    state["chat_history"].append(AIMessage(content=response_text))
-    state["agent_used"] = "rag"
-    
-    return state
+    return agent_reply("rag", response_text)
 
 
-def greeting_node(state: AgentState) -> AgentState:
+def greeting_node(state: AgentState) -> dict:
     """
     Nodo Greeting: Maneja saludos y presentación
     
@@ -165,57 +240,117 @@ def greeting_node(state: AgentState) -> AgentState:
         state: Estado actual del grafo
         
     Returns:
-        Estado con respuesta de saludo
+        Respuesta de saludo
     """
     print(f"\n[GREETING] Respondiendo saludo...")
     
-    agent = create_greeting_agent()
+    agent = get_greeting_agent()
     response = agent(state["query"])
     
-    state["response"] = response
-    if state["chat_history"] is None:
-        state["chat_history"] = []
-    state["chat_history"].append(HumanMessage(content=state["query"]))
-    state["chat_history"].append(AIMessage(content=response))
-    state["agent_used"] = "greeting"
-    
-    return state
+    return agent_reply("greeting", response)
+
+
+def merge_node(state: AgentState) -> dict:
+    """
+    Nodo Merge: combina las respuestas de las ramas del turno. La respuesta
+    informativa va primero y la de booking al final, porque termina pidiendo
+    datos al usuario.
+    """
+    answers = sorted(state["answers"], key=lambda a: a["agent"] == "booking")
+    if len(answers) > 1:
+        print(f"\n[MERGE] Combinando {len(answers)} respuestas: {', '.join(a['agent'] for a in answers)}")
+    response = "\n\n".join(a["response"] for a in answers)
+    return {
+        "response": response,
+        "agent_used": "+".join(a["agent"] for a in answers),
+        "chat_history": [AIMessage(content=response)],
+    }
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 🎯 FUNCIONES DE ROUTING CONDICIONAL
 # ═══════════════════════════════════════════════════════════════════
 
-def route_to_agent(state: AgentState) -> Literal["booking", "rag", "greeting"]:
+def route_from_session(state: AgentState) -> Literal["router", "booking"]:
+    """Con agente fijado va directo a él; si no, al router."""
+    return state["agent_type"] if state["metadata"].get("pinned") else "router"
+
+
+def route_to_agent(state: AgentState) -> list:
     """
-    Determina a qué agente enviar basado en la clasificación del router
+    Determina a qué agentes enviar según la clasificación del router. Con
+    varias intenciones se hace fan-out: las ramas corren en paralelo en el
+    mismo paso del grafo y el turno tarda lo que la más lenta.
     
     Args:
         state: Estado actual del grafo
         
     Returns:
-        Nombre del nodo destino
+        Lista de Send, uno por nodo destino
     """
-    agent_type = state["agent_type"]
-    
-    if agent_type == "booking":
-        return "booking"
-    elif agent_type == "rag":
-        return "rag"
-    else:
-        return "greeting"
+    targets = [i for i in state.get("intents") or [state["agent_type"]] if i in ("booking", "rag")]
+    return [Send(agent, state) for agent in targets or ["greeting"]]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 🏗️ CONSTRUCCIÓN DEL GRAFO
 # ═══════════════════════════════════════════════════════════════════
 
-def create_graph_flow():
+def create_checkpointer():
+    """
+    Checkpointer SQLite (langgraph-checkpoint-sqlite): el estado de cada
+    conversación sobrevive entre turnos, procesos y réplicas que compartan
+    el archivo. Sin el paquete, usa checkpoints en memoria.
+    """
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import MemorySaver
+        print("[WARNING] langgraph-checkpoint-sqlite no instalado; checkpoints en memoria")
+        return MemorySaver()
+    
+    Path(CHECKPOINT_DB).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(CHECKPOINT_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    saver = SqliteSaver(conn)
+    saver.setup()
+    return saver
+
+
+@lru_cache(maxsize=None)
+def get_checkpointer():
+    return create_checkpointer()
+
+
+def prune_checkpoints(checkpointer, thread_id: str, keep: int = CHECKPOINT_KEEP) -> int:
+    """
+    Borra los checkpoints antiguos de una conversación (y sus escrituras
+    pendientes); para reanudar solo se necesita el último.
+    """
+    conn = getattr(checkpointer, "conn", None)
+    if conn is None or keep <= 0:
+        return 0
+    with getattr(checkpointer, "lock", contextlib.nullcontext()):
+        old = [row[0] for row in conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?", (thread_id, keep)
+        )]
+        if old:
+            rows = [(thread_id, checkpoint_id) for checkpoint_id in old]
+            conn.executemany("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id = ?", rows)
+            conn.executemany("DELETE FROM writes WHERE thread_id = ? AND checkpoint_id = ?", rows)
+            conn.commit()
+    if old:
+        increment("vetcare_checkpoints_pruned_total", len(old))
+    return len(old)
+
+
+def create_graph_flow(checkpointer=None):
     """
     Crea y compila el grafo de flujo para VetCare AI
     
     Flujo:
-        START → Router → [Booking|RAG|Greeting] → END
+        START → Sesión → (Router) → [Booking|RAG|Greeting] (en paralelo) → Merge → END
     
     Returns:
         Grafo compilado listo para invocar
@@ -225,33 +360,36 @@ def create_graph_flow():
     graph = StateGraph(AgentState)
     
     # Agregar nodos
+    graph.add_node("session", session_node)
     graph.add_node("router", router_node)
     graph.add_node("booking", booking_node)
     graph.add_node("rag", rag_node)
     graph.add_node("greeting", greeting_node)
+    graph.add_node("merge", merge_node)
     
     # Agregar aristas
-    # START → Router (siempre empieza en router)
-    graph.add_edge(START, "router")
-    
-    # Router → [Booking|RAG|Greeting] (condicional)
+    # START → Sesión → Router solo si no hay agente fijado
+    graph.add_edge(START, "session")
     graph.add_conditional_edges(
-        "router",
-        route_to_agent,
+        "session",
+        route_from_session,
         {
-            "booking": "booking",
-            "rag": "rag",
-            "greeting": "greeting"
+            "router": "router",
+            "booking": "booking"
         }
     )
     
-    # Cada agente → END
-    graph.add_edge("booking", END)
-    graph.add_edge("rag", END)
-    graph.add_edge("greeting", END)
+    # Router → [Booking|RAG|Greeting] (fan-out con Send, una rama por intención)
+    graph.add_conditional_edges("router", route_to_agent, ["booking", "rag", "greeting"])
     
-    # Compilar el grafo
-    compiled_graph = graph.compile()
+    # Cada agente → Merge → END (merge espera a todas las ramas del paso)
+    graph.add_edge("booking", "merge")
+    graph.add_edge("rag", "merge")
+    graph.add_edge("greeting", "merge")
+    graph.add_edge("merge", END)
+    
+    # Compilar el grafo (con checkpointer, el estado se guarda por thread_id)
+    compiled_graph = graph.compile(checkpointer=checkpointer)
     
     return compiled_graph
 
@@ -260,54 +398,115 @@ def create_graph_flow():
 # 🚀 FUNCIÓN PRINCIPAL
 # ═══════════════════════════════════════════════════════════════════
 
-def graph_flow(query: str, chat_history: list = None):
+@lru_cache(maxsize=None)
+def get_compiled_graph():
+    """El grafo se compila una sola vez por proceso, con el checkpointer persistente."""
+    return create_graph_flow(get_checkpointer())
+
+
+@lru_cache(maxsize=None)
+def get_history_manager():
+    # El resumen vive dentro del historial, así que un solo compactador sirve a todas las sesiones
+    return create_history_manager()
+
+
+def compact_checkpoint(graph, config: dict, messages: list):
+    """
+    Compacta el historial guardado: los mensajes que salen de la ventana se
+    eliminan del checkpoint (RemoveMessage) y el resumen se reemplaza por ID.
+    """
+    compacted = get_history_manager()(list(messages))
+    kept = {m.id for m in compacted}
+    removed = [RemoveMessage(id=m.id) for m in messages if m.id not in kept]
+    if not removed:
+        return compacted
+    graph.update_state(config, {"chat_history": removed + [compacted[0]]})
+    return compacted
+
+
+def graph_flow(query: str, chat_history: list = None, *, session_id: str):
     """
     Ejecuta el flujo del sistema usando LangGraph
     
+    El historial vive en el checkpointer bajo thread_id = session_id: cada
+    turno envía solo el mensaje nuevo y el grafo parte del último checkpoint,
+    en cualquier worker que comparta la base de checkpoints.
+    
     Args:
         query: Mensaje del usuario
-        chat_history: Historial de conversación anterior
+        chat_history: Historial previo; solo se usa para iniciar una conversación sin checkpoint
+        session_id: Identificador de la conversación (thread_id del checkpointer).
+            Obligatorio: un valor compartido mezclaría conversaciones en el mismo hilo
         
     Returns:
         tuple: (resultado, chat_history_actualizado)
     """
+    graph = get_compiled_graph()
+    config = {"configurable": {"thread_id": session_id}}
+    
+    # Solo el delta del turno: mensaje nuevo (+ historial inicial o resumen refrescado)
+    new_messages = [HumanMessage(content=query)]
+    saved = graph.get_state(config).values.get("chat_history", [])
+    if not saved and chat_history:
+        new_messages = list(chat_history) + new_messages
+    elif apply_refreshed_summary(saved):
+        # El refresco en segundo plano terminó después de guardar el checkpoint
+        new_messages.insert(0, saved[0])
+    
+    # Campos por turno (el historial se acumula con el reducer)
+    turn_input = {
+        "query": query,
+        "session_id": session_id,
+        "chat_history": new_messages,
+        "agent_type": "greeting",
+        "intents": [],
+        "answers": None,
+        "response": "",
+        "confidence": 0.0,
+        "reason": "",
+        "agent_used": "",
+        "metadata": {},
+    }
     
-    if chat_history is None:
-        chat_history = []
-    
-    # Crear estado inicial
-    initial_state = AgentState(
-        query=query,
-        chat_history=chat_history,
-        agent_type="greeting",
-        response="",
-        confidence=0.0,
-        reason="",
-        agent_used="",
-        metadata={}
-    )
-    
-    # Obtener el grafo compilado
-    compiled_graph = create_graph_flow()
+    with trace_turn("graph_flow") as turn:
+        # Ejecutar el grafo (compilado una sola vez)
+        final_state = graph.invoke(turn_input, config)
     
-    # Ejecutar el grafo
-    final_state = compiled_graph.invoke(initial_state)
+    # Fijar o liberar el agente activo según quién respondió (booking al final: queda fijado)
+    conversation = _sessions.get(session_id)["conversation"]
+    for answer in sorted(final_state["answers"], key=lambda a: a["agent"] == "booking"):
+        conversation.after_turn(answer["agent"], answer["response"])
     
-    # Agregar al historial
-    chat_history.append(HumanMessage(content=query))
-    chat_history.append(AIMessage(content=final_state["response"]))
+    # Compactar historial (ventana reciente + resumen) y podar checkpoints viejos
+    chat_history = compact_checkpoint(graph, config, final_state["chat_history"])
+    prune_checkpoints(get_checkpointer(), session_id)
     
     # Resultado
     result = {
         "response": final_state["response"],
         "agent_used": final_state["agent_used"],
         "confidence": final_state["confidence"],
-        "reason": final_state["reason"]
+        "reason": final_state["reason"],
+        "timings": turn_timings(turn)
     }
     
     return result, chat_history
 
 
+def create_graph_session(session_id: str):
+    """
+    Flujo de LangGraph ligado a una sesión, con la misma interfaz que
+    main_flow_traditional: flow(query, chat_history), export_state(), restore_state().
+    """
+    def flow(query: str, chat_history: list = None):
+        return graph_flow(query, chat_history, session_id=session_id)
+    
+    flow.session_id = session_id
+    flow.export_state = lambda: export_session(session_id)
+    flow.restore_state = lambda state: restore_session(session_id, state)
+    return flow
+
+
 def get_graph_visualization():
     """
     Retorna la representación del grafo para debugging
@@ -320,12 +519,16 @@ def get_graph_visualization():
     
     START
       ↓
+    [SESSION NODE]
+      ├─ Agendamiento en curso sin cambio de tema → [BOOKING]
+      └─ Sin agente fijado / cambio de tema → [ROUTER]
+      ↓
     [ROUTER NODE]
       ├─ Clasifica intención del usuario
       └─ Determina destino (Booking|RAG|Greeting)
       ↓
-    ┌─────────────────────────────────────┐
-    │                                     │
+    ┌─────────────────────────────────────┐  (Send: varias intenciones
+    │                                     │   → ramas en paralelo)
     ↓                ↓                    ↓
   [BOOKING]      [RAG]              [GREETING]
     │              │                    │
@@ -335,10 +538,12 @@ def get_graph_visualization():
     │              │                    │
     └─────────────────────────────────────┘
       ↓
+    [MERGE NODE] combina las respuestas
+      ↓
     [END]
     
-    Nodos: 4 (Router, Booking, RAG, Greeting)
-    Edges: 4 (Router→[3 agentes], Todos→END)
+    Nodos: 6 (Session, Router, Booking, RAG, Greeting, Merge)
+    Edges: Session→[Router|Booking], Router→[1..2 agentes], Agentes→Merge→END
     Tipo: Condicional
     """
 
@@ -353,11 +558,15 @@ if __name__ == "__main__":
     print("\n📊 ESTRUCTURA DEL GRAFO:")
     print(get_graph_visualization())
     
+    # Sesión propia del demo (se descarta al final)
+    demo_session = f"demo-{uuid.uuid4().hex}"
+    flow = create_graph_session(demo_session)
+    
     # Test 1: Booking
     print("\n" + "=" * 70)
     print("TEST 1: Booking Request")
     print("=" * 70)
-    result, history = graph_flow("Quiero agendar una cita para mañana")
+    result, history = flow("Quiero agendar una cita para mañana")
     print(f"\n✅ Resultado:")
     print(f"   Agente usado: {result['agent_used']}")
     print(f"   Confianza: {result['confidence']:.0%}")
@@ -367,7 +576,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 70)
     print("TEST 2: RAG Request")
     print("=" * 70)
-    result, history = graph_flow("Mi gato tiene diarrea, ¿qué hago?", history)
+    result, history = flow("Mi gato tiene diarrea, ¿qué hago?", history)
     print(f"\n✅ Resultado:")
     print(f"   Agente usado: {result['agent_used']}")
     print(f"   Confianza: {result['confidence']:.0%}")
@@ -377,7 +586,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 70)
     print("TEST 3: Greeting Request")
     print("=" * 70)
-    result, history = graph_flow("Hola, ¿cómo estás?", history)
+    result, history = flow("Hola, ¿cómo estás?", history)
     print(f"\n✅ Resultado:")
     print(f"   Agente usado: {result['agent_used']}")
     print(f"   Confianza: {result['confidence']:.0%}")
@@ -386,3 +595,4 @@ if __name__ == "__main__":
     print("\n" + "=" * 70)
     print("✅ TODOS LOS TESTS COMPLETADOS")
     print("=" * 70)
+    drop_session(demo_session)
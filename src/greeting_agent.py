@@ -0,0 +1,152 @@
+"""
+👋 Greeting Agent - Saludos desde plantillas, LLM solo para preguntas reales
+
+La mayoría de los primeros turnos son "hola", "buenas tardes" o "gracias":
+la respuesta es siempre presentarse y listar los tres servicios, así que se
+sirve desde un pool de plantillas pre-escritas que rotan (microsegundos, sin
+tokens). El modelo de la etapa "greeting" solo se llama cuando el saludo trae
+una pregunta ("hola, ¿atienden gatos?") que merece una respuesta propia.
+
+Lo usan ambos orquestadores (main_flow y graph_flow).
+
+Métricas:
+    vetcare_greeting_total{source=template|llm}
+"""
+
+import re
+import itertools
+import threading
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from metadata_index import normalize_text
+from model_policy import get_stage_llm
+from tracing import span, record_usage, increment
+
+
+SERVICES = (
+    "Puedo ayudarte a agendar una cita 📅, responder dudas sobre el cuidado de tu mascota 🐶🐱 "
+    "o derivarte con una persona del equipo 👩‍⚕️."
+)
+
+GREETING_TEMPLATES = (
+    "¡Hola! Soy VetCare AI 🐾. " + SERVICES + " ¿En qué te ayudo hoy?",
+    "¡Hola, qué gusto saludarte! Soy el asistente de VetCare 🐾. " + SERVICES + " Cuéntame qué necesitas.",
+    "¡Bienvenido/a a VetCare! 🐾 " + SERVICES + " ¿Por dónde empezamos?",
+    "¡Hola! Aquí VetCare AI, listo para ayudarte 🐾. " + SERVICES + " ¿Qué necesita tu mascota?",
+)
+THANKS_TEMPLATES = (
+    "¡Con gusto! 🐾 Si necesitas algo más, puedo agendar una cita, resolver dudas o derivarte con el equipo.",
+    "¡De nada! Aquí estaré si tu mascota necesita algo más 🐶🐱.",
+)
+FAREWELL_TEMPLATES = (
+    "¡Hasta pronto! 🐾 Cuida mucho a tu mascota.",
+    "¡Que estés muy bien! Aquí estaré cuando me necesites 🐾.",
+)
+
+THANKS_WORDS = ("gracias", "muchas gracias", "mil gracias", "te agradezco")
+FAREWELL_WORDS = ("adios", "chao", "hasta luego", "hasta pronto", "nos vemos", "bye")
+# Un saludo con alguna de estas formas trae una pregunta que el modelo debe responder
+QUESTION_STARTS = ("que ", "como ", "cual", "cuando", "cuanto", "donde", "por que", "quien",
+                   "atienden", "tienen", "hacen", "puedo", "pueden", "necesito", "quisiera", "mi ",
+                   "quiero ", "tengo ")
+# Fórmulas de cortesía que no cuentan como pregunta
+SMALL_TALK = ("como estas", "como esta", "que tal", "como te va", "como va", "todo bien")
+# Saludos que se quitan del inicio de cada cláusula ("hola atienden gatos" → "atienden gatos")
+GREETING_WORDS = ("buenos dias", "buenas tardes", "buenas noches", "buen dia", "buenas",
+                  "hola", "holi", "hey", "saludos")
+_LEADING_GREETING = re.compile(r"^(?:(?:" + "|".join(GREETING_WORDS) + r")\b\s*)+")
+
+
+def needs_llm(query: str) -> bool:
+    """Indica si el saludo trae una pregunta real (más allá de la cortesía)."""
+    text = normalize_text(query)
+    for phrase in SMALL_TALK:
+        text = text.replace(phrase, " ")
+    # Cláusulas separadas por puntuación; conservan su "?" final si lo tenían
+    for clause in re.findall(r"[^¿?¡!,.;]+\??", text):
+        clause = clause.strip()
+        words = clause.split()
+        if clause.endswith("?") and len(words) > 1:
+            return True
+        # Sin signos de pregunta: lo que sigue al saludo debe empezar como pregunta
+        rest = _LEADING_GREETING.sub("", clause)
+        if rest.startswith(QUESTION_STARTS) and len(rest.split()) > 1:
+            return True
+    return False
+
+
+class _Rotation:
+    """Ciclo thread-safe sobre un pool de plantillas."""
+
+    def __init__(self, templates: tuple):
+        self._cycle = itertools.cycle(templates)
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            return next(self._cycle)
+
+
+def create_greeting_agent(llm=None):
+    """
+    Crea el agente de saludos.
+
+    Args:
+        llm: Modelo para saludos con pregunta. Por defecto el de la etapa
+            "greeting" de la política de modelos, creado recién la primera vez
+            que se necesita.
+
+    Retorna: función que recibe el mensaje y retorna la respuesta (str)
+    """
+    rotations = {
+        "greeting": _Rotation(GREETING_TEMPLATES),
+        "thanks": _Rotation(THANKS_TEMPLATES),
+        "farewell": _Rotation(FAREWELL_TEMPLATES),
+    }
+    chain = None
+    chain_lock = threading.Lock()
+
+    greeting_prompt = ChatPromptTemplate.from_messages([
+        ("system", """
+Eres VetCare AI, el asistente de una clínica veterinaria. El usuario saludó y
+además hizo una pregunta o pidió algo concreto.
+1. Responde primero su pregunta, breve y directo (1-2 líneas). Si no tienes el
+   dato exacto (precios, horarios, disponibilidad) dilo sin inventarlo y ofrece
+   agendar una cita o derivarlo con una persona del equipo.
+2. Después, en una sola línea, recuerda que puedes agendar citas, responder
+   dudas sobre el cuidado de mascotas o escalar a atención humana.
+Responde en español, con tono cálido, en no más de 4 líneas.
+"""),
+        ("human", "Mensaje del usuario: {query}"),
+    ])
+
+    def get_chain():
+        nonlocal chain
+        with chain_lock:
+            if chain is None:
+                chain = greeting_prompt | (llm or get_stage_llm("greeting"))
+        return chain
+
+    def template_for(query: str) -> str:
+        text = normalize_text(query).strip(" ¿¡!.,")
+        if text.startswith(THANKS_WORDS):
+            return rotations["thanks"].next()
+        if text.startswith(FAREWELL_WORDS):
+            return rotations["farewell"].next()
+        return rotations["greeting"].next()
+
+    def agent(query: str):
+        if not needs_llm(query):
+            with span("greeting.template"):
+                increment("vetcare_greeting_total", source="template")
+                return template_for(query)
+
+        increment("vetcare_greeting_total", source="llm")
+        with span("llm.greeting"):
+            response = get_chain().invoke({"query": query})
+            record_usage(response)
+        return response.content
+
+    return agent
+
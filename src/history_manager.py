@@ -0,0 +1,355 @@
+"""
+🧠 History Manager - Compactación del historial de conversación
+Mantiene una ventana de mensajes recientes y resume los turnos antiguos
+en un único mensaje de sistema que se refresca en segundo plano.
+
+El estado del resumen vive dentro del propio historial (primer mensaje),
+por lo que un mismo manager sirve tanto para una sesión como para
+orquestadores sin estado como graph_flow.
+
+El historial suele guardarse (SessionStore, checkpoints) antes de que
+termine el refresco, así que el resultado se publica en el backend de estado
+bajo el ID del resumen y se aplica a cualquier copia del historial cuando se
+vuelve a cargar (deserialize_messages, apply_refreshed_summary) o compactar.
+Cada lote de overflow lleva un número: el resumen sabe hasta qué lote cubre
+el texto del LLM y cuáles siguen solo en forma extractiva.
+"""
+
+import os
+import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from model_policy import get_stage_llm
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import SystemMessage, messages_from_dict, messages_to_dict
+
+from rate_limiter import priority
+from state_backends import SESSION_TTL, BackendError, get_backend
+from tracing import span, record_usage
+
+load_dotenv()
+
+
+# Ventana de mensajes recientes (6 turnos usuario/asistente)
+MAX_RECENT_MESSAGES = 12
+# Techo de tokens del historial completo (resumen + ventana)
+MAX_HISTORY_TOKENS = 2000
+# Tamaño máximo del resumen acumulado
+MAX_SUMMARY_CHARS = 1500
+# Hilos compartidos por todos los managers del proceso para refrescar resúmenes
+SUMMARY_WORKERS = int(os.getenv("VETCARE_SUMMARY_WORKERS", "4"))
+
+SUMMARY_KEY = "history_summary"
+SUMMARY_PREFIX = "Resumen de la conversación anterior:\n"
+
+
+# =======================================================
+# 🔢 Conteo de tokens
+# =======================================================
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cuenta tokens con tiktoken; si no está disponible usa ~4 caracteres por token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+
+def count_message_tokens(messages: list) -> int:
+    """Cuenta los tokens de una lista de mensajes (+4 por mensaje de overhead)."""
+    return sum(count_tokens(str(m.content)) + 4 for m in messages)
+
+
+def serialize_messages(messages: list) -> list:
+    """Historial → lista JSON (para guardarlo en un backend de estado)."""
+    return messages_to_dict(messages)
+
+
+def deserialize_messages(data: list) -> list:
+    """Lista JSON → historial, con el último resumen refrescado ya aplicado."""
+    messages = messages_from_dict(data or [])
+    apply_refreshed_summary(messages)
+    return messages
+
+
+def is_summary_message(message) -> bool:
+    """Indica si el mensaje es el resumen generado por el history manager."""
+    return isinstance(message, SystemMessage) and message.additional_kwargs.get(SUMMARY_KEY, False)
+
+
+# =======================================================
+# 📝 Resumen
+# =======================================================
+
+def _clip(text: str, limit: int = MAX_SUMMARY_CHARS) -> str:
+    """Recorta el resumen conservando la parte más reciente."""
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    return "..." + text[-limit:]
+
+
+def _format_messages(messages: list) -> str:
+    lines = []
+    for m in messages:
+        role = "Usuario" if m.type == "human" else "Asistente"
+        lines.append(f"{role}: {m.content}")
+    return "\n".join(lines)
+
+
+def _extractive_summary(previous: str, messages: list) -> str:
+    """Resumen barato sin LLM: concatena los mensajes del usuario recortados."""
+    return _clip(" ".join([previous, _batch_text(messages)]))
+
+
+def _batch_text(messages: list) -> str:
+    return " ".join(str(m.content)[:200] for m in messages if m.type == "human")
+
+
+# =======================================================
+# 🔄 Refrescos persistidos
+# =======================================================
+
+# Protege los mensajes de resumen (el hilo de refresco y el turno los modifican)
+_lock = threading.Lock()
+
+
+def _refresh_key(summary_id: str) -> str:
+    return f"history_summary:{summary_id}"
+
+
+def _summary_state(summary_msg: SystemMessage) -> dict:
+    """
+    Campos del resumen en additional_kwargs:
+        summary_text  texto del LLM
+        folded        último lote cubierto por summary_text
+        batches       lotes plegados en total
+        pending_text  [[lote, texto extractivo]] de los lotes aún sin LLM
+    """
+    state = summary_msg.additional_kwargs
+    if "batches" not in state:
+        # Resumen guardado antes de numerar los lotes: su contenido pasa a ser el texto base
+        state["summary_text"] = state.get("summary_text") or summary_msg.content[len(SUMMARY_PREFIX):].strip()
+        state.update(folded=0, batches=0, pending_text=[])
+    return state
+
+
+def _render(summary_msg: SystemMessage):
+    state = _summary_state(summary_msg)
+    parts = [state["summary_text"]] + [text for _, text in state["pending_text"]]
+    summary_msg.content = SUMMARY_PREFIX + _clip(" ".join(p for p in parts if p))
+
+
+def _apply_refresh(summary_msg: SystemMessage, record: dict) -> bool:
+    """Aplica un refresco si cubre lotes que el mensaje todavía tiene solo en forma extractiva."""
+    state = _summary_state(summary_msg)
+    if record["upto"] <= state["folded"]:
+        return False
+    state["summary_text"] = record["text"]
+    state["folded"] = record["upto"]
+    state["pending_text"] = [entry for entry in state["pending_text"] if entry[0] > record["upto"]]
+    _render(summary_msg)
+    return True
+
+
+def _load_refresh(summary_id: str):
+    try:
+        raw = get_backend().get(_refresh_key(summary_id))
+    except (BackendError, OSError) as e:
+        print(f"⚠️ No se pudo leer el resumen refrescado: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _save_refresh(summary_id: str, text: str, upto: int):
+    current = _load_refresh(summary_id)
+    if current is not None and current["upto"] >= upto:
+        return
+    try:
+        get_backend().set(_refresh_key(summary_id), json.dumps({"text": text, "upto": upto}, ensure_ascii=False),
+                          ttl=SESSION_TTL)
+    except (BackendError, OSError) as e:
+        print(f"⚠️ No se pudo guardar el resumen refrescado: {e}")
+
+
+def apply_refreshed_summary(chat_history: list) -> bool:
+    """
+    Reemplaza in-place el resumen del historial por el último refresco
+    publicado (de este u otro proceso). Retorna True si lo cambió.
+    """
+    if not chat_history or not is_summary_message(chat_history[0]) or not chat_history[0].id:
+        return False
+    record = _load_refresh(chat_history[0].id)
+    if record is None:
+        return False
+    with _lock:
+        return _apply_refresh(chat_history[0], record)
+
+
+# Pool compartido: una sesión no crea hilos propios y las sesiones no esperan unas por otras
+_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="history-summary")
+
+
+def create_history_manager(
+    max_messages: int = MAX_RECENT_MESSAGES,
+    max_tokens: int = MAX_HISTORY_TOKENS,
+    summarizer=None,
+):
+    """
+    Crea un compactador de historial.
+
+    Args:
+        max_messages: Mensajes recientes que se conservan literalmente
+        max_tokens: Techo de tokens para resumen + mensajes recientes
+        summarizer: Función (resumen_previo, mensajes) -> str. Por defecto usa el modelo de la etapa "summary"
+
+    Retorna: función que recibe un chat_history, lo compacta in-place y lo retorna
+    """
+
+    if summarizer is None:
+        llm = get_stage_llm("summary")
+
+        summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", """
+Eres el módulo de memoria de VetCare AI. Actualiza el resumen de la conversación
+incorporando los mensajes nuevos. Conserva SIEMPRE los datos útiles para agendar:
+nombre, teléfono y email del dueño; nombre, especie, raza y edad de la mascota;
+día, hora y motivo de la cita; y los temas consultados.
+Responde solo con el resumen, en español, en menos de 120 palabras.
+"""),
+            ("human", "Resumen previo:\n{summary}\n\nMensajes nuevos:\n{messages}"),
+        ])
+
+        chain = summary_prompt | llm
+
+        def summarizer(previous: str, messages: list) -> str:
+            with span("llm.history_summary"):
+                response = chain.invoke({
+                    "summary": previous or "(vacío)",
+                    "messages": _format_messages(messages)
+                })
+                record_usage(response)
+            return response.content
+
+    # Lotes de overflow pendientes por resumen ([(número, mensajes)] en orden) y resúmenes con un refresco en curso
+    pending = {}
+    refreshing = set()
+
+    def refresh_summary(summary_msg: SystemMessage):
+        """
+        Refresca el resumen con el LLM (corre en segundo plano). Pliega todos
+        los lotes pendientes del resumen, en orden; un solo refresco por
+        resumen a la vez, los lotes que llegan mientras tanto los toma el
+        mismo hilo en la siguiente vuelta. El resultado se publica en el
+        backend de estado para las copias del historial ya guardadas.
+        """
+        key = summary_msg.id
+        with _lock:
+            if key in refreshing:
+                return
+            refreshing.add(key)
+        try:
+            while True:
+                with _lock:
+                    batches = pending.pop(key, [])
+                    if not batches:
+                        refreshing.discard(key)
+                        return
+                    state = _summary_state(summary_msg)
+                    base, folded = state["summary_text"], state["folded"]
+                    extractive = list(state["pending_text"])
+                # Otro proceso pudo refrescar lotes más nuevos que esta copia
+                record = _load_refresh(key)
+                if record is not None and record["upto"] > folded:
+                    base, folded = record["text"], record["upto"]
+                batches = [(number, batch) for number, batch in batches if number > folded]
+                if not batches:
+                    continue
+                # Lotes intermedios que nadie refrescó todavía: entran en su forma extractiva
+                gap = [text for number, text in extractive if folded < number < batches[0][0]]
+                previous = " ".join([base] + gap).strip()
+                overflow = [m for _, batch in batches for m in batch]
+                try:
+                    with priority("batch"):
+                        text = _clip(summarizer(previous, overflow))
+                except Exception as e:
+                    print(f"⚠️ Error resumiendo historial: {e}")
+                    text = _extractive_summary(previous, overflow)
+                record = {"text": text, "upto": batches[-1][0]}
+                _save_refresh(key, **record)
+                with _lock:
+                    _apply_refresh(summary_msg, record)
+        except Exception:
+            with _lock:
+                refreshing.discard(key)
+            raise
+
+    def compact(chat_history: list) -> list:
+        """
+        Compacta el historial in-place.
+
+        Los mensajes que salen de la ventana (o que exceden el techo de tokens)
+        se pliegan en el resumen: primero de forma extractiva e inmediata, y
+        luego con el LLM en segundo plano.
+        """
+        if chat_history is None:
+            return []
+
+        apply_refreshed_summary(chat_history)
+        has_summary = bool(chat_history) and is_summary_message(chat_history[0])
+        summary_msg = chat_history[0] if has_summary else None
+        recent = list(chat_history[1:] if has_summary else chat_history)
+
+        overflow = []
+        while len(recent) > max_messages:
+            overflow.append(recent.pop(0))
+
+        # El techo de tokens reserva espacio para el resumen y nunca descarta el último mensaje
+        budget = max_tokens - MAX_SUMMARY_CHARS // 4
+        while len(recent) > 1 and count_message_tokens(recent) > budget:
+            overflow.append(recent.pop(0))
+
+        if not overflow:
+            return chat_history
+
+        if summary_msg is None:
+            summary_msg = SystemMessage(
+                content=SUMMARY_PREFIX,
+                additional_kwargs={SUMMARY_KEY: True, "summary_text": "", "folded": 0, "batches": 0,
+                                   "pending_text": []},
+                id=uuid.uuid4().hex,  # estable: los checkpoints de LangGraph lo reemplazan por ID
+            )
+        elif summary_msg.id is None:
+            summary_msg.id = uuid.uuid4().hex
+
+        # Resumen provisional inmediato para que el próximo turno no pierda contexto
+        with _lock:
+            state = _summary_state(summary_msg)
+            state["batches"] += 1
+            state["pending_text"].append([state["batches"], _batch_text(overflow)])
+            # Lo que el recorte de _clip no mostraría no vale la pena guardarlo
+            while len(state["pending_text"]) > 1 and \
+                    sum(len(text) for _, text in state["pending_text"][1:]) > MAX_SUMMARY_CHARS:
+                state["pending_text"].pop(0)
+            _render(summary_msg)
+            pending.setdefault(summary_msg.id, []).append((state["batches"], overflow))
+
+        _executor.submit(refresh_summary, summary_msg)
+
+        chat_history[:] = [summary_msg] + recent
+        return chat_history
+
+    return compact
@@ -0,0 +1,135 @@
+"""
+📥 Ingestion - Carga y segmentación paralela del corpus
+Parsea PDF/TXT/MD en un pool de procesos y entrega los chunks en lotes a
+medida que cada archivo termina. Las ventanas acotadas evitan que el parseo
+y los embeddings acumulen el corpus; lo que se retiene al final depende del
+store (el de FAISS guarda todos los textos en RAM, el compacto los escribe
+a disco):
+
+    archivos ──(pool de procesos)──▶ chunks ──▶ embedding_pipeline ──▶ índice
+"""
+
+import os
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from langchain_core.documents import Document
+
+from chunking import CHUNK_SIZE, CHUNK_OVERLAP, split_documents
+from metadata_index import annotate_chunk
+
+
+SUPPORTED_SUFFIXES = (".txt", ".md", ".pdf")
+
+# Procesos de parseo (default: núcleos disponibles)
+INGEST_WORKERS = int(os.getenv("VETCARE_INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+# Con pocos archivos el costo de levantar procesos supera la ganancia
+PARALLEL_MIN_FILES = 4
+# Chunks por lote entregado al pipeline de embeddings (que los reagrupa por tokens)
+CHUNK_BATCH_SIZE = 64
+
+
+# =======================================================
+# 📄 Parseo de un archivo (corre en procesos hijos)
+# =======================================================
+
+def load_file(path: str) -> list:
+    """Carga un archivo como lista de Documents (sin segmentar)."""
+    file = Path(path)
+    suffix = file.suffix.lower()
+
+    # TXT
+    if suffix == ".txt":
+        loaded = TextLoader(str(file), encoding="utf-8").load()
+        return [d for d in loaded if d.page_content.strip() != ""]
+
+    # MD
+    if suffix == ".md":
+        text = file.read_text(encoding="utf-8")
+        if text.strip() == "":
+            return []
+        return [Document(page_content=text, metadata={"source": file.name})]
+
+    # PDF (PyPDFLoader)
+    if suffix == ".pdf":
+        pages = PyPDFLoader(str(file)).load()
+        return [p for p in pages if p.page_content.strip() != ""]
+
+    return []
+
+
+def load_and_split_file(path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Carga, segmenta por estructura (encabezados / secciones) y etiqueta
+    (especie, tema, fuente, sección) un archivo en el proceso hijo.
+    """
+    chunks = split_documents(load_file(path), Path(path).suffix.lower(), chunk_size, chunk_overlap)
+    return [annotate_chunk(chunk) for chunk in chunks]
+
+
+def list_corpus_files(docs_dir: Path) -> list:
+    """Archivos soportados del corpus, en orden estable."""
+    return sorted(
+        str(p) for p in Path(docs_dir).glob("**/*")
+        if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES
+    )
+
+
+# =======================================================
+# ⚙️ Ejecución paralela con ventana acotada
+# =======================================================
+
+def map_files(fn, files: list, workers: int = INGEST_WORKERS):
+    """
+    Aplica `fn` a cada archivo y entrega los resultados en orden.
+
+    Como máximo hay `2 * workers` archivos en vuelo, así que los resultados
+    no se acumulan aunque el consumidor sea más lento que el parseo.
+    """
+    if workers <= 1 or len(files) < PARALLEL_MIN_FILES:
+        for path in files:
+            yield path, fn(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        files_iter = iter(files)
+        for path in files_iter:
+            pending.append((path, pool.submit(fn, path)))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+            next_path = next(files_iter, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(fn, next_path)))
+
+
+def load_documents_parallel(docs_dir: Path, workers: int = INGEST_WORKERS) -> list:
+    """Carga todos los documentos (sin segmentar) usando el pool de procesos."""
+    docs = []
+    for path, loaded in map_files(load_file, list_corpus_files(docs_dir), workers):
+        print(f"    {Path(path).name}: {len(loaded)} documentos")
+        docs.extend(loaded)
+    return docs
+
+
+def iter_chunk_batches(docs_dir: Path, batch_size: int = CHUNK_BATCH_SIZE, workers: int = INGEST_WORKERS):
+    """Genera lotes de chunks a medida que los archivos se parsean y segmentan."""
+    batch = []
+    total_chunks = 0
+    for path, chunks in map_files(load_and_split_file, list_corpus_files(docs_dir), workers):
+        total_chunks += len(chunks)
+        print(f"    {Path(path).name}: {len(chunks)} chunks")
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+    if total_chunks == 0:
+        raise ValueError("No se cargaron documentos con texto.")
@@ -7,66 +7,43 @@ Soporta dos modos de orquestación:
 2. LANGGRAPH (main_flow_graph) - Usando LangGraph para flujos complejos
 """
 
-import os
+import time
+import uuid
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 
 from router_agent import create_router_agent, route_to_agent
 from booking_agent import create_agente_agendamiento
 from rag_agent import build_rag  # Función RAG existente
+from greeting_agent import create_greeting_agent
+from history_manager import create_history_manager
+from conversation_state import ConversationState
+from tracing import trace_turn, turn_timings, start_metrics_server
+from speculation import SPECULATION_ENABLED, Speculation, predict_branch
 
 load_dotenv()
 
 
-# =======================================================
-# 🎨 Greeting Agent - Maneja saludos simples
-# =======================================================
-
-def create_greeting_agent():
-    """Crea un agente para responder saludos iniciales."""
-    
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0.7,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-    
-    greeting_prompt = ChatPromptTemplate.from_template("""
-Eres un asistente amable de una clínica veterinaria. El usuario ha saludado.
-Responde de manera cálida y ofrece tus servicios principales.
-
-Mensaje del usuario: {query}
-
-Mantén la respuesta breve (2-3 líneas) y en español.
-Menciona que puedes: agendar citas, responder dudas sobre mascotas, o escalar a atención humana.
-""")
-    
-    chain = greeting_prompt | llm
-    
-    def agent(query: str):
-        response = chain.invoke({"query": query})
-        return response.content
-    
-    return agent
-
-
 # =======================================================
 # 🌀 Main Flow Tradicional - Orquestación Simple
 # =======================================================
 
-def main_flow_traditional():
+def main_flow_traditional(session_id: str = None):
     """
     Crea el flujo principal que:
     1. Rutea el query según intención
     2. Delega al agente correspondiente
     3. Retorna la respuesta con metadatos
+    
+    El flujo expone `export_state()` / `restore_state(state)` para guardar la
+    sesión en un backend compartido (state_backends.SessionStore).
     """
     
     router = create_router_agent()
-    booking_agent_fn = create_agente_agendamiento()
+    booking_agent_fn = create_agente_agendamiento(session_id)
     greeting_agent_fn = create_greeting_agent()
+    # Compactador del historial (ventana reciente + resumen)
+    compact_history = create_history_manager()
     
     # Construir la cadena RAG
     try:
@@ -76,11 +53,8 @@ def main_flow_traditional():
         print(f"[WARNING] RAG not available: {e}")
         has_rag = False
     
-    # Estado de sesión para mantener el contexto del agente activo
-    session_state = {
-        "active_agent": None,  # "booking", "rag", "greeting", o None
-        "confirmation_pending": False  # True si espera confirmación de agendamiento
-    }
+    # Estado de la conversación: agente fijado y cambios de tema
+    conversation = ConversationState()
     
     def flow(query: str, chat_history: list = None):
         """
@@ -95,68 +69,84 @@ def main_flow_traditional():
                 "response": str (respuesta del agente),
                 "agent_used": str (booking|rag|greeting),
                 "confidence": float (confianza del router),
-                "reason": str (razón de la clasificación)
+                "reason": str (razón de la clasificación),
+                "timings": dict (desglose de latencia y tokens por etapa)
             }
         """
+        with trace_turn("main_flow") as turn:
+            result, chat_history = run_turn(query, chat_history)
+        result["timings"] = turn_timings(turn)
+        return result, chat_history
+    
+    def enhance_rag_query(query: str, chat_history: list) -> str:
+        """Mejora la consulta considerando historial reciente (tema en curso)."""
+        enhanced_query = query
+        if len(chat_history) >= 2:
+            # Buscar contexto en últimos 2 mensajes
+            recent = [m.content for m in chat_history[-4:] if hasattr(m, 'content')]
+            recent_text = " ".join(recent)
+            # Si hay palabras clave de tema específico, enriquecer la consulta
+            if "rabia" in recent_text.lower() and "rabia" not in query.lower():
+                enhanced_query = f"{query} (en contexto de rabia en mascotas)"
+            elif "trm" in recent_text.lower() and "trm" not in query.lower().lower():
+                enhanced_query = f"{query} (sobre tenencia responsable)"
+        return enhanced_query
+    
+    def start_speculation(query: str, chat_history: list):
+        """Arranca en paralelo con el router la rama más probable (RAG o saludo)."""
+        if not SPECULATION_ENABLED:
+            return None
+        branch = predict_branch(query)
+        if branch == "rag" and has_rag:
+            enhanced_query = enhance_rag_query(query, chat_history)
+            return Speculation("rag", lambda cancel: rag_func(enhanced_query, cancel_event=cancel, faq_question=query))
+        if branch == "greeting":
+            return Speculation("greeting", lambda cancel: greeting_agent_fn(query))
+        return None
+    
+    def run_turn(query: str, chat_history: list = None):
+        """Procesa un turno: sesión activa → router → agente."""
         
         if chat_history is None:
             chat_history = []
         
         print(f"\n[USER] {query}")
         
-        # 🔄 LÓGICA DE SESIÓN: Si estamos en un agendamiento, mantén el agente activo
-        if session_state["active_agent"] == "booking":
-            # Verifica si el usuario quiere terminar o cambiar de tema
-            termination_keywords = ["cancelar", "listo", "gracias", "adios", "salir", "terminar"]
-            confirmation_keywords = ["confirma", "confirmo", "sí", "si", "dale", "ok", "okay"]
-            
-            # Si dice confirmación, podría ser confirmación final de cita
-            if any(kw in query.lower() for kw in confirmation_keywords):
-                # Mantén en booking para que confirme la cita
-                print("[SESSION] Manteniendo Booking Agent (posible confirmación)")
-                response = booking_agent_fn(query)
-                
-                # Si la respuesta tiene confirmación completa, libera el agente
-                if "confirmada" in response.lower() or "✅" in response:
-                    session_state["active_agent"] = None
-                    session_state["confirmation_pending"] = False
-                
-                result = {
-                    "response": response,
-                    "agent_used": "booking",
-                    "confidence": 1.0,
-                    "reason": "Continuando en sesión de agendamiento"
-                }
-                chat_history.append(HumanMessage(content=query))
-                chat_history.append(AIMessage(content=response))
-                return result, chat_history
+        # 🔄 LÓGICA DE SESIÓN: con un agendamiento en curso se salta el router,
+        # salvo que el clasificador local detecte un cambio de tema
+        pinned_agent = conversation.before_turn(query)
+        if pinned_agent == "booking":
+            print("[SESSION] Manteniendo Booking Agent activo")
+            response = booking_agent_fn(query)
+            conversation.after_turn("booking", response)
             
-            # Si dice terminar, libera el agente
-            elif any(kw in query.lower() for kw in termination_keywords):
-                session_state["active_agent"] = None
-                session_state["confirmation_pending"] = False
-                print("[SESSION] Finalizando sesión de agendamiento")
-            else:
-                # Sigue en booking sin reclasificar
-                print("[SESSION] Manteniendo Booking Agent activo")
-                response = booking_agent_fn(query)
-                
-                result = {
-                    "response": response,
-                    "agent_used": "booking",
-                    "confidence": 1.0,
-                    "reason": "Continuando en sesión de agendamiento"
-                }
-                chat_history.append(HumanMessage(content=query))
-                chat_history.append(AIMessage(content=response))
-                return result, chat_history
+            result = {
+                "response": response,
+                "agent_used": "booking",
+                "confidence": 1.0,
+                "reason": "Continuando en sesión de agendamiento"
+            }
+            chat_history.append(HumanMessage(content=query))
+            chat_history.append(AIMessage(content=response))
+            return result, compact_history(chat_history)
+        if conversation.last_transition is not None:
+            print(f"[SESSION] Cambio de tema detectado ({conversation.last_transition}), consultando router")
+        
+        # 🔮 Rama probable en paralelo con el router (VETCARE_SPECULATION=1)
+        speculation = start_speculation(query, chat_history)
         
         # 🔀 Router classification (solo si no hay agente activo)
         routing_result = route_to_agent(query, router)
+        router_done = time.perf_counter()
         agent_to_use = routing_result["agent"]
         confidence = routing_result["confidence"]
         reason = routing_result["reason"]
         
+        if speculation is not None and not (routing_result["proceed"] and agent_to_use == speculation.branch):
+            print(f"[SPECULATION] Descartando rama {speculation.branch}")
+            speculation.cancel()
+            speculation = None
+        
         print(f"[ROUTER] {agent_to_use.upper()} (confidence: {confidence:.0%})")
         print(f"   Reason: {reason}")
         
@@ -169,35 +159,16 @@ def main_flow_traditional():
         # Delegate to appropriate agent
         elif agent_to_use == "booking":
             print("[DELEGATE] Booking Agent...")
-            # ✅ ACTIVAR SESIÓN DE AGENDAMIENTO
-            session_state["active_agent"] = "booking"
-            session_state["confirmation_pending"] = True
             response = booking_agent_fn(query)
-            
-            # 🚨 Si el booking agent genera una escalación, liberar sesión
-            if "🚨" in response or "agente humano" in response.lower():
-                print("[ESCALATION] Liberando sesión de agendamiento")
-                session_state["active_agent"] = None
-                session_state["confirmation_pending"] = False
         
         elif agent_to_use == "rag":
             print("[DELEGATE] RAG Agent...")
             if has_rag:
                 try:
-                    # Mejorar la consulta considerando historial reciente
-                    # Si hay mensajes anteriores sobre un tema, incluirlo
-                    enhanced_query = query
-                    if len(chat_history) >= 2:
-                        # Buscar contexto en últimos 2 mensajes
-                        recent = [m.content for m in chat_history[-4:] if hasattr(m, 'content')]
-                        recent_text = " ".join(recent)
-                        # Si hay palabras clave de tema específico, enriquecer la consulta
-                        if "rabia" in recent_text.lower() and "rabia" not in query.lower():
-                            enhanced_query = f"{query} (en contexto de rabia en mascotas)"
-                        elif "trm" in recent_text.lower() and "trm" not in query.lower().lower():
-                            enhanced_query = f"{query} (sobre tenencia responsable)"
-                    
-                    result = rag_func(enhanced_query)
+                    if speculation is not None:
+                        result = speculation.result(router_done)
+                    else:
+                        result = rag_func(enhance_rag_query(query, chat_history), faq_question=query)
                     response = result.content if hasattr(result, 'content') else str(result)
                 except Exception as e:
                     response = f"Error en RAG: {e}"
@@ -206,7 +177,13 @@ def main_flow_traditional():
         
         elif agent_to_use == "greeting":
             print("[DELEGATE] Greeting Agent...")
-            response = greeting_agent_fn(query)
+            if speculation is not None:
+                response = speculation.result(router_done)
+            else:
+                response = greeting_agent_fn(query)
+        
+        # ✅ Fija o libera el agente activo (booking queda fijado hasta confirmar o escalar)
+        conversation.after_turn(agent_to_use, response)
         
         # Return result with metadata
         result = {
@@ -220,8 +197,18 @@ def main_flow_traditional():
         chat_history.append(HumanMessage(content=query))
         chat_history.append(AIMessage(content=response))
         
-        return result, chat_history
+        return result, compact_history(chat_history)
     
+    def export_state() -> dict:
+        return {"conversation": conversation.to_dict(), "booking": booking_agent_fn.export_state()}
+    
+    def restore_state(state: dict):
+        nonlocal conversation
+        conversation = ConversationState.from_dict(state.get("conversation"))
+        booking_agent_fn.restore_state(state.get("booking", {}))
+    
+    flow.export_state = export_state
+    flow.restore_state = restore_state
     return flow
 
 
@@ -277,11 +264,15 @@ def create_main_flow(use_langgraph: bool = False):
         Función que procesa queries
     """
     
+    # Endpoint /metrics opcional (VETCARE_METRICS_PORT)
+    start_metrics_server()
+    
     if use_langgraph:
         print("[INFO] Usando orquestación con LangGraph")
         try:
-            from graph_flow import graph_flow
-            return graph_flow
+            from graph_flow import create_graph_session
+            # Un hilo de checkpoints propio por flujo creado
+            return create_graph_session(uuid.uuid4().hex)
         except ImportError:
             print("[WARN] LangGraph no disponible, usando modo tradicional")
             return main_flow_traditional()
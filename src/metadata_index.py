@@ -0,0 +1,165 @@
+"""
+🏷️ Metadata Index - Metadata de chunks y pre-filtrado de la búsqueda
+
+En la ingesta cada chunk se etiqueta con especie, tema, documento fuente y
+sección. Un índice lateral (valor → posiciones en FAISS) permite restringir
+la búsqueda vectorial antes de puntuar:
+
+    "¿Cómo calmo a mi gato?" ──▶ species=gato ──▶ posiciones de chunks de gatos
+                                                   + chunks generales
+                                                        │
+                                                        ▼
+                                      FAISS search con IDSelectorBatch
+
+Así una pregunta sobre gatos no recorre ni devuelve chunks solo de perros.
+"""
+
+import re
+import json
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+
+METADATA_INDEX_FILE = "metadata_index.json"
+
+# Valor para chunks sin especie detectada: aplican a cualquier consulta
+GENERAL = "general"
+
+# Palabras clave (sin tildes, en minúsculas) por especie
+SPECIES_KEYWORDS = {
+    "perro": ("perro", "perra", "perrito", "canino", "canina", "cachorro"),
+    "gato": ("gato", "gata", "gatito", "felino", "felina"),
+    "ave": ("ave", "aves", "pajaro", "loro", "canario"),
+    "conejo": ("conejo", "coneja"),
+    "humano": ("salud humana", "zoonosis", "zoonotica", "personas", "ser humano"),
+}
+
+TOPIC_KEYWORDS = {
+    "ansiedad": ("ansiedad", "estres", "miedo", "nervios", "relaja", "tranquiliz", "calma"),
+    "vacunacion": ("vacuna", "antirrabic"),
+    "alimentacion": ("aliment", "comida", "dieta", "nutric"),
+    "higiene": ("higiene", "bano", "limpieza", "desparasit", "pulga", "garrapata"),
+    "enfermedades": ("enfermedad", "rabia", "zoonosis", "parasit", "infeccion", "mordedura"),
+    "tenencia": ("tenencia", "responsab", "ley ", "registro", "identificacion", "microchip"),
+    "reproduccion": ("esteriliz", "castrac", "reproduc", "celo", "camada"),
+    "suplementos": ("suplemento", "manzanilla", "valeriana", "aceite esencial", "aromaterapia"),
+}
+
+FILTER_FIELDS = ("species", "topic", "source")
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas y sin tildes, para comparar palabras clave."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _matches(text: str, keywords: tuple, whole_word: bool = False) -> bool:
+    # Especies: palabra completa (con plural); temas: prefijo ("aliment" → alimentación)
+    suffix = r"(s|es)?\b" if whole_word else ""
+    return any(re.search(r"\b" + re.escape(kw) + suffix, text) for kw in keywords)
+
+
+def detect_species(text: str) -> list:
+    normalized = normalize_text(text)
+    return [species for species, kws in SPECIES_KEYWORDS.items() if _matches(normalized, kws, whole_word=True)]
+
+
+def detect_topics(text: str) -> list:
+    normalized = normalize_text(text)
+    return [topic for topic, kws in TOPIC_KEYWORDS.items() if _matches(normalized, kws)]
+
+
+def _first_heading(text: str) -> str:
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            return line.lstrip("#").strip()
+        if line.startswith("**") and line.endswith("**") and len(line) > 4:
+            return line.strip("*").strip()
+    return ""
+
+
+def annotate_chunk(chunk):
+    """Agrega species, topic, source y section a la metadata del chunk (in-place)."""
+    meta = chunk.metadata
+    meta["species"] = detect_species(chunk.page_content) or [GENERAL]
+    meta["topic"] = detect_topics(chunk.page_content) or [GENERAL]
+    meta["source"] = Path(str(meta.get("source", ""))).name
+    meta.setdefault("section", _first_heading(chunk.page_content))
+    return chunk
+
+
+def detect_query_filter(question: str) -> dict:
+    """
+    Filtro de metadata implícito en la pregunta. Solo se filtra por especie:
+    los temas son demasiado ambiguos para excluir chunks con seguridad.
+    """
+    species = detect_species(question)
+    return {"species": species} if species else {}
+
+
+# =======================================================
+# 🗂️ Índice lateral valor → posiciones
+# =======================================================
+
+class MetadataIndex:
+    """Posiciones de FAISS por cada valor de species, topic y source."""
+
+    def __init__(self, postings: dict = None, ntotal: int = 0):
+        self.postings = postings or {field: {} for field in FILTER_FIELDS}
+        self.ntotal = ntotal
+
+    def add(self, chunk):
+        position = self.ntotal
+        for field in FILTER_FIELDS:
+            values = chunk.metadata.get(field) or [GENERAL]
+            if isinstance(values, str):
+                values = [values]
+            for value in values:
+                self.postings[field].setdefault(value, []).append(position)
+        self.ntotal += 1
+
+    def track(self, embedded_batches):
+        """Registra los chunks de cada lote (chunks, vectores) y los deja pasar."""
+        for chunks, vectors in embedded_batches:
+            for chunk in chunks:
+                self.add(chunk)
+            yield chunks, vectors
+
+    def select(self, filters: dict):
+        """
+        Posiciones que cumplen todos los campos del filtro (OR dentro de cada
+        campo). Para species se incluyen siempre los chunks generales.
+
+        Returns:
+            np.ndarray int64, o None si el filtro no excluye nada
+        """
+        selected = None
+        for field, values in filters.items():
+            if field not in self.postings or not values:
+                continue
+            values = list(values) + ([GENERAL] if field == "species" else [])
+            ids = set()
+            for value in values:
+                ids.update(self.postings[field].get(value, ()))
+            selected = ids if selected is None else selected & ids
+        if selected is None or len(selected) >= self.ntotal:
+            return None
+        return np.fromiter(sorted(selected), dtype=np.int64, count=len(selected))
+
+    def save(self, path: Path):
+        Path(path).mkdir(parents=True, exist_ok=True)
+        payload = {"ntotal": self.ntotal, "postings": self.postings}
+        (Path(path) / METADATA_INDEX_FILE).write_text(json.dumps(payload), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path):
+        """Carga el índice lateral (None si no existe)."""
+        file = Path(path) / METADATA_INDEX_FILE
+        if not file.exists():
+            return None
+        payload = json.loads(file.read_text(encoding="utf-8"))
+        return cls(payload["postings"], payload["ntotal"])
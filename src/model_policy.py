@@ -0,0 +1,165 @@
+"""
+🎚️ Model Policy - Modelo por agente/etapa, con fallbacks y costo por etapa
+
+Cada etapa (router, greeting, summary, booking, rag) pide su LLM a la
+política en vez de fijar el modelo en el código:
+
+    router / greeting / summary → tier "fast"      (barato y rápido)
+    booking                     → tier "standard"
+    rag (síntesis)              → tier "strong"
+
+La política se ajusta sin tocar código:
+
+    - model_policy.json en la raíz (o VETCARE_MODEL_POLICY=/ruta/politica.json):
+      tiers, etapas (tier o modelo, fallbacks, temperature) y precios
+    - VETCARE_MODEL_<ETAPA>=modelo_o_tier[,fallback...]   p. ej. VETCARE_MODEL_RAG=strong,standard
+
+Si el modelo principal falla (tras los reintentos del limitador) se usa el
+siguiente de la lista. El costo se calcula con el modelo que efectivamente
+respondió y se suma al span de la etapa.
+
+Métricas:
+    vetcare_llm_cost_usd_total{span, model}
+    vetcare_llm_calls_total{span, model}
+    vetcare_model_fallback_total{stage, model}
+"""
+
+import os
+import json
+from pathlib import Path
+from functools import lru_cache, partial
+
+from langchain_core.runnables import RunnableLambda
+
+from config import get_llm
+from tracing import increment, set_pricing
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_POLICY_FILE = os.getenv("VETCARE_MODEL_POLICY", str(BASE_DIR / "model_policy.json"))
+
+DEFAULT_POLICY = {
+    "tiers": {
+        "fast": "gpt-4.1-nano",
+        "standard": "gpt-4o-mini",
+        "strong": "gpt-4.1-mini",
+    },
+    "stages": {
+        "router": {"model": "fast", "fallbacks": ["standard"], "temperature": 0},
+        "greeting": {"model": "fast", "fallbacks": ["standard"], "temperature": 0.7},
+        "summary": {"model": "fast", "fallbacks": ["standard"], "temperature": 0},
+        "booking": {"model": "standard", "fallbacks": ["strong"], "temperature": 0},
+        "rag": {"model": "strong", "fallbacks": ["standard"], "temperature": 0},
+    },
+    # USD por millón de tokens
+    "prices": {
+        "gpt-4.1-nano": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+        "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+        "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+        "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    },
+}
+
+
+def load_policy(path: str = MODEL_POLICY_FILE) -> dict:
+    """
+    Política efectiva: DEFAULT_POLICY + archivo JSON (si existe) + variables
+    VETCARE_MODEL_<ETAPA>. El archivo puede definir solo lo que cambia.
+    """
+    policy = {key: {name: dict(value) if isinstance(value, dict) else value for name, value in section.items()}
+              for key, section in DEFAULT_POLICY.items()}
+
+    path = Path(path)
+    if path.exists():
+        try:
+            overrides = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING] Política de modelos inválida en {path}: {e}; usando valores por defecto")
+            overrides = {}
+        policy["tiers"].update(overrides.get("tiers", {}))
+        policy["prices"].update(overrides.get("prices", {}))
+        for stage, spec in overrides.get("stages", {}).items():
+            policy["stages"].setdefault(stage, {}).update(spec)
+
+    for stage, spec in policy["stages"].items():
+        value = os.getenv(f"VETCARE_MODEL_{stage.upper()}", "")
+        if value:
+            models = [m.strip() for m in value.split(",") if m.strip()]
+            spec.update({"model": models[0], "fallbacks": models[1:]})
+
+    return policy
+
+
+@lru_cache(maxsize=None)
+def get_policy() -> dict:
+    return load_policy()
+
+
+def stage_models(stage: str, policy: dict = None) -> list:
+    """Modelos de la etapa en orden de uso (principal + fallbacks), con los tiers resueltos."""
+    policy = policy or get_policy()
+    if stage not in policy["stages"]:
+        raise ValueError(f"Etapa sin política de modelo: {stage} ({', '.join(policy['stages'])})")
+    spec = policy["stages"][stage]
+    models = []
+    for name in [spec["model"]] + list(spec.get("fallbacks", [])):
+        model = policy["tiers"].get(name, name)
+        if model not in models:
+            models.append(model)
+    return models
+
+
+def _note_fallback(stage: str, model: str, value):
+    increment("vetcare_model_fallback_total", stage=stage, model=model)
+    print(f"[WARNING] {stage}: modelo principal no disponible, usando {model}")
+    return value
+
+
+def get_stage_llm(stage: str, tools: list = None):
+    """
+    LLM de una etapa según la política (con tools vinculadas si se indican).
+    Con fallbacks retorna un Runnable que prueba cada modelo en orden.
+    """
+    spec = get_policy()["stages"].get(stage, {})
+    runnables = []
+    for i, model in enumerate(stage_models(stage)):
+        llm = get_llm(model=model, temperature=spec.get("temperature", 0))
+        runnable = llm.bind_tools(tools) if tools else llm
+        if i:
+            runnable = RunnableLambda(partial(_note_fallback, stage, model)) | runnable
+        runnables.append(runnable)
+    if len(runnables) == 1:
+        return runnables[0]
+    return runnables[0].with_fallbacks(runnables[1:])
+
+
+# =======================================================
+# 💵 Costo
+# =======================================================
+
+def model_price(model: str, policy: dict = None):
+    """Precio del modelo; acepta snapshots fechados (gpt-4o-mini-2024-07-18)."""
+    prices = (policy or get_policy())["prices"]
+    if model in prices:
+        return prices[model]
+    candidates = [name for name in prices if model.startswith(name + "-")]
+    return prices[max(candidates, key=len)] if candidates else None
+
+
+def usage_cost(model: str, usage: dict) -> float:
+    """Costo en USD de una respuesta según su usage_metadata (0 si el modelo no tiene precio)."""
+    price = model_price(model or "")
+    if price is None:
+        return 0.0
+    input_tokens = usage.get("input_tokens", 0) or 0
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+    return (
+        (input_tokens - cached) * price["input"]
+        + cached * price.get("cached_input", price["input"])
+        + output_tokens * price["output"]
+    ) / 1_000_000
+
+
+set_pricing(usage_cost)
@@ -1,28 +1,45 @@
-import os
+import threading
 from pathlib import Path
 
 from dotenv import load_dotenv
-from pathlib import Path
 
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(env_path)
-# Loaders
-from langchain_community.document_loaders import (
-    TextLoader,
-    PyPDFLoader   # ← EL BUENO para tu caso
-)
 
 # LLM + embeddings
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-# Vector store
-from langchain_community.vectorstores import FAISS
+from config import get_embeddings
+from model_policy import get_stage_llm
 
 # Prompting
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from tracing import span, record_usage, mark_cache_hit
+from ingestion import load_documents_parallel, iter_chunk_batches
+from embedding_pipeline import MAX_INPUTS_PER_REQUEST, embed_corpus_batches, clear_checkpoint
+from vector_index import (
+    INDEX_DIR,
+    INDEX_TYPE,
+    STORE_TYPE,
+    corpus_hash,
+    build_vectorstore_streaming,
+    save_vectorstore,
+    load_vectorstore,
+    read_index_config,
+    write_index_config,
+    build_params,
+    env_search_params,
+    search_ids,
+    get_documents,
+)
+from metadata_index import MetadataIndex, detect_query_filter
+from chunking import CHUNKING_VERSION
+from retrieval_cache import RetrievalCache, index_version
+from state_backends import get_backend
+from reranker import RETRIEVE_K, CONTEXT_K, get_reranker
+from compact_store import COMPACT_DIR, VECTOR_DTYPE, MATRYOSHKA_DIMS, build_compact_store, load_compact_store
+from speculation import SpeculationCancelled
+from faq_store import ensure_faq_store, get_faq_store
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,34 +50,10 @@ DOCS_DIR = BASE_DIR / "data" / "info-mascotas"
 # 🔥 CARGA DOCUMENTOS (TXT, MD, PDF normal)
 # =======================================================
 def load_documents():
-    docs = []
-
+    """Carga todos los documentos (sin segmentar), parseando en paralelo."""
     print("[INFO] Loading documents...\n")
 
-    for file in DOCS_DIR.glob("**/*"):
-        print(f"Found: {file.name}")
-
-        # TXT
-        if file.suffix.lower() == ".txt":
-            loaded = TextLoader(str(file), encoding="utf-8").load()
-            loaded = [d for d in loaded if d.page_content.strip() != ""]
-            print(f"    TXT loaded: {len(loaded)} chunks")
-            docs.extend(loaded)
-
-        # MD
-        elif file.suffix.lower() == ".md":
-            text = file.read_text(encoding="utf-8")
-            if text.strip() != "":
-                docs.append(Document(page_content=text, metadata={"source": file.name}))
-                print("    MD loaded: 1 chunk")
-
-        # PDF (PyPDFLoader)
-        elif file.suffix.lower() == ".pdf":
-            loader = PyPDFLoader(str(file))
-            pages = loader.load()
-            pages = [p for p in pages if p.page_content.strip() != ""]
-            print(f"    PDF loaded: {len(pages)} pages")
-            docs.extend(pages)
+    docs = load_documents_parallel(DOCS_DIR)
 
     print(f"\n[SUCCESS] Total documents: {len(docs)}\n")
 
@@ -73,33 +66,137 @@ def load_documents():
 # =======================================================
 # 🔥 CREAR VECTORSTORE (FAISS)
 # =======================================================
-def create_vectorstore():
-    docs = load_documents()
-
-    # Aumentar chunk_size para que quepan todos los conceptos principales juntos
-    splitter = RecursiveCharacterTextSplitter(chunk_size=3000, chunk_overlap=200)
-    chunks = splitter.split_documents(docs)
-
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
-
-    vectordb = FAISS.from_documents(chunks, embedding=embeddings)
-    return vectordb
+# El índice es de solo lectura en consultas: todas las sesiones comparten uno
+_vectorstore = None
+_metadata_index = None
+_vectorstore_lock = threading.Lock()
+# Vectorstore para el que ya se verificó el FAQ store (una vez por índice, no por sesión)
+_faq_checked_for = None
+_faq_check_lock = threading.Lock()
+# Consulta normalizada → IDs de chunks; se vacía al cambiar la versión del índice
+_retrieval_cache = RetrievalCache(backend=get_backend())
+
+
+def _embedding_model_name(embeddings) -> str:
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def _requested_build_params() -> dict:
+    params = build_params()
+    if STORE_TYPE == "compact":
+        params.update({"vector_dtype": VECTOR_DTYPE, "matryoshka_dims": MATRYOSHKA_DIMS})
+    return params
+
+
+def create_vectorstore(force_rebuild: bool = False):
+    """
+    Retorna el vectorstore del corpus.
+
+    Reutiliza el índice guardado en data/index si el corpus, el tipo de store e
+    índice, sus parámetros de construcción y el modelo de embeddings no
+    cambiaron; si no, lo reconstruye y lo guarda.
+    """
+    global _vectorstore, _metadata_index
+
+    with _vectorstore_lock:
+        if _vectorstore is not None and not force_rebuild:
+            return _vectorstore
+
+        embeddings = get_embeddings()
+        fingerprint = corpus_hash(DOCS_DIR)
+        model_name = _embedding_model_name(embeddings)
+        requested_params = _requested_build_params()
+
+        vectordb = None
+        config = read_index_config(INDEX_DIR)
+        if (
+            not force_rebuild
+            and config is not None
+            and config.get("corpus_hash") == fingerprint
+            and config.get("requested_type") == INDEX_TYPE
+            and config.get("build_params") == requested_params
+            and config.get("store_type", "faiss") == STORE_TYPE
+            and config.get("embedding_model") == model_name
+            and config.get("chunking") == CHUNKING_VERSION
+        ):
+            try:
+                if STORE_TYPE == "compact":
+                    vectordb = load_compact_store(embeddings, COMPACT_DIR, config, env_search_params())
+                else:
+                    vectordb, config = load_vectorstore(embeddings, INDEX_DIR, env_search_params())
+                _metadata_index = MetadataIndex.load(INDEX_DIR)
+                print(f"[INFO] Índice {config['index_type']} cargado desde {INDEX_DIR}")
+            except Exception as e:
+                print(f"[WARNING] No se pudo cargar el índice guardado: {e}")
+
+        if vectordb is None:
+            # Parseo paralelo → lotes por tokens → embeddings concurrentes → índice
+            print("[INFO] Indexing documents...\n")
+            # Mismo limitador que las consultas: reintenta 429/5xx y ajusta la concurrencia
+            ingest_embeddings = get_embeddings(chunk_size=MAX_INPUTS_PER_REQUEST)
+            _metadata_index = MetadataIndex()
+            batches = _metadata_index.track(embed_corpus_batches(iter_chunk_batches(DOCS_DIR), ingest_embeddings))
+            # El total de chunks se conoce al terminar: el índice anterior da la
+            # mejor estimación para dimensionar nlist de IVF
+            expected_total = (config or {}).get("ntotal")
+            if STORE_TYPE == "compact":
+                vectordb, config = build_compact_store(batches, embeddings, COMPACT_DIR, INDEX_TYPE,
+                                                       expected_total=expected_total)
+            else:
+                vectordb, config = build_vectorstore_streaming(batches, embeddings, INDEX_TYPE,
+                                                               expected_total=expected_total)
+            config.update({
+                "store_type": STORE_TYPE,
+                "corpus_hash": fingerprint,
+                "requested_type": INDEX_TYPE,
+                "build_params": requested_params,
+                "embedding_model": model_name,
+                "chunking": CHUNKING_VERSION,
+            })
+            try:
+                if STORE_TYPE == "compact":
+                    # Los archivos del store ya quedaron escritos durante la construcción
+                    write_index_config(config, INDEX_DIR)
+                else:
+                    save_vectorstore(vectordb, config, INDEX_DIR)
+                _metadata_index.save(INDEX_DIR)
+                clear_checkpoint()
+            except Exception as e:
+                print(f"[WARNING] No se pudo guardar el índice: {e}")
+
+        _retrieval_cache.reset(index_version(config))
+        _vectorstore = vectordb
+        return vectordb
+
+
+def _ensure_faq_store_once(run_rag, vectordb):
+    """
+    Verifica el FAQ store una sola vez por vectorstore: hashear el corpus y
+    leer el store en cada build_rag() (una por sesión) es trabajo repetido.
+    Un índice reconstruido (force_rebuild) es otro objeto y vuelve a verificarse.
+    """
+    global _faq_checked_for
+    with _faq_check_lock:
+        if _faq_checked_for is vectordb:
+            return
+        # Si el corpus cambió, el store deja de servirse (con VETCARE_FAQ_AUTOBUILD se regenera con este pipeline)
+        ensure_faq_store(run_rag, DOCS_DIR, vectordb.embedding_function)
+        _faq_checked_for = vectordb
 
 
 # =======================================================
 # 🔥 CONSTRUIR PIPELINE RAG
 # =======================================================
-def build_rag():
+def build_rag(use_faq: bool = True):
+    """
+    Construye el pipeline RAG. Con `use_faq` las preguntas frecuentes se
+    responden desde el FAQ store precalculado (faq_store.py) cuando hay match.
+    """
     vectordb = create_vectorstore()
+    metadata_index = _metadata_index
+    reranker = get_reranker()
     
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
+    llm = get_stage_llm("rag")
 
     prompt = ChatPromptTemplate.from_messages([
         ("system",
@@ -110,29 +207,76 @@ def build_rag():
          "2. Si la pregunta pide enumerar (conceptos, deberes, riesgos, etc.), ENUMERA TODOS los que encuentres\n"
          "3. Usa formato claro con saltos de línea para listas\n"
          "4. Si NO encuentras información relevante, responde: 'Lo siento, no tengo información sobre ese tema específico en mi base de conocimientos.'\n"
-         "5. Sé preciso y literal - no inventes información\n\n"
-         "Contexto disponible:\n{context}"),
-        ("human", "{question}")
+         "5. Sé preciso y literal - no inventes información"),
+        # El contexto cambia en cada consulta: va después del system prompt fijo
+        ("human", "Contexto disponible:\n{context}\n\nPregunta: {question}")
     ])
 
     rag_chain = prompt | llm
     
-    def run_rag(question):
-        """Ejecuta el RAG: busca contexto relevante y genera respuesta"""
-        # Buscar documentos relevantes (aumentar k para mejor cobertura)
-        docs = vectordb.similarity_search(question, k=12)
+    def run_rag(question, cancel_event=None, faq_question=None):
+        """
+        Ejecuta el RAG: busca contexto relevante y genera respuesta.
+        
+        Si se ejecuta de forma especulativa, `cancel_event` permite abortar
+        antes de la llamada al LLM cuando el router eligió otra rama.
+        `faq_question` es la pregunta tal como la escribió el usuario, cuando
+        `question` viene enriquecida con el historial: las FAQ se comparan
+        contra preguntas de usuario, no contra consultas aumentadas.
+        """
+        # Preguntas frecuentes: respuesta precalculada, sin embedding ni LLM
+        faq = get_faq_store() if use_faq else None
+        if faq is not None:
+            with span("rag.faq_lookup"):
+                hit = faq.lookup(faq_question or question, embed_query=vectordb.embedding_function.embed_query)
+                mark_cache_hit(hit is not None)
+            if hit is not None:
+                return AIMessage(content=hit[0]["answer"])
+        
+        # Mientras el índice no cambie, la misma consulta recupera los mismos chunks
+        with span("rag.retrieval_cache"):
+            ids = _retrieval_cache.get(question, RETRIEVE_K)
+            mark_cache_hit(ids is not None)
+        
+        if ids is None:
+            # Embedding de la consulta (separado de la búsqueda para medir cada etapa)
+            with span("rag.embed_query"):
+                query_vector = vectordb.embedding_function.embed_query(question)
+            
+            # Pre-filtrar por metadata (ej: especie mencionada) antes de puntuar vectores
+            positions = None
+            if metadata_index is not None:
+                positions = metadata_index.select(detect_query_filter(question))
+            
+            # Set amplio de candidatos; el reranker elige los que llegan al prompt
+            candidates = len(positions) if positions is not None else "all"
+            with span("rag.similarity_search", k=RETRIEVE_K, candidates=candidates):
+                ids = search_ids(vectordb, query_vector, k=RETRIEVE_K, positions=positions)
+            _retrieval_cache.put(question, RETRIEVE_K, ids)
+        
+        with span("rag.rerank", reranker=reranker.name, candidates=len(ids)):
+            docs = reranker.rerank(question, get_documents(vectordb, ids), top_n=CONTEXT_K)
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise SpeculationCancelled()
         
         # Combinar contexto
-        context = "\n\n---\n\n".join(doc.page_content for doc in docs)
+        with span("rag.context_assembly", documents=len(docs)):
+            context = "\n\n---\n\n".join(doc.page_content for doc in docs)
         
         # Generar respuesta
-        response = rag_chain.invoke({
-            "context": context,
-            "question": question
-        })
+        with span("llm.rag"):
+            response = rag_chain.invoke({
+                "context": context,
+                "question": question
+            })
+            record_usage(response)
         
         return response
     
+    if use_faq:
+        _ensure_faq_store_once(run_rag, vectordb)
+    
     return run_rag
 
 
@@ -140,7 +284,7 @@ def build_rag():
 # 🔥 CLI
 # =======================================================
 def main():
-    rag, retriever = build_rag()
+    run_rag = build_rag()
 
     print("\n=== VetCare AI RAG ===")
 
@@ -149,16 +293,11 @@ def main():
         if q.lower() in ["salir", "exit"]:
             break
 
-        ans = rag.invoke(q)
+        ans = run_rag(q)
 
         print("\n📌 Respuesta:")
         print(ans.content)
 
-        ctx = retriever.invoke(q)
-        print("\n📚 Fragmentos usados:")
-        for d in ctx:
-            print("-", d.page_content[:200], "...")
-
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,477 @@
+"""
+🚦 Rate Limiter - Límite de tasa y concurrencia adaptativa hacia OpenAI
+
+Router, booking, RAG y los jobs por lotes comparten un limitador por modelo:
+
+    llamada ──▶ cola por prioridad ──▶ bucket RPM + bucket TPM ──▶ slot de concurrencia ──▶ API
+                booking > interactive > batch                      (AIMD)
+
+    - Token buckets de requests/min y tokens/min (VETCARE_OPENAI_RPM / _TPM);
+      los tokens se estiman antes de la llamada y se ajustan con el usage real
+    - Prioridades: un turno de agendamiento pasa antes que la ingesta del corpus
+    - AIMD: cada 429, timeout o respuesta sobre el SLO de latencia divide el
+      límite de concurrencia a la mitad; cada éxito lo recupera de a poco
+    - Un 429 pausa el limitador entero (Retry-After o backoff exponencial) y la
+      llamada se reintenta desde la cola, en vez de fallar el turno
+    - Los 5xx y errores de conexión no son congestión: no tocan el límite, pero
+      la llamada espera su propio backoff y se reintenta (el cliente de OpenAI
+      corre con max_retries=0 cuando el limitador está activo)
+    - Cubre invoke, ainvoke y streaming de los chat models (un stream ocupa su
+      slot hasta el último chunk y no se reintenta) y todos los embeddings
+
+Métricas:
+    vetcare_llm_queue_depth{limiter, priority}      gauge
+    vetcare_llm_in_flight{limiter}                  gauge
+    vetcare_llm_concurrency_limit{limiter}          gauge
+    vetcare_llm_queue_wait_seconds{limiter, priority}
+    vetcare_llm_requests_total{limiter, outcome=ok|throttled|timeout|error}
+
+Se puede probar contra fake_openai_server.py (--rpm / --error-rate inyectan 429).
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import random
+import itertools
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.embeddings import Embeddings
+
+from tracing import increment, observe, set_gauge
+
+
+RATE_LIMIT_ENABLED = os.getenv("VETCARE_RATE_LIMIT", "1") == "1"
+OPENAI_RPM = int(os.getenv("VETCARE_OPENAI_RPM", "500"))           # 0 = sin límite
+OPENAI_TPM = int(os.getenv("VETCARE_OPENAI_TPM", "200000"))        # 0 = sin límite
+MAX_CONCURRENCY = int(os.getenv("VETCARE_LLM_MAX_CONCURRENCY", "16"))
+# Una respuesta más lenta que esto cuenta como señal de congestión
+LATENCY_SLO_S = float(os.getenv("VETCARE_LLM_LATENCY_SLO_MS", "20000")) / 1000
+
+# Tokens de salida que se reservan por llamada antes de conocer el usage real
+OUTPUT_TOKENS_ESTIMATE = 300
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 30.0
+# Varias fallas simultáneas reducen el límite una sola vez
+DECREASE_COOLDOWN_S = 1.0
+
+PRIORITIES = {"booking": 0, "interactive": 1, "batch": 2}
+
+_priority = ContextVar("vetcare_llm_priority", default="interactive")
+
+
+@contextmanager
+def priority(name: str):
+    """Clase de prioridad de las llamadas al modelo hechas dentro del bloque."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Prioridad desconocida: {name} ({', '.join(PRIORITIES)})")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+# =======================================================
+# 🔎 Clasificación de errores
+# =======================================================
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Detecta un 429 (openai.RateLimitError u otro cliente HTTP)."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "429" in str(error) or "rate limit" in str(error).lower()
+
+
+def is_timeout_error(error: Exception) -> bool:
+    """TimeoutError, openai.APITimeoutError, httpx.ReadTimeout..."""
+    return isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+
+
+def is_server_error(error: Exception) -> bool:
+    """5xx o falla de conexión (openai.InternalServerError, APIConnectionError...): transitorio."""
+    for source in (error, getattr(error, "response", None)):
+        status = getattr(source, "status_code", None)
+        if isinstance(status, int) and status >= 500:
+            return True
+    name = type(error).__name__
+    return any(kind in name for kind in ("APIConnectionError", "InternalServerError", "ServiceUnavailable"))
+
+
+def retry_after_seconds(error: Exception):
+    """Lee Retry-After de la respuesta, si existe."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# =======================================================
+# 🪣 Token bucket
+# =======================================================
+
+class TokenBucket:
+    """
+    Bucket con capacidad de un minuto de cuota que se rellena continuamente.
+    Puede quedar en negativo: una llamada más grande que la capacidad pasa
+    con el bucket lleno y las siguientes pagan la deuda.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` disponible (0 si ya hay)."""
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Consume (o devuelve, si es negativo) cuota."""
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+
+# =======================================================
+# 🚦 Limitador
+# =======================================================
+
+class RateLimiter:
+    """Cola por prioridad + buckets RPM/TPM + límite de concurrencia AIMD."""
+
+    def __init__(self, name: str, rpm: int = OPENAI_RPM, tpm: int = OPENAI_TPM,
+                 max_concurrency: int = MAX_CONCURRENCY, latency_slo_s: float = LATENCY_SLO_S):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.maximum = max(1, max_concurrency)
+        self.limit = float(self.maximum)
+        self.latency_slo_s = latency_slo_s
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self._waiters = []  # heap de (prioridad, orden de llegada)
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self):
+        depth = dict.fromkeys(PRIORITIES, 0)
+        names = {rank: name for name, rank in PRIORITIES.items()}
+        for rank, _ in self._waiters:
+            depth[names[rank]] += 1
+        for name, count in depth.items():
+            set_gauge("vetcare_llm_queue_depth", count, limiter=self.name, priority=name)
+        set_gauge("vetcare_llm_in_flight", self.in_flight, limiter=self.name)
+        set_gauge("vetcare_llm_concurrency_limit", int(self.limit), limiter=self.name)
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.wait_time(1),
+            self.tokens.wait_time(tokens),
+        )
+
+    def acquire(self, tokens: float, priority_name: str = "interactive"):
+        """Bloquea hasta que la llamada es la primera de la cola y hay cuota y slot."""
+        entry = (PRIORITIES.get(priority_name, PRIORITIES["interactive"]), next(self._order))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            self._publish()
+            while True:
+                timeout = None
+                if self._waiters[0] == entry and self.in_flight < int(self.limit):
+                    timeout = self._wait_time(tokens)
+                    if timeout <= 0:
+                        break
+                self._cond.wait(timeout)
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            self._publish()
+            self._cond.notify_all()
+        observe("vetcare_llm_queue_wait_seconds", time.monotonic() - start,
+                limiter=self.name, priority=priority_name)
+
+    def release(self, tokens: float, latency: float, outcome: str = "ok",
+                used_tokens: float = None, retry_after: float = None, attempt: int = 0):
+        """
+        Libera el slot y ajusta el límite: aumento aditivo con cada éxito rápido,
+        reducción multiplicativa ante 429, timeouts o latencia sobre el SLO.
+        """
+        increment("vetcare_llm_requests_total", limiter=self.name, outcome=outcome)
+        with self._cond:
+            self.in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.take(used_tokens - tokens)
+            now = time.monotonic()
+            congested = outcome in ("throttled", "timeout") or (outcome == "ok" and latency > self.latency_slo_s)
+            if congested:
+                if now - self.last_decrease > DECREASE_COOLDOWN_S:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+            elif outcome == "ok":
+                self.limit = min(float(self.maximum), self.limit + 1 / max(1.0, self.limit))
+            if outcome == "throttled":
+                delay = retry_after or min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt) * random.uniform(1.0, 1.5)
+                self.paused_until = max(self.paused_until, now + delay)
+            self._publish()
+            self._cond.notify_all()
+
+    @staticmethod
+    def _outcome(error: Exception) -> str:
+        return "throttled" if is_rate_limit_error(error) else "timeout" if is_timeout_error(error) else "error"
+
+    @staticmethod
+    def _error_backoff(error: Exception, attempt: int) -> float:
+        """Espera antes de reintentar una falla del proveedor (solo esta llamada, sin pausar el limitador)."""
+        delay = retry_after_seconds(error) or min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt)
+        return delay * random.uniform(1.0, 1.5)
+
+    def _failed(self, error: Exception, tokens: float, start: float, attempt: int, retry: bool,
+                priority_name: str) -> float:
+        """
+        Libera el slot de un intento fallido. Retorna la espera antes de
+        reintentar (0 si el reintento va directo a la cola) o None si el error
+        no se reintenta.
+        """
+        outcome = self._outcome(error)
+        self.release(tokens, time.monotonic() - start, outcome,
+                     retry_after=retry_after_seconds(error), attempt=attempt)
+        transient = outcome != "error" or is_server_error(error)
+        if not transient or not retry or attempt == MAX_RETRIES:
+            return None
+        print(f"[WARNING] {outcome} en {self.name} ({priority_name}), reintento {attempt + 1}/{MAX_RETRIES}")
+        return self._error_backoff(error, attempt) if outcome == "error" else 0.0
+
+    def call(self, fn, tokens: float, used_tokens=None, retry: bool = True):
+        """
+        Ejecuta fn() dentro del limitador. Los 429, timeouts, 5xx y errores de
+        conexión se reintentan desde la cola (con la misma prioridad) hasta
+        MAX_RETRIES veces.
+
+        Args:
+            fn: Llamada al proveedor
+            tokens: Tokens estimados (prompt + salida)
+            used_tokens: Función resultado -> tokens reales (o None) para corregir el bucket TPM
+            retry: False si el llamador maneja sus propios reintentos
+        """
+        priority_name = current_priority()
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(tokens, priority_name)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._failed(e, tokens, start, attempt, retry, priority_name)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            used = used_tokens(result) if used_tokens else None
+            self.release(tokens, time.monotonic() - start, used_tokens=used)
+            return result
+
+    async def _acquire_async(self, tokens: float, priority_name: str):
+        """acquire() en un hilo, sin bloquear el event loop; si se cancela la espera, el slot se devuelve."""
+        waiter = asyncio.ensure_future(asyncio.to_thread(self.acquire, tokens, priority_name))
+        try:
+            await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            waiter.add_done_callback(
+                lambda f: f.cancelled() or f.exception() or self.release(tokens, 0.0, "error"))
+            raise
+
+    async def acall(self, coro_fn, tokens: float, used_tokens=None, retry: bool = True):
+        """Versión async de call(): coro_fn() retorna la corrutina de la llamada al proveedor."""
+        priority_name = current_priority()
+        for attempt in range(MAX_RETRIES + 1):
+            await self._acquire_async(tokens, priority_name)
+            start = time.monotonic()
+            try:
+                result = await coro_fn()
+            except Exception as e:
+                delay = self._failed(e, tokens, start, attempt, retry, priority_name)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            used = used_tokens(result) if used_tokens else None
+            self.release(tokens, time.monotonic() - start, used_tokens=used)
+            return result
+
+    def stream(self, fn, tokens: float):
+        """
+        Respuesta en streaming: el slot queda ocupado hasta el último chunk.
+        Sin reintentos, porque parte de la respuesta ya se entregó.
+        """
+        self.acquire(tokens, current_priority())
+        start, error = time.monotonic(), None
+        try:
+            yield from fn()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._stream_done(tokens, start, error)
+
+    async def astream(self, fn, tokens: float):
+        """Versión async de stream(): fn() retorna un iterador asíncrono de chunks."""
+        await self._acquire_async(tokens, current_priority())
+        start, error = time.monotonic(), None
+        try:
+            async for chunk in fn():
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._stream_done(tokens, start, error)
+
+    def _stream_done(self, tokens: float, start: float, error: Exception):
+        if error is None:
+            self.release(tokens, time.monotonic() - start)
+        else:
+            self.release(tokens, time.monotonic() - start, self._outcome(error),
+                         retry_after=retry_after_seconds(error))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queued": len(self._waiters),
+                "in_flight": self.in_flight,
+                "concurrency_limit": int(self.limit),
+            }
+
+
+@lru_cache(maxsize=None)
+def get_limiter(model: str) -> RateLimiter:
+    """Un limitador por modelo (los límites del proveedor son por modelo)."""
+    return RateLimiter(model)
+
+
+# =======================================================
+# 🤖 LLM
+# =======================================================
+
+def _estimate_prompt_tokens(messages) -> int:
+    return sum(len(str(m.content)) // 4 + 4 for m in messages)
+
+
+def _chat_usage(result):
+    usage = result.generations[0].message.usage_metadata if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+
+class RateLimitedChatMixin:
+    """
+    Mixin para un BaseChatModel: cada llamada pasa por el limitador de su
+    modelo, sea sync, async o en streaming.
+    """
+
+    def _limited(self, messages):
+        return get_limiter(self.model_name), _estimate_prompt_tokens(messages) + OUTPUT_TOKENS_ESTIMATE
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._generate
+        limiter, tokens = self._limited(messages)
+        return limiter.call(
+            lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens,
+            used_tokens=_chat_usage,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._agenerate
+        limiter, tokens = self._limited(messages)
+        return await limiter.acall(
+            lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens,
+            used_tokens=_chat_usage,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._stream
+        limiter, tokens = self._limited(messages)
+        yield from limiter.stream(lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs), tokens)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._astream
+        limiter, tokens = self._limited(messages)
+        async for chunk in limiter.astream(
+                lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs), tokens):
+            yield chunk
+
+
+# Implementaciones por defecto de BaseChatModel: delegan en _generate (ya
+# limitado) o indican que el modelo no hace streaming, así que no se envuelven
+_DEFAULT_METHODS = ("_agenerate", "_stream", "_astream")
+
+
+@lru_cache(maxsize=None)
+def rate_limited(model_cls):
+    """Subclase de model_cls que respeta el limitador (una por clase de modelo)."""
+    if not RATE_LIMIT_ENABLED:
+        return model_cls
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+    namespace = {name: getattr(BaseChatModel, name) for name in _DEFAULT_METHODS
+                 if getattr(model_cls, name) is getattr(BaseChatModel, name)}
+    return type(f"RateLimited{model_cls.__name__}", (RateLimitedChatMixin, model_cls), namespace)
+
+
+# =======================================================
+# 🔢 Embeddings
+# =======================================================
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings. Consultas y lotes de ingesta
+    (embed_documents) pasan por el mismo limitador y reintentan desde la cola:
+    el pipeline de embeddings no tiene un límite de concurrencia propio.
+    """
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+        self.model = getattr(inner, "model", None) or type(inner).__name__
+
+    def embed_documents(self, texts: list) -> list:
+        tokens = sum(len(t) // 4 + 1 for t in texts)
+        return get_limiter(self.model).call(lambda: self.inner.embed_documents(texts), tokens)
+
+    def embed_query(self, text: str) -> list:
+        return get_limiter(self.model).call(lambda: self.inner.embed_query(text), len(text) // 4 + 1)
+
+
+def rate_limited_embeddings(embeddings: Embeddings) -> Embeddings:
+    if not RATE_LIMIT_ENABLED:
+        return embeddings
+    return RateLimitedEmbeddings(embeddings)
@@ -0,0 +1,157 @@
+"""
+🥇 Reranker - Reordena los candidatos de FAISS antes de armar el prompt
+
+    FAISS (20 candidatos) ──▶ reranker ──▶ top 4 ──▶ prompt del RAG
+
+Recuperar un set amplio y enviar solo los mejores al LLM reduce los tokens
+de entrada sin perder la cobertura que antes se buscaba con k=12.
+
+Rerankers disponibles (VETCARE_RERANKER):
+    lexical        Solapamiento de términos ponderado por IDF, fusionado con el
+                   orden vectorial (default, sin dependencias, ~2 ms con 20 candidatos)
+    cross_encoder  Cross-encoder local en CPU (sentence-transformers, opcional)
+    none           Conserva el orden de FAISS
+"""
+
+import os
+import re
+import math
+import time
+from functools import lru_cache
+from collections import Counter
+
+from metadata_index import normalize_text
+from tracing import increment
+
+
+RERANKER = os.getenv("VETCARE_RERANKER", "lexical")
+RERANK_MODEL = os.getenv("VETCARE_RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+# Presupuesto de CPU por consulta; al agotarse se conserva el orden vectorial del resto
+RERANK_BUDGET_MS = float(os.getenv("VETCARE_RERANK_BUDGET_MS", "150"))
+
+# Candidatos recuperados de FAISS y chunks que llegan al prompt
+RETRIEVE_K = int(os.getenv("VETCARE_RETRIEVE_K", "20"))
+CONTEXT_K = int(os.getenv("VETCARE_CONTEXT_K", "4"))
+
+# Constante de Reciprocal Rank Fusion
+RRF_K = 60
+
+STOPWORDS = frozenset("""
+a al algo como con cual cuales cuando de del el ella en es esta este esto hay la las le lo los
+mas me mi mis muy no o para pero por que se si sin sobre su sus te tu tus un una uno y ya debo
+puedo hacer tiene tienen son ser cada
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Términos normalizados (sin tildes ni stopwords), truncados a 6 letras como stemming barato."""
+    words = re.findall(r"[a-z0-9]+", normalize_text(text))
+    return [w[:6] for w in words if len(w) > 2 and w not in STOPWORDS]
+
+
+class NoReranker:
+    name = "none"
+
+    def rerank(self, query: str, docs: list, top_n: int = CONTEXT_K) -> list:
+        return docs[:top_n]
+
+
+class LexicalReranker:
+    """
+    Puntaje BM25 simplificado (IDF calculado sobre los candidatos) más un bonus
+    si el término aparece en la ruta de encabezados; se fusiona con el orden
+    vectorial mediante Reciprocal Rank Fusion.
+    """
+
+    name = "lexical"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, heading_weight: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.heading_weight = heading_weight
+
+    def scores(self, query: str, docs: list) -> list:
+        terms = set(tokenize(query))
+        if not terms or not docs:
+            return [0.0] * len(docs)
+
+        doc_terms = [Counter(tokenize(d.page_content)) for d in docs]
+        avg_len = sum(sum(c.values()) for c in doc_terms) / len(docs) or 1.0
+        df = Counter(t for c in doc_terms for t in terms if t in c)
+
+        scores = []
+        for doc, counts in zip(docs, doc_terms):
+            length = sum(counts.values()) or 1
+            heading = set(tokenize(doc.metadata.get("heading_path", "")))
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+                if term in heading:
+                    score += self.heading_weight * idf
+            scores.append(score)
+        return scores
+
+    def rerank(self, query: str, docs: list, top_n: int = CONTEXT_K) -> list:
+        scores = self.scores(query, docs)
+        lexical_rank = {i: r for r, i in enumerate(sorted(range(len(docs)), key=lambda i: -scores[i]))}
+        fused = sorted(
+            range(len(docs)),
+            key=lambda i: -(1 / (RRF_K + i) + (1 / (RRF_K + lexical_rank[i]) if scores[i] > 0 else 0)),
+        )
+        return [docs[i] for i in fused[:top_n]]
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder local (sentence-transformers). Puntúa en lotes pequeños y
+    se detiene al agotar el presupuesto: los candidatos sin puntaje quedan
+    detrás de los puntuados, en el orden de FAISS.
+    """
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: str = RERANK_MODEL, budget_ms: float = RERANK_BUDGET_MS,
+                 batch_size: int = 4, max_chars: int = 1200):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu", max_length=256)
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+
+    def rerank(self, query: str, docs: list, top_n: int = CONTEXT_K) -> list:
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        scored = []
+        for start in range(0, len(docs), self.batch_size):
+            if time.perf_counter() > deadline:
+                increment("vetcare_rerank_budget_exceeded_total", reranker=self.name)
+                break
+            batch = docs[start:start + self.batch_size]
+            pairs = [(query, d.page_content[:self.max_chars]) for d in batch]
+            for offset, score in enumerate(self.model.predict(pairs)):
+                scored.append((float(score), start + offset))
+
+        scored_ids = [i for _, i in sorted(scored, key=lambda s: -s[0])]
+        seen = set(scored_ids)
+        rest = [i for i in range(len(docs)) if i not in seen]
+        return [docs[i] for i in (scored_ids + rest)[:top_n]]
+
+
+@lru_cache(maxsize=None)
+def get_reranker(name: str = RERANKER):
+    """
+    Reranker configurado (uno por proceso: el cross-encoder se carga una sola vez).
+    Si el cross-encoder no está disponible usa el léxico.
+    """
+    if name == "none":
+        return NoReranker()
+    if name == "cross_encoder":
+        try:
+            return CrossEncoderReranker()
+        except Exception as e:
+            print(f"[WARNING] Cross-encoder no disponible ({e}); usando reranker léxico")
+    return LexicalReranker()
@@ -0,0 +1,95 @@
+"""
+🔁 Retrieval Cache - Caché de consulta → IDs de chunks
+
+El mapeo (pregunta normalizada, k) → top-k IDs no cambia mientras el índice
+sea el mismo, aunque la respuesta se vuelva a generar. Una consulta repetida
+se salta el embedding y la búsqueda FAISS.
+
+Cada entrada queda asociada a la versión del índice (huella del corpus +
+fecha de construcción): al reconstruirlo la caché se vacía sola.
+
+Con un backend de estado compartido (state_backends) el LRU local actúa como
+primer nivel y las réplicas comparten las entradas a través del backend.
+"""
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+
+from metadata_index import normalize_text
+
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("VETCARE_RETRIEVAL_CACHE_SIZE", "1024"))
+# Las entradas compartidas de versiones viejas del índice expiran solas
+RETRIEVAL_CACHE_TTL = 7 * 24 * 3600
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes, sin signos de puntuación y espacios colapsados."""
+    text = re.sub(r"[^\w\s]", " ", normalize_text(query))
+    return " ".join(text.split())
+
+
+def index_version(config: dict) -> str:
+    """Sello de versión del índice guardado en index_config.json."""
+    return f"{config.get('corpus_hash', '')[:16]}:{config.get('created_at', '')}"
+
+
+class RetrievalCache:
+    """LRU acotado y thread-safe de (pregunta normalizada, k) → IDs de chunks."""
+
+    def __init__(self, maxsize: int = RETRIEVAL_CACHE_SIZE, backend=None):
+        self.maxsize = maxsize
+        # Solo se consulta un backend compartido entre procesos
+        self.backend = backend if backend is not None and backend.shared else None
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reset(self, version: str):
+        """Fija la versión del índice; si cambió, descarta todas las entradas."""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+
+    def _shared_key(self, key: tuple) -> str:
+        return f"retrieval:{self.version}:{key[1]}:{key[0]}"
+
+    def get(self, query: str, k: int):
+        """Retorna la lista de IDs cacheada o None."""
+        key = (normalize_query(query), k)
+        with self._lock:
+            ids = self._entries.get(key)
+            if ids is not None:
+                self._entries.move_to_end(key)
+                return ids
+        if self.backend is None:
+            return None
+        raw = self.backend.get(self._shared_key(key))
+        if raw is None:
+            return None
+        ids = json.loads(raw)
+        self._store(key, ids)
+        return ids
+
+    def put(self, query: str, k: int, ids: list):
+        if self.maxsize <= 0:
+            return
+        key = (normalize_query(query), k)
+        ids = [int(i) for i in ids]
+        self._store(key, ids)
+        if self.backend is not None:
+            self.backend.set(self._shared_key(key), json.dumps(ids), ttl=RETRIEVAL_CACHE_TTL)
+
+    def _store(self, key: tuple, ids: list):
+        with self._lock:
+            self._entries[key] = list(ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
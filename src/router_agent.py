@@ -1,8 +1,10 @@
-import os
+import re
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from model_policy import get_stage_llm
 from langchain_core.prompts import ChatPromptTemplate
 
+from tracing import span, record_usage
+
 load_dotenv()
 
 
@@ -10,6 +12,20 @@ load_dotenv()
 # 🧭 Router Agent - Rutea a booking_agent o rag_agent
 # =======================================================
 
+def parse_intents(text: str) -> list:
+    """
+    "RAG, BOOKING" → ["rag", "booking"]. Conserva el orden, sin repetidos;
+    un saludo combinado con otra intención se descarta.
+    """
+    intents = []
+    for name in re.findall(r"\b(booking|rag|greeting)\b", text.lower()):
+        if name not in intents:
+            intents.append(name)
+    if len(intents) > 1 and "greeting" in intents:
+        intents.remove("greeting")
+    return intents
+
+
 def create_router_agent():
     """
     Crea un agente router que determina si el usuario quiere:
@@ -17,16 +33,15 @@ def create_router_agent():
     2. RAG: Obtener información sobre cuidados de mascotas
     3. GREETING: Saludo/presentación general
     
-    Retorna: función que recibe un query y retorna ("booking"|"rag"|"greeting", confianza)
+    Retorna: función que recibe un query y retorna la intención principal, todas
+    las intenciones detectadas (mensajes multi-intención) y la confianza
     """
     
-    llm = ChatOpenAI(
-        model="gpt-4o-mini",
-        temperature=0,
-        api_key=os.getenv("OPENAI_API_KEY")
-    )
+    llm = get_stage_llm("router")
     
-    router_prompt = ChatPromptTemplate.from_template("""
+    # Instrucciones y ejemplos fijos primero (prefijo idéntico entre llamadas,
+    # cacheable por el proveedor); el mensaje del usuario va al final
+    router_instructions = """
 Eres un clasificador de intenciones para un asistente veterinario. Analiza el mensaje del usuario y determina su intención.
 
 ⚠️ ESCALACIÓN (PRIORIDAD MÁXIMA):
@@ -42,10 +57,12 @@ CATEGORÍAS:
 
 3. GREETING: Saludos iniciales, presentaciones, preguntas genéricas (SIN pedir ayuda)
 
-Mensaje del usuario: {query}
+VARIAS INTENCIONES:
+Si el mensaje contiene más de una intención (por ejemplo una pregunta de cuidados Y una solicitud de cita),
+lista todas separadas por coma, la principal primero. GREETING nunca se combina con otras.
 
 Responde en este formato EXACTO:
-INTENCIÓN: [BOOKING|RAG|GREETING]
+INTENCIÓN: [BOOKING|RAG|GREETING, o varias separadas por coma]
 CONFIANZA: [0.0 a 1.0]
 RAZÓN: [Explicación breve]
 
@@ -55,7 +72,13 @@ Ejemplos:
 - "Frustrado, quiero hablar con alguien" → BOOKING (0.9) [ESCALACIÓN]
 - "Mi perro tiene tos, ¿qué puedo hacer?" → RAG (0.9)
 - "Hola, ¿cómo estás?" → GREETING (0.85)
-""")
+- "Mi perro tose, ¿puedo agendar para mañana?" → RAG, BOOKING (0.9)
+"""
+
+    router_prompt = ChatPromptTemplate.from_messages([
+        ("system", router_instructions),
+        ("human", "Mensaje del usuario: {query}"),
+    ])
     
     chain = router_prompt | llm
     
@@ -67,26 +90,30 @@ Ejemplos:
             query: Mensaje del usuario
             
         Returns:
-            dict: {"intent": str, "confidence": float, "reason": str}
+            dict: {"intent": str, "intents": list, "confidence": float, "reason": str}
         """
         try:
-            response = chain.invoke({"query": query})
+            with span("llm.router"):
+                response = chain.invoke({"query": query})
+                record_usage(response)
             content = response.content.strip()
             
             # Parsear la respuesta
             result = {
                 "intent": "greeting",
+                "intents": ["greeting"],
                 "confidence": 0.0,
                 "reason": ""
             }
             
-            # Extraer intención
-            if "INTENCIÓN: BOOKING" in content or "INTENCIÓN:BOOKING" in content:
-                result["intent"] = "booking"
-            elif "INTENCIÓN: RAG" in content or "INTENCIÓN:RAG" in content:
-                result["intent"] = "rag"
-            else:
-                result["intent"] = "greeting"
+            # Extraer intenciones (una o varias separadas por coma, la principal primero)
+            for line in content.split("\n"):
+                if "INTENCIÓN:" in line:
+                    intents = parse_intents(line.split("INTENCIÓN:")[-1])
+                    if intents:
+                        result["intent"] = intents[0]
+                        result["intents"] = intents
+                    break
             
             # Extraer confianza
             for line in content.split("\n"):
@@ -107,6 +134,7 @@ Ejemplos:
             print(f"⚠️ Error en router: {e}")
             return {
                 "intent": "greeting",
+                "intents": ["greeting"],
                 "confidence": 0.3,
                 "reason": f"Error: {str(e)}"
             }
@@ -129,16 +157,19 @@ def route_to_agent(query: str, router_fn):
     Returns:
         dict: {
             "agent": "booking"|"rag"|"greeting",
+            "agents": list (todas las intenciones, la principal primero),
             "confidence": float,
             "reason": str,
             "proceed": bool
         }
     """
     
-    routing_result = router_fn(query)
+    with span("router.classify"):
+        routing_result = router_fn(query)
     
     result = {
         "agent": routing_result["intent"],
+        "agents": routing_result.get("intents", [routing_result["intent"]]),
         "confidence": routing_result["confidence"],
         "reason": routing_result["reason"],
         "proceed": routing_result["confidence"] >= 0.7  # Umbral de confianza
@@ -0,0 +1,323 @@
+"""
+🌐 Server - API HTTP/WebSocket (ASGI) sobre el flujo principal
+
+    cliente ──▶ FastAPI (event loop) ──▶ cola acotada ──▶ pool de workers ──▶ flow()
+                                           │
+                                           └─ llena → 503 + Retry-After
+
+- Cada sesión tiene su propio estado (agente activo, historial) y un lock:
+  los turnos de un mismo usuario se procesan en orden, sin carreras. Los
+  locks viven fuera del LRU de sesiones (con conteo de referencias), así que
+  desalojar una sesión nunca deja correr dos turnos suyos a la vez.
+- El estado de la sesión se guarda en el backend de estado (state_backends):
+  con SQLite o Redis cualquier réplica puede atender cualquier turno.
+- El flujo es bloqueante (LLM, FAISS): corre en un pool de hilos acotado
+  (VETCARE_SERVER_WORKERS). El throughput escala con los workers.
+- Con la cola llena (VETCARE_SERVER_QUEUE) se responde 503 de inmediato.
+- Al apagar se dejan de aceptar turnos y se esperan los que están en curso
+  (VETCARE_SHUTDOWN_TIMEOUT).
+
+Endpoints:
+    POST   /sessions              crea una sesión
+    DELETE /sessions/{id}         descarta una sesión
+    POST   /chat                  {"message": ..., "session_id": ...}
+    WS     /ws/{session_id}       un turno por mensaje (texto o {"message": ...})
+    GET    /health, /metrics
+
+Uso:
+    python src/server.py --port 8000
+    VETCARE_STATE_BACKEND=sqlite python src/server.py --workers 4
+    uvicorn server:app --app-dir src --port 8000
+"""
+
+import os
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+from time import perf_counter
+from pathlib import Path
+from typing import Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from conversation_state import SessionRegistry
+from history_manager import serialize_messages, deserialize_messages
+from state_backends import SessionStore, get_backend
+from tracing import increment, observe, render_prometheus
+
+
+SERVER_WORKERS = int(os.getenv("VETCARE_SERVER_WORKERS", "8"))
+# Turnos en espera (además de los que están corriendo) antes de rechazar con 503
+SERVER_QUEUE = int(os.getenv("VETCARE_SERVER_QUEUE", "64"))
+SHUTDOWN_TIMEOUT = float(os.getenv("VETCARE_SHUTDOWN_TIMEOUT", "30"))
+# traditional | graph
+ORCHESTRATOR = os.getenv("VETCARE_ORCHESTRATOR", "traditional")
+RETRY_AFTER_SECONDS = 1
+
+
+class Overloaded(Exception):
+    """La cola de turnos está llena o el servidor se está apagando."""
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+
+def parse_ws_message(raw: str):
+    """
+    Mensaje de un frame WebSocket: texto plano o {"message": "..."}.
+    Retorna None si el JSON no trae un mensaje de texto (objeto sin "message"
+    string, lista...).
+    """
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        return raw
+    if isinstance(payload, dict):
+        message = payload.get("message")
+        return message if isinstance(message, str) else None
+    if isinstance(payload, list):
+        return None
+    # Un string JSON es el mensaje; números o true/false son texto que escribió el usuario ("12")
+    return payload if isinstance(payload, str) else raw
+
+
+# =======================================================
+# ⚙️ Servicio: pool de workers + sesiones
+# =======================================================
+
+class FlowService:
+    """
+    Ejecuta turnos del flujo en un pool acotado. Todo el control de admisión
+    (`pending`, `draining`) corre en el event loop, así que no necesita locks.
+    """
+
+    def __init__(self, workers: int = SERVER_WORKERS, max_queue: int = SERVER_QUEUE,
+                 orchestrator: str = ORCHESTRATOR):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.use_langgraph = orchestrator == "graph"
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flow")
+        # Flujos (agentes) por sesión en este proceso; el estado vive en el store
+        self.sessions = SessionRegistry(self._new_session)
+        # session_id -> [asyncio.Lock, turnos que lo usan o esperan]; se borra al llegar a 0
+        self._locks = {}
+        self.store = SessionStore()
+        self.pending = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _new_session(self, session_id: str) -> dict:
+        # El flujo se crea en el worker del primer turno (no bloquea el event loop)
+        return {"flow": None}
+
+    @asynccontextmanager
+    async def _session_lock(self, session_id: str):
+        """Serializa los turnos de la sesión; otras sesiones siguen en paralelo."""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def _make_flow(self, session_id: str):
+        if self.use_langgraph:
+            from graph_flow import create_graph_session
+            return create_graph_session(session_id)
+        from main_flow import main_flow_traditional
+        return main_flow_traditional(session_id)
+
+    def warm_up(self):
+        """Carga el índice RAG antes de aceptar tráfico."""
+        from rag_agent import create_vectorstore
+        create_vectorstore()
+
+    def _run_turn(self, session_id: str, session: dict, message: str) -> dict:
+        if session["flow"] is None:
+            session["flow"] = self._make_flow(session_id)
+        flow = session["flow"]
+        
+        # El turno anterior pudo atenderlo otra réplica: se parte del estado guardado
+        with self.store.lock(session_id) as lease:
+            saved = self.store.load(session_id)
+            if saved:
+                flow.restore_state(saved["state"])
+            history = deserialize_messages(saved["history"]) if saved else []
+            result, history = flow(message, history)
+            self.store.save(session_id, {"state": flow.export_state(), "history": serialize_messages(history)},
+                            lease=lease)
+        return result
+
+    async def chat(self, session_id: str, message: str) -> dict:
+        """Procesa un turno; lanza Overloaded si no hay capacidad."""
+        if self.draining:
+            raise Overloaded("El servidor se está apagando")
+        if self.pending >= self.max_pending:
+            increment("vetcare_server_rejected_total")
+            raise Overloaded("Cola de turnos llena")
+
+        self.pending += 1
+        self._idle.clear()
+        queued_at = perf_counter()
+        try:
+            async with self._session_lock(session_id):
+                observe("vetcare_server_queue_wait_seconds", perf_counter() - queued_at)
+                # Si el LRU la desalojó se crea de nuevo y parte del estado guardado
+                session = self.sessions.get(session_id)
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self.executor, self._run_turn, session_id, session, message)
+        finally:
+            self.pending -= 1
+            if self.pending == 0:
+                self._idle.set()
+
+        increment("vetcare_server_turns_total", agent=result.get("agent_used", ""))
+        return {**result, "session_id": session_id}
+
+    def drop_session(self, session_id: str):
+        self.store.delete(session_id)
+        self.sessions.drop(session_id)
+        if self.use_langgraph:
+            from graph_flow import drop_session
+            drop_session(session_id)
+
+    async def shutdown(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """Deja de aceptar turnos y espera los que están en curso."""
+        self.draining = True
+        if self.pending:
+            print(f"[INFO] Esperando {self.pending} turno(s) en curso...")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[WARNING] {self.pending} turno(s) sin terminar tras {timeout:.0f}s")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "capacity": self.max_pending,
+            "sessions": len(self.sessions),
+            "state_backend": self.store.backend.name,
+            "draining": self.draining,
+            "orchestrator": "graph" if self.use_langgraph else "traditional",
+        }
+
+
+# =======================================================
+# 🌐 Aplicación ASGI
+# =======================================================
+
+def create_app(service: FlowService = None) -> FastAPI:
+    """Crea la app FastAPI sobre un FlowService (uno por proceso)."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.service = service or FlowService()
+        await asyncio.get_running_loop().run_in_executor(app.state.service.executor, app.state.service.warm_up)
+        print(f"[INFO] Servidor listo ({app.state.service.workers} workers)")
+        yield
+        await app.state.service.shutdown()
+
+    app = FastAPI(title="VetCare AI", lifespan=lifespan)
+
+    def overloaded(e: Overloaded):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    @app.post("/sessions")
+    async def create_session():
+        session_id = uuid.uuid4().hex
+        app.state.service.sessions.get(session_id)
+        return {"session_id": session_id}
+
+    @app.delete("/sessions/{session_id}")
+    async def delete_session(session_id: str):
+        app.state.service.drop_session(session_id)
+        return {"session_id": session_id, "deleted": True}
+
+    @app.post("/chat")
+    async def chat(request: ChatRequest):
+        if not request.message.strip():
+            raise HTTPException(status_code=422, detail="Mensaje vacío")
+        try:
+            return await app.state.service.chat(request.session_id or uuid.uuid4().hex, request.message)
+        except Overloaded as e:
+            raise overloaded(e)
+
+    @app.websocket("/ws/{session_id}")
+    async def chat_ws(websocket: WebSocket, session_id: str):
+        await websocket.accept()
+        try:
+            while True:
+                message = parse_ws_message(await websocket.receive_text())
+                if message is None:
+                    await websocket.send_json({"error": 'Formato inválido: se espera texto o {"message": "..."}'})
+                    continue
+                if not message.strip():
+                    await websocket.send_json({"error": "Mensaje vacío"})
+                    continue
+                try:
+                    await websocket.send_json(await app.state.service.chat(session_id, message))
+                except Overloaded as e:
+                    await websocket.send_json({"error": str(e), "retry_after": RETRY_AFTER_SECONDS})
+                except Exception as e:
+                    # Un turno fallido (timeout del lock, backend caído...) no cierra la conexión
+                    increment("vetcare_server_errors_total")
+                    print(f"[WARNING] Error en turno de {session_id}: {type(e).__name__}: {e}")
+                    await websocket.send_json({"error": "Error al procesar tu solicitud"})
+        except WebSocketDisconnect:
+            pass
+
+    @app.get("/health")
+    async def health():
+        return app.state.service.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return render_prometheus()
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor HTTP/WebSocket de VetCare AI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos (réplicas) de uvicorn")
+    args = parser.parse_args()
+
+    if args.workers > 1 and not get_backend().shared:
+        print("[WARNING] Con varios procesos use VETCARE_STATE_BACKEND=sqlite|redis: "
+              "en memoria cada proceso tendría sus propias sesiones")
+
+    # Al recibir SIGTERM uvicorn deja de aceptar conexiones y espera las
+    # solicitudes en curso; luego el lifespan drena el pool de workers.
+    # Con varios procesos cada uno mapea el mismo índice FAISS (VETCARE_INDEX_MMAP)
+    if args.workers > 1:
+        uvicorn.run("server:app", app_dir=str(Path(__file__).parent), host=args.host, port=args.port,
+                    workers=args.workers, timeout_graceful_shutdown=SHUTDOWN_TIMEOUT)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, timeout_graceful_shutdown=SHUTDOWN_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+🛬 Single Flight - Coalescencia de llamadas idénticas en vuelo
+
+En un pico de tráfico (p. ej. tras un newsletter de la clínica) muchas
+sesiones hacen la misma pregunta al mismo tiempo y cada una dispara su
+propio embedding, router y generación. Con single-flight la primera llamada
+(líder) va al proveedor y las idénticas que llegan mientras está en vuelo
+esperan su resultado:
+
+    sesión A ── embed("¿cómo se previene la rabia?") ──▶ proveedor
+    sesión B ── embed("¿cómo se previene la rabia?") ──┘ (espera a A)
+
+Solo se coalescen llamadas deterministas: LLM con temperature=0 y
+embeddings de consulta. No es una caché: al terminar la llamada la clave
+se libera y la siguiente vuelve al proveedor.
+
+Métricas:
+    vetcare_single_flight_total{kind, role=leader|follower}
+"""
+
+import os
+import copy
+import json
+import hashlib
+import threading
+from functools import lru_cache
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from tracing import increment, span
+
+
+SINGLE_FLIGHT_ENABLED = os.getenv("VETCARE_SINGLE_FLIGHT", "1") == "1"
+
+
+class SingleFlight:
+    """Agrupa llamadas con la misma clave mientras la primera está en vuelo."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._in_flight = {}  # clave -> Future del líder
+
+    def do(self, key: str, fn, share=copy.deepcopy):
+        """
+        Ejecuta fn() una sola vez por clave en vuelo. Los seguidores reciben
+        share(resultado) (por defecto una copia, para que nadie mute el objeto
+        de otro) o la misma excepción que obtuvo el líder.
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            increment("vetcare_single_flight_total", kind=self.kind, role="follower")
+            with span(f"single_flight.{self.kind}"):
+                return share(future.result())
+
+        increment("vetcare_single_flight_total", kind=self.kind, role="leader")
+        try:
+            result = fn()
+        except BaseException as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result
+
+    def _release(self, key: str):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+
+llm_flights = SingleFlight("llm")
+embedding_flights = SingleFlight("embedding")
+
+
+def request_key(*parts) -> str:
+    """Hash estable de los argumentos de una llamada."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _message_parts(messages) -> list:
+    # Sin IDs: dos sesiones con el mismo prompt deben producir la misma clave
+    return [
+        [m.type, m.content, getattr(m, "tool_calls", None), getattr(m, "tool_call_id", None)]
+        for m in messages
+    ]
+
+
+def _share_chat_result(result):
+    """Copia para un seguidor: sin usage, esos tokens no se pagaron dos veces."""
+    shared = copy.deepcopy(result)
+    for generation in shared.generations:
+        generation.message.usage_metadata = None
+        generation.message.response_metadata["coalesced"] = True
+    shared.llm_output = None
+    return shared
+
+
+# =======================================================
+# 🤖 LLM
+# =======================================================
+
+class SingleFlightChatMixin:
+    """
+    Mixin para un BaseChatModel: las llamadas con temperature=0 e idéntico
+    prompt (modelo, mensajes, tools, stop) que coinciden en el tiempo se
+    resuelven con una sola llamada al proveedor.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        parent = super()._generate
+        if getattr(self, "temperature", None) != 0:
+            return parent(messages, stop=stop, run_manager=run_manager, **kwargs)
+        key = request_key(self.model_name, _message_parts(messages), stop, kwargs)
+        return llm_flights.do(
+            key,
+            lambda: parent(messages, stop=stop, run_manager=run_manager, **kwargs),
+            share=_share_chat_result,
+        )
+
+
+@lru_cache(maxsize=None)
+def coalescing(model_cls):
+    """Subclase de model_cls con single-flight (una por clase de modelo)."""
+    if not SINGLE_FLIGHT_ENABLED:
+        return model_cls
+    return type(f"SingleFlight{model_cls.__name__}", (SingleFlightChatMixin, model_cls), {})
+
+
+# =======================================================
+# 🔢 Embeddings
+# =======================================================
+
+class SingleFlightEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings: embed_query idénticos en vuelo comparten
+    la llamada. embed_documents (ingesta por lotes) pasa directo.
+    """
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+        # Mismo nombre que el modelo envuelto (identifica el índice guardado)
+        self.model = getattr(inner, "model", None) or type(inner).__name__
+
+    def embed_documents(self, texts: list) -> list:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        return embedding_flights.do(
+            request_key(self.model, text),
+            lambda: self.inner.embed_query(text),
+            share=list,
+        )
+
+
+def coalescing_embeddings(embeddings: Embeddings) -> Embeddings:
+    if not SINGLE_FLIGHT_ENABLED:
+        return embeddings
+    return SingleFlightEmbeddings(embeddings)
@@ -0,0 +1,109 @@
+"""
+🔮 Speculation - Ejecución especulativa de la rama probable
+
+En vez de esperar al router para empezar el agente:
+
+    router (LLM) ───────────────┐
+    rama probable (RAG / saludo) ├─▶ el router coincide → se usa el resultado ya calculado
+                                 └─▶ el router discrepa → se cancela y se descarta
+
+La predicción es local (palabras clave), no usa el LLM. Nunca se especula
+con booking: tiene efectos (tools, estado de sesión).
+
+Métricas para evaluar costo/beneficio:
+    vetcare_speculation_total{branch, outcome=hit|miss}
+    vetcare_speculation_saved_ms_total{branch}      latencia ahorrada en aciertos
+    vetcare_speculation_wasted_tokens_total{branch} tokens gastados en fallos
+"""
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from metadata_index import normalize_text
+from tracing import increment, capture_spans, adopt_spans
+
+
+SPECULATION_ENABLED = os.getenv("VETCARE_SPECULATION", "0") == "1"
+SPECULATION_WORKERS = int(os.getenv("VETCARE_SPECULATION_WORKERS", "8"))
+
+QUESTION_STARTS = (
+    "que ", "como ", "cual", "cuando", "cuanto", "donde", "por que", "porque", "quien",
+    "es normal", "es bueno", "es malo", "puede", "se puede", "debo", "mi perro", "mi gato", "mi mascota",
+)
+GREETING_STARTS = ("hola", "buenas", "buenos dias", "buenas tardes", "buenas noches", "saludos", "hey", "gracias")
+BOOKING_HINTS = ("agendar", "cita", "reserv", "turno", "hora para", "humano", "persona", "agente", "hablar con")
+
+_executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculation")
+
+
+class SpeculationCancelled(Exception):
+    """La rama especulativa se canceló porque el router eligió otra."""
+
+
+def predict_branch(query: str):
+    """
+    Rama más probable según el texto del mensaje: "rag", "greeting" o None
+    (no especular).
+    """
+    text = normalize_text(query).strip(" ¿¡")
+    if not text or any(hint in text for hint in BOOKING_HINTS):
+        return None
+    if text.startswith(GREETING_STARTS) and "?" not in text and len(text.split()) <= 6:
+        return "greeting"
+    if "?" in text or text.startswith(QUESTION_STARTS):
+        return "rag"
+    return None
+
+
+class Speculation:
+    """
+    Ejecuta `fn(cancel_event)` en segundo plano con una copia del contexto
+    (los spans se capturan aparte y solo se agregan al turno si se usa).
+    """
+
+    def __init__(self, branch: str, fn):
+        self.branch = branch
+        self.cancel_event = threading.Event()
+        self.spans = []
+        self.started = time.perf_counter()
+        self.finished = None
+        context = contextvars.copy_context()
+        self.future = _executor.submit(context.run, self._run, fn)
+
+    def _run(self, fn):
+        with capture_spans() as spans:
+            self.spans = spans
+            try:
+                return fn(self.cancel_event)
+            finally:
+                self.finished = time.perf_counter()
+
+    def result(self, router_done: float):
+        """
+        Usa el resultado especulativo (el router coincidió). Registra como
+        ahorro el tiempo que la rama corrió en paralelo con el router.
+        """
+        try:
+            return self.future.result()
+        finally:
+            overlap_end = min(router_done, self.finished or router_done)
+            increment("vetcare_speculation_total", branch=self.branch, outcome="hit")
+            increment("vetcare_speculation_saved_ms_total", max(0.0, overlap_end - self.started) * 1000,
+                      branch=self.branch)
+            adopt_spans(self.spans)
+
+    def cancel(self):
+        """Descarta la rama (el router eligió otra). Los tokens ya gastados se contabilizan al terminar."""
+        self.cancel_event.set()
+        increment("vetcare_speculation_total", branch=self.branch, outcome="miss")
+        if self.future.cancel():
+            return
+
+        def count_waste(_future):
+            tokens = sum(s["input_tokens"] + s["output_tokens"] for s in self.spans)
+            increment("vetcare_speculation_wasted_tokens_total", tokens, branch=self.branch)
+
+        self.future.add_done_callback(count_waste)
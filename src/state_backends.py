@@ -0,0 +1,443 @@
+"""
+🗄️ State Backends - Estado compartido entre réplicas
+
+Sesiones, cachés y el registro de reservas viven detrás de un backend
+clave-valor intercambiable (VETCARE_STATE_BACKEND):
+
+    memory   dict en el proceso (default; una sola réplica)
+    sqlite   archivo SQLite en modo WAL (varios procesos en la misma máquina)
+    redis    cliente mínimo del protocolo RESP (varias máquinas)
+
+Los valores son strings (JSON); las claves pueden expirar (ttl en segundos).
+Además de get/set/set_if_absent/delete, cada backend ofrece un
+compare-and-set atómico (replace_if_equal) para renovar locks y confirmar
+reservas solo si siguen siendo de quien las pide.
+El cliente Redis se puede probar contra fake_redis_server.py.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from functools import lru_cache
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from metadata_index import normalize_text
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+STATE_BACKEND = os.getenv("VETCARE_STATE_BACKEND", "memory")
+STATE_DB = os.getenv("VETCARE_STATE_DB", str(BASE_DIR / "data" / "state.sqlite3"))
+REDIS_URL = os.getenv("VETCARE_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Sesiones inactivas se descartan tras este tiempo
+SESSION_TTL = int(os.getenv("VETCARE_SESSION_TTL", str(24 * 3600)))
+# Lock de sesión entre réplicas: se renueva cada TTL/3 mientras dura el turno,
+# así que solo expira si el proceso muere con él tomado
+SESSION_LOCK_TTL = int(os.getenv("VETCARE_SESSION_LOCK_TTL", "60"))
+# Un horario verificado como disponible queda retenido para esa sesión
+SLOT_HOLD_TTL = int(os.getenv("VETCARE_SLOT_HOLD_TTL", "900"))
+# Cada cuánto el backend en memoria barre las claves expiradas (en una escritura)
+MEMORY_SWEEP_INTERVAL_S = 60
+
+
+class BackendError(Exception):
+    """Error de comunicación con el backend de estado."""
+
+
+# =======================================================
+# 🧠 Memoria
+# =======================================================
+
+class MemoryBackend:
+    """
+    dict con expiración. Las claves expiradas se borran al leerlas y, para
+    las que nadie vuelve a leer (sesiones abandonadas), con un barrido
+    amortizado en las escrituras cada MEMORY_SWEEP_INTERVAL_S.
+    """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, sweep_interval: float = MEMORY_SWEEP_INTERVAL_S):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        wall = time.time()
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at is not None and expires_at < wall]
+        for key in expired:
+            del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def _alive(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._alive(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        with self._lock:
+            self._maybe_sweep()
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def set_if_absent(self, key: str, value: str, ttl: float = None) -> bool:
+        with self._lock:
+            self._maybe_sweep()
+            if self._alive(key) is not None:
+                return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def replace_if_equal(self, key: str, expected: str, value: str, ttl: float = None) -> bool:
+        with self._lock:
+            entry = self._alive(key)
+            if entry is None or entry[0] != expected:
+                return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# =======================================================
+# 💾 SQLite
+# =======================================================
+
+class SQLiteBackend:
+    """Tabla kv con expiración; una conexión por hilo, WAL para lectores concurrentes."""
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str = STATE_DB):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None),
+        )
+
+    def set_if_absent(self, key: str, value: str, ttl: float = None) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def replace_if_equal(self, key: str, expected: str, value: str, ttl: float = None) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE kv SET value = ?, expires_at = ? WHERE key = ? AND value = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (value, now + ttl if ttl else None, key, expected, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+
+# =======================================================
+# 🔌 Redis (protocolo RESP)
+# =======================================================
+
+# Compare-and-set atómico: KEYS[1], ARGV = esperado, nuevo valor, ttl en ms (0 = sin expiración)
+REPLACE_IF_EQUAL_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    if ARGV[3] == '0' then redis.call('SET', KEYS[1], ARGV[2])
+    else redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3]) end
+    return 1
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """
+    Cliente RESP mínimo (GET, SET EX/NX, DEL, EVAL) sin dependencias.
+    Una conexión por hilo; URL: redis://[:password@]host:port/db
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        if self.password:
+            self._command("AUTH", self.password)
+        if self.db:
+            self._command("SELECT", str(self.db))
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Conexión cerrada por el servidor")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise BackendError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise BackendError(f"Respuesta RESP inválida: {line!r}")
+
+    def _command(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg.encode("utf-8") if isinstance(arg, str) else arg
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._local.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def execute(self, *args):
+        """Envía un comando; reconecta una vez si la conexión se cayó."""
+        try:
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            return self._command(*args)
+        except OSError:
+            self._local.sock = None
+        try:
+            self._connect()
+            return self._command(*args)
+        except OSError as e:
+            self._local.sock = None
+            raise BackendError(f"Redis no disponible en {self.host}:{self.port}: {e}") from e
+
+    def get(self, key: str):
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: str, ttl: float = None):
+        if ttl:
+            self.execute("SET", key, value, "PX", str(int(ttl * 1000)))
+        else:
+            self.execute("SET", key, value)
+
+    def set_if_absent(self, key: str, value: str, ttl: float = None) -> bool:
+        args = ["SET", key, value, "NX"]
+        if ttl:
+            args += ["PX", str(int(ttl * 1000))]
+        return self.execute(*args) == "OK"
+
+    def replace_if_equal(self, key: str, expected: str, value: str, ttl: float = None) -> bool:
+        ttl_ms = str(int(ttl * 1000)) if ttl else "0"
+        return self.execute("EVAL", REPLACE_IF_EQUAL_SCRIPT, "1", key, expected, value, ttl_ms) == 1
+
+    def delete(self, key: str):
+        self.execute("DEL", key)
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = STATE_BACKEND):
+    """Backend configurado (uno por proceso)."""
+    if name == "sqlite":
+        return SQLiteBackend()
+    if name == "redis":
+        return RedisBackend()
+    if name != "memory":
+        print(f"[WARNING] Backend de estado desconocido '{name}', usando memoria")
+    return MemoryBackend()
+
+
+# =======================================================
+# 👤 Sesiones
+# =======================================================
+
+class SessionLease:
+    """
+    Lock de sesión tomado por esta réplica. Un hilo lo renueva cada TTL/3
+    mientras dura el turno; si la renovación falla (expiró y otra réplica lo
+    tomó) queda marcado como perdido.
+    """
+
+    def __init__(self, backend=None, key: str = "", token: str = ""):
+        self.backend = backend
+        self.key = key
+        self.token = token
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+        if backend is not None:
+            self._thread = threading.Thread(target=self._renew, name="session-lock-renew", daemon=True)
+            self._thread.start()
+
+    def _renew(self):
+        while not self._stop.wait(SESSION_LOCK_TTL / 3):
+            try:
+                if not self.backend.replace_if_equal(self.key, self.token, self.token, ttl=SESSION_LOCK_TTL):
+                    self.lost = True
+                    print(f"[WARNING] Lock perdido: {self.key}")
+                    return
+            except (BackendError, OSError) as e:
+                print(f"[WARNING] No se pudo renovar {self.key}: {e}")
+
+    def held(self) -> bool:
+        """True si el lock sigue siendo de esta réplica (siempre True sin backend compartido)."""
+        if self.backend is None:
+            return True
+        return not self.lost and self.backend.get(self.key) == self.token
+
+    def release(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.backend is not None and self.backend.get(self.key) == self.token:
+            self.backend.delete(self.key)
+
+
+class SessionStore:
+    """Estado serializable de cada sesión (JSON) con expiración por inactividad."""
+
+    def __init__(self, backend=None, ttl: int = SESSION_TTL):
+        self.backend = backend if backend is not None else get_backend()
+        self.ttl = ttl
+
+    def load(self, session_id: str):
+        raw = self.backend.get(f"session:{session_id}")
+        return json.loads(raw) if raw else None
+
+    def save(self, session_id: str, data: dict, lease: SessionLease = None):
+        """Guarda el estado; con `lease`, solo si el lock de la sesión sigue siendo propio."""
+        if lease is not None and not lease.held():
+            raise BackendError(f"Lock de la sesión {session_id} perdido; el estado no se guarda")
+        self.backend.set(f"session:{session_id}", json.dumps(data, ensure_ascii=False), ttl=self.ttl)
+
+    def delete(self, session_id: str):
+        self.backend.delete(f"session:{session_id}")
+
+    @contextmanager
+    def lock(self, session_id: str, timeout: float = SESSION_LOCK_TTL):
+        """
+        Serializa los turnos de una sesión entre réplicas y entrega un
+        SessionLease para pasarle a save(). Sin backend compartido no hace
+        nada (el servidor ya serializa dentro del proceso).
+        """
+        if not self.backend.shared:
+            yield SessionLease()
+            return
+        key = f"lock:session:{session_id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.backend.set_if_absent(key, token, ttl=SESSION_LOCK_TTL):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Sesión {session_id} ocupada por otra réplica")
+            time.sleep(0.05)
+        lease = SessionLease(self.backend, key, token)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+
+# =======================================================
+# 📅 Registro de reservas
+# =======================================================
+
+class BookingLedger:
+    """
+    Horarios retenidos o reservados, visibles para todas las réplicas. Retener
+    es atómico (set-if-absent): dos sesiones no pueden recibir el mismo horario.
+    """
+
+    def __init__(self, backend=None, hold_ttl: int = SLOT_HOLD_TTL):
+        self.backend = backend if backend is not None else get_backend()
+        self.hold_ttl = hold_ttl
+
+    @staticmethod
+    def slot_key(dia: str, hora: str) -> str:
+        return "booking:slot:" + "_".join(normalize_text(f"{dia} {hora}").split())
+
+    def hold(self, dia: str, hora: str, owner: str = "") -> bool:
+        """Retiene el horario; False si otra sesión ya lo tiene."""
+        key = self.slot_key(dia, hora)
+        if self.backend.set_if_absent(key, owner, ttl=self.hold_ttl):
+            return True
+        return bool(owner) and self.backend.get(key) == owner
+
+    def confirm(self, dia: str, hora: str, owner: str) -> bool:
+        """
+        Convierte la retención de `owner` en reserva definitiva (sin
+        expiración). Si la retención expiró sin que nadie tomara el horario
+        también lo reserva; False si el horario es de otra sesión.
+        """
+        if not owner:
+            return False
+        key = self.slot_key(dia, hora)
+        return self.backend.replace_if_equal(key, owner, owner) or self.backend.set_if_absent(key, owner)
+
+
+@lru_cache(maxsize=None)
+def get_ledger() -> BookingLedger:
+    return BookingLedger()
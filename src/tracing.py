@@ -0,0 +1,351 @@
+"""
+⏱️ Tracing - Instrumentación de latencia y tokens por etapa
+Registra spans (router, embedding, búsqueda, contexto, LLM, tools) agrupados
+por turno, y los exporta como JSONL y como métricas estilo Prometheus.
+
+Uso:
+    with trace_turn("main_flow") as turn:
+        with span("llm.router"):
+            response = chain.invoke(...)
+            record_usage(response)
+    turn_timings(turn)  # desglose por etapa
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Archivo JSONL donde se exporta un registro por turno (vacío = no exportar)
+TRACE_FILE = os.getenv("VETCARE_TRACE_FILE", "")
+# Puerto del endpoint /metrics (vacío = no iniciar)
+METRICS_PORT = os.getenv("VETCARE_METRICS_PORT", "")
+
+# Buckets del histograma de duración (segundos)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_turn = ContextVar("vetcare_turn", default=None)
+_current_span = ContextVar("vetcare_span", default=None)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)       # (name, labels) -> valor
+_histograms = {}                     # (name, labels) -> {"buckets": [...], "sum": x, "count": n}
+_gauges = {}                         # (name, labels) -> valor actual
+_pricing = None                      # función (modelo, usage_metadata) -> USD; la registra model_policy
+
+
+# =======================================================
+# 📈 Métricas (counters / gauges / histogramas)
+# =======================================================
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1.0, **labels):
+    """Incrementa un counter."""
+    with _lock:
+        _counters[(name, _labels_key(labels))] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Fija el valor actual de un gauge (profundidad de cola, límite vigente...)."""
+    with _lock:
+        _gauges[(name, _labels_key(labels))] = value
+
+
+def observe(name: str, value: float, **labels):
+    """Registra una observación en un histograma."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+            _histograms[key] = hist
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    """Retorna todas las métricas en formato de texto de Prometheus."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(DURATION_BUCKETS, hist["buckets"]):
+            le = 'le="%s"' % bound
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {count}")
+        le = 'le="+Inf"'
+        lines.append(f"{name}_bucket{_format_labels(labels, le)} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    """Limpia counters, gauges e histogramas (útil en benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# =======================================================
+# 🧵 Spans y turnos
+# =======================================================
+
+@contextmanager
+def trace_turn(name: str = "turn", **attrs):
+    """
+    Agrupa los spans de un turno de conversación.
+
+    Al cerrar, registra la duración total y exporta el turno a TRACE_FILE.
+    """
+    turn = {
+        "trace_id": uuid.uuid4().hex,
+        "name": name,
+        "timestamp": time.time(),
+        "attrs": attrs,
+        "spans": [],
+        "duration_ms": 0.0,
+    }
+    token = _current_turn.set(turn)
+    start = time.perf_counter()
+    try:
+        yield turn
+    finally:
+        elapsed = time.perf_counter() - start
+        turn["duration_ms"] = round(elapsed * 1000, 3)
+        _current_turn.reset(token)
+        observe("vetcare_turn_duration_seconds", elapsed, flow=name)
+        increment("vetcare_turns_total", flow=name)
+        _export_turn(turn)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Mide una etapa. Los tokens y cache hits se adjuntan con record_usage()
+    y mark_cache_hit() mientras el span está activo.
+    """
+    turn = _current_turn.get()
+    parent = _current_span.get()
+    record = {
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "attrs": attrs,
+        "duration_ms": 0.0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "cost_usd": 0.0,
+        "cache_hit": None,
+        "error": None,
+    }
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        increment("vetcare_span_errors_total", span=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        record["duration_ms"] = round(elapsed * 1000, 3)
+        _current_span.reset(token)
+        observe("vetcare_span_duration_seconds", elapsed, span=name)
+        increment("vetcare_spans_total", span=name)
+        if turn is not None:
+            turn["spans"].append(record)
+
+
+@contextmanager
+def capture_spans():
+    """
+    Registra los spans del bloque en una lista propia en vez del turno actual.
+    Sirve para trabajo especulativo que después se adopta o se descarta.
+    """
+    shadow = {"spans": []}
+    token = _current_turn.set(shadow)
+    try:
+        yield shadow["spans"]
+    finally:
+        _current_turn.reset(token)
+
+
+def adopt_spans(spans: list):
+    """Agrega al turno actual spans capturados con capture_spans()."""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn["spans"].extend(spans)
+
+
+def set_pricing(fn):
+    """Registra la función de costo usada por record_usage()."""
+    global _pricing
+    _pricing = fn
+
+
+def record_usage(response):
+    """
+    Adjunta al span actual los tokens reportados por una respuesta de LangChain
+    (usage_metadata), incluidos los tokens de prompt servidos desde caché, y
+    su costo según el modelo que respondió.
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    model = (getattr(response, "response_metadata", None) or {}).get("model_name", "unknown")
+    cost = _pricing(model, usage) if _pricing and usage else 0.0
+    input_tokens = usage.get("input_tokens", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    current = _current_span.get()
+    name = current["name"] if current else "unscoped"
+    if current is not None:
+        current["input_tokens"] += input_tokens
+        current["output_tokens"] += output_tokens
+        current["cached_tokens"] += cached_tokens
+        current["cost_usd"] += cost
+
+    increment("vetcare_llm_calls_total", span=name, model=model)
+    increment("vetcare_llm_cost_usd_total", cost, span=name, model=model)
+    increment("vetcare_tokens_total", input_tokens, span=name, kind="input")
+    increment("vetcare_tokens_total", output_tokens, span=name, kind="output")
+    increment("vetcare_tokens_total", cached_tokens, span=name, kind="cached")
+
+
+def mark_cache_hit(hit: bool):
+    """Marca el span actual como acierto o fallo de caché."""
+    current = _current_span.get()
+    name = current["name"] if current else "unscoped"
+    if current is not None:
+        current["cache_hit"] = hit
+    increment("vetcare_cache_requests_total", span=name, result="hit" if hit else "miss")
+
+
+def current_turn():
+    """Retorna el turno activo (o None)."""
+    return _current_turn.get()
+
+
+def turn_timings(turn: dict) -> dict:
+    """
+    Resume un turno: milisegundos por etapa (sumando spans repetidos),
+    tokens totales, costo y número de llamadas al LLM.
+    """
+    stages = defaultdict(float)
+    totals = {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0,
+              "llm_calls": 0, "cache_hits": 0}
+    for record in turn["spans"]:
+        stages[record["name"]] += record["duration_ms"]
+        totals["input_tokens"] += record["input_tokens"]
+        totals["output_tokens"] += record["output_tokens"]
+        totals["cached_tokens"] += record["cached_tokens"]
+        totals["cost_usd"] += record.get("cost_usd", 0.0)
+        if record["name"].startswith("llm."):
+            totals["llm_calls"] += 1
+        if record["cache_hit"]:
+            totals["cache_hits"] += 1
+
+    return {
+        "trace_id": turn["trace_id"],
+        "total_ms": turn["duration_ms"],
+        "stages": {name: round(ms, 3) for name, ms in stages.items()},
+        **totals,
+    }
+
+
+# =======================================================
+# 📤 Exportación
+# =======================================================
+
+def _export_turn(turn: dict):
+    if not TRACE_FILE:
+        return
+    try:
+        line = json.dumps(turn, ensure_ascii=False, default=str)
+        with _lock:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"⚠️ Error exportando traza: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int = None, host: str = "127.0.0.1"):
+    """
+    Inicia (una sola vez) un endpoint local /metrics en un hilo daemon.
+
+    Si no se indica puerto, usa VETCARE_METRICS_PORT; sin ninguno no hace nada.
+    """
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    if port is None:
+        if not METRICS_PORT:
+            return None
+        port = int(METRICS_PORT)
+
+    _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    print(f"[INFO] Métricas disponibles en http://{host}:{port}/metrics")
+    return _metrics_server
@@ -0,0 +1,450 @@
+"""
+🗂️ Vector Index - Índices FAISS configurables para el RAG
+Construye, persiste y carga el vectorstore con distintos tipos de índice:
+
+    flat      Búsqueda exacta (IndexFlatL2), costo lineal en chunks
+    ivf_flat  Listas invertidas: solo se visitan `nprobe` clusters
+    hnsw      Grafo navegable: latencia sublineal, más RAM que IVF
+    ivf_pq    Listas invertidas + Product Quantization (codebooks entrenados)
+
+El tipo y sus parámetros se guardan junto al índice (index_config.json), y
+los knobs de búsqueda (nprobe, efSearch) se pueden ajustar al cargar.
+"""
+
+import os
+import json
+import math
+import time
+import pickle
+import hashlib
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+load_dotenv()
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+INDEX_DIR = BASE_DIR / "data" / "index"
+CONFIG_FILE = "index_config.json"
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Configuración por entorno (0 = automático según el tamaño del corpus)
+INDEX_TYPE = os.getenv("VETCARE_INDEX_TYPE", "flat")
+# faiss = FAISS de LangChain en RAM | compact = cuantizado + mmap (compact_store.py)
+STORE_TYPE = os.getenv("VETCARE_STORE_TYPE", "faiss")
+IVF_NLIST = int(os.getenv("VETCARE_IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("VETCARE_IVF_NPROBE", "8"))
+HNSW_M = int(os.getenv("VETCARE_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("VETCARE_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.getenv("VETCARE_HNSW_EF_SEARCH", "64"))
+PQ_M = int(os.getenv("VETCARE_PQ_M", "0"))
+PQ_NBITS = 8
+# Índice guardado en solo lectura vía mmap: N procesos comparten las páginas
+# del archivo (page cache) en vez de tener N copias en RAM
+INDEX_MMAP = os.getenv("VETCARE_INDEX_MMAP", "1") == "1"
+
+# Puntos de entrenamiento mínimos por centroide que recomienda FAISS
+MIN_POINTS_PER_CENTROID = 39
+# Vectores que se acumulan para entrenar IVF/PQ al construir en streaming
+TRAIN_SAMPLE_SIZE = int(os.getenv("VETCARE_TRAIN_SAMPLE_SIZE", "50000"))
+
+
+def default_index_params() -> dict:
+    """Parámetros de índice leídos del entorno."""
+    return {
+        "nlist": IVF_NLIST,
+        "nprobe": IVF_NPROBE,
+        "hnsw_m": HNSW_M,
+        "ef_construction": HNSW_EF_CONSTRUCTION,
+        "ef_search": HNSW_EF_SEARCH,
+        "pq_m": PQ_M,
+        "pq_nbits": PQ_NBITS,
+    }
+
+
+def build_params() -> dict:
+    """
+    Parámetros de construcción pedidos en el entorno. A diferencia de los de
+    búsqueda no se pueden cambiar sobre un índice guardado: si difieren de
+    los guardados, el índice se reconstruye.
+    """
+    return {
+        "nlist": IVF_NLIST,
+        "hnsw_m": HNSW_M,
+        "ef_construction": HNSW_EF_CONSTRUCTION,
+        "pq_m": PQ_M,
+        "pq_nbits": PQ_NBITS,
+    }
+
+
+def env_search_params() -> dict:
+    """Knobs de búsqueda definidos explícitamente en el entorno."""
+    params = {}
+    if os.getenv("VETCARE_IVF_NPROBE"):
+        params["nprobe"] = IVF_NPROBE
+    if os.getenv("VETCARE_HNSW_EF_SEARCH"):
+        params["ef_search"] = HNSW_EF_SEARCH
+    return params
+
+
+# =======================================================
+# 🔑 Huella del corpus
+# =======================================================
+
+def corpus_hash(docs_dir: Path) -> str:
+    """Hash SHA-256 de nombres y contenido de los documentos del corpus."""
+    digest = hashlib.sha256()
+    for file in sorted(p for p in Path(docs_dir).glob("**/*") if p.is_file()):
+        digest.update(str(file.relative_to(docs_dir)).encode("utf-8"))
+        digest.update(file.read_bytes())
+    return digest.hexdigest()
+
+
+# =======================================================
+# 🏗️ Construcción del índice FAISS
+# =======================================================
+
+def _resolve_index_type(index_type: str, n: int, params: dict) -> str:
+    """Cae a flat cuando no hay vectores suficientes para entrenar el índice pedido."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: {index_type} (opciones: {', '.join(INDEX_TYPES)})")
+    if index_type == "ivf_pq" and n < (2 ** params["pq_nbits"]) * MIN_POINTS_PER_CENTROID // 4:
+        print(f"[WARNING] {n} chunks no alcanzan para entrenar PQ; usando índice flat")
+        return "flat"
+    if index_type.startswith("ivf") and n < 2 * MIN_POINTS_PER_CENTROID:
+        print(f"[WARNING] {n} chunks no alcanzan para entrenar IVF; usando índice flat")
+        return "flat"
+    return index_type
+
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    """Número de subcuantizadores: divisor de dim, ~16 dimensiones por subvector."""
+    m = requested or max(8, dim // 16)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def ivf_nlist(n: int, expected_total: int = None, requested: int = 0) -> tuple:
+    """
+    nlist para IVF: ~4·√N sobre el total esperado del corpus (no sobre la
+    muestra), acotado a lo que `n` vectores de entrenamiento alcanzan a
+    entrenar (MIN_POINTS_PER_CENTROID puntos por centroide).
+
+    Returns:
+        tuple: (nlist, nlist_objetivo)
+    """
+    target = requested or int(4 * math.sqrt(max(n, expected_total or 0)))
+    return max(1, min(target, n // MIN_POINTS_PER_CENTROID)), target
+
+
+def note_nlist_cap(params: dict, trained_on: int, ntotal: int, requested: int = 0):
+    """
+    Registra en los parámetros del índice la muestra de entrenamiento y, si
+    esta acotó nlist por debajo de lo que pide el corpus completo, el nlist
+    objetivo (`nlist_target`), para que quede visible en index_config.json.
+    """
+    params["train_size"] = trained_on
+    _, target = ivf_nlist(trained_on, ntotal, requested)
+    if ntotal > trained_on and params["nlist"] < target:
+        params["nlist_target"] = target
+        print(f"[WARNING] nlist={params['nlist']} quedó limitado por la muestra de entrenamiento "
+              f"({trained_on} de {ntotal} vectores; el corpus pide ~{target}). "
+              f"Suba VETCARE_TRAIN_SAMPLE_SIZE para entrenar más centroides.")
+
+
+def _new_index(dim: int, n: int, index_type: str, params: dict, expected_total: int = None):
+    """
+    Crea un índice vacío (sin entrenar) para una muestra de n vectores; IVF
+    dimensiona nlist con `expected_total` cuando se conoce el tamaño del corpus.
+    """
+    import faiss
+
+    index_type = _resolve_index_type(index_type, n, params)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+
+    else:
+        nlist, _ = ivf_nlist(n, expected_total, params["nlist"])
+        params["nlist"] = nlist
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            params["pq_m"] = _pq_subquantizers(dim, params["pq_m"])
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_nbits"])
+
+    return index, index_type
+
+
+def create_faiss_index(vectors: np.ndarray, index_type: str = INDEX_TYPE, params: dict = None,
+                       expected_total: int = None):
+    """
+    Crea, entrena y llena un índice FAISS (métrica L2, igual que FAISS.from_documents).
+
+    `vectors` puede ser solo la muestra de entrenamiento de un corpus mayor;
+    en ese caso `expected_total` dimensiona nlist para el corpus completo.
+
+    Returns:
+        tuple: (índice, tipo_efectivo, parámetros_efectivos)
+    """
+    params = {**default_index_params(), **(params or {})}
+    n, dim = vectors.shape
+    index, index_type = _new_index(dim, n, index_type, params, expected_total)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, params)
+    return index, index_type, params
+
+
+def apply_search_params(index, params: dict):
+    """Aplica los knobs de búsqueda (nprobe para IVF, efSearch para HNSW)."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and params.get("nprobe"):
+        ivf.nprobe = min(params["nprobe"], ivf.nlist)
+    if hasattr(index, "hnsw") and params.get("ef_search"):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def search_parameters(index, positions: np.ndarray = None):
+    """
+    SearchParameters con un IDSelectorBatch sobre `positions`, del tipo que
+    exige cada índice (IVF y HNSW rechazan los parámetros genéricos) y
+    conservando su nprobe / efSearch actual.
+    """
+    import faiss
+
+    selector = None
+    if positions is not None:
+        positions = np.ascontiguousarray(positions, dtype=np.int64)
+        selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def search_ids(vectordb, query_vector, k: int = 4, positions: np.ndarray = None) -> list:
+    """
+    IDs (posiciones en FAISS) de los k chunks más cercanos, restringidos
+    opcionalmente a `positions` (pre-filtrado por metadata): FAISS solo
+    puntúa los vectores seleccionados.
+    """
+    if positions is not None and len(positions) == 0:
+        return []
+
+    # Store compacto: búsqueda cuantizada + re-puntuación
+    if hasattr(vectordb, "search_positions"):
+        return [pos for pos, _ in vectordb.search_positions(query_vector, k, positions)]
+
+    query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    if positions is None:
+        _, ids = vectordb.index.search(query, k)
+    else:
+        params = search_parameters(vectordb.index, positions)
+        _, ids = vectordb.index.search(query, min(k, len(positions)), params=params)
+    return [int(i) for i in ids[0] if i >= 0]
+
+
+def get_documents(vectordb, ids: list) -> list:
+    """Documents de los chunks con esos IDs, en el mismo orden."""
+    if hasattr(vectordb, "get_document"):
+        return [vectordb.get_document(i) for i in ids]
+    return [vectordb.docstore.search(vectordb.index_to_docstore_id[i]) for i in ids]
+
+
+def search_by_vector(vectordb, query_vector, k: int = 4, positions: np.ndarray = None) -> list:
+    """Búsqueda por vector (con pre-filtrado opcional) que retorna Documents."""
+    return get_documents(vectordb, search_ids(vectordb, query_vector, k, positions))
+
+
+# =======================================================
+# 💾 Vectorstore (construir / guardar / cargar)
+# =======================================================
+
+def build_vectorstore(chunks: list, embeddings, index_type: str = INDEX_TYPE, params: dict = None):
+    """
+    Equivalente a FAISS.from_documents, pero con el tipo de índice configurable.
+
+    Returns:
+        tuple: (vectordb, config) donde config describe el índice construido
+    """
+    texts = [c.page_content for c in chunks]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    start = time.perf_counter()
+    index, actual_type, actual_params = create_faiss_index(vectors, index_type, params)
+    print(f"[INFO] Índice {actual_type} con {index.ntotal} vectores ({time.perf_counter() - start:.2f}s)")
+
+    vectordb = _wrap_vectorstore(index, chunks, embeddings)
+
+    config = {
+        "index_type": actual_type,
+        "params": actual_params,
+        "dim": int(vectors.shape[1]),
+        "ntotal": int(index.ntotal),
+        "created_at": time.time(),
+    }
+    return vectordb, config
+
+
+def _wrap_vectorstore(index, chunks: list, embeddings):
+    ids = [str(i) for i in range(len(chunks))]
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, chunks))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def build_vectorstore_streaming(embedded_batches, embeddings, index_type: str = INDEX_TYPE,
+                                params: dict = None, train_size: int = TRAIN_SAMPLE_SIZE,
+                                expected_total: int = None):
+    """
+    Construye el vectorstore consumiendo lotes (chunks, vectores) a medida que llegan.
+
+    Los índices que requieren entrenamiento (IVF, PQ) acumulan hasta
+    `train_size` vectores, se entrenan con esa muestra y luego agregan el
+    resto lote a lote; flat y HNSW no se entrenan, así que crean el índice
+    con el primer lote y agregan cada lote directamente.
+
+    El total de chunks no se conoce hasta terminar, así que nlist se calcula
+    con `expected_total` (p. ej. el ntotal del índice anterior) si se pasa, y
+    siempre acotado a lo que la muestra puede entrenar. Si al final el corpus
+    pedía más centroides, la config lo registra en `nlist_target`.
+
+    Los vectores nunca se juntan en una sola matriz, pero el docstore de
+    FAISS (InMemoryDocstore) guarda el texto de todos los chunks en RAM, así
+    que la memoria crece con el corpus. Para una construcción con memoria
+    acotada está el store compacto (compact_store.build_compact_store), que
+    escribe texto y metadata a disco a medida que llegan los lotes.
+
+    Returns:
+        tuple: (vectordb, config)
+    """
+    params = {**default_index_params(), **(params or {})}
+    requested_nlist = params["nlist"]
+    start = time.perf_counter()
+
+    index = None
+    actual_type = index_type
+    needs_training = index_type not in ("flat", "hnsw")
+    chunks = []
+    sample = []
+    sample_size = 0
+
+    for batch_chunks, batch_vectors in embedded_batches:
+        chunks.extend(batch_chunks)
+        vectors = np.asarray(batch_vectors, dtype=np.float32)
+        if index is None and not needs_training:
+            index, actual_type = _new_index(vectors.shape[1], len(vectors), index_type, params)
+        if index is not None:
+            index.add(vectors)
+            continue
+        sample.append(vectors)
+        sample_size += len(vectors)
+        if sample_size >= train_size:
+            index, actual_type, params = create_faiss_index(np.vstack(sample), index_type, params, expected_total)
+            sample = []
+
+    if index is None:
+        if not sample:
+            raise ValueError("No hay chunks para indexar.")
+        index, actual_type, params = create_faiss_index(np.vstack(sample), index_type, params, expected_total)
+
+    if actual_type.startswith("ivf"):
+        note_nlist_cap(params, sample_size, int(index.ntotal), requested_nlist)
+    apply_search_params(index, params)
+    print(f"[INFO] Índice {actual_type} con {index.ntotal} vectores ({time.perf_counter() - start:.2f}s)")
+
+    config = {
+        "index_type": actual_type,
+        "params": params,
+        "dim": int(index.d),
+        "ntotal": int(index.ntotal),
+        "created_at": time.time(),
+    }
+    return _wrap_vectorstore(index, chunks, embeddings), config
+
+
+def save_vectorstore(vectordb, config: dict, path: Path = INDEX_DIR):
+    """Guarda índice + docstore (save_local) y la configuración del índice."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    vectordb.save_local(str(path))
+    write_index_config(config, path)
+
+
+def write_index_config(config: dict, path: Path = INDEX_DIR):
+    """Escribe index_config.json."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def read_index_config(path: Path = INDEX_DIR):
+    """Lee index_config.json (None si no hay índice guardado)."""
+    config_path = Path(path) / CONFIG_FILE
+    if not config_path.exists():
+        return None
+    return json.loads(config_path.read_text(encoding="utf-8"))
+
+
+def read_faiss_index(path: Path):
+    """
+    Lee un índice FAISS. Con VETCARE_INDEX_MMAP lo mapea en solo lectura
+    (IO_FLAG_MMAP_IFC en FAISS >= 1.10 mapea también los códigos de índices
+    planos; versiones anteriores solo mapean las listas IVF). Si la versión
+    instalada no soporta el mapeo para ese tipo de índice, lo carga en RAM.
+    """
+    import faiss
+
+    if INDEX_MMAP:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"[WARNING] No se pudo mapear el índice ({e}); cargándolo en RAM")
+    return faiss.read_index(str(path))
+
+
+def load_vectorstore(embeddings, path: Path = INDEX_DIR, search_params: dict = None):
+    """
+    Carga un vectorstore guardado y aplica los knobs de búsqueda.
+
+    Los valores de `search_params` (nprobe, ef_search) tienen prioridad sobre
+    los guardados, para poder ajustar recall/latencia sin reconstruir.
+
+    Returns:
+        tuple: (vectordb, config)
+    """
+    config = read_index_config(path)
+    if config is None:
+        raise FileNotFoundError(f"No hay índice guardado en {path}")
+
+    # Mismo formato que FAISS.save_local, pero el índice se abre con read_faiss_index.
+    # El docstore se serializa con pickle; solo se cargan índices generados localmente
+    index = read_faiss_index(Path(path) / "index.faiss")
+    with open(Path(path) / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vectordb = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    params = {**config["params"], **(search_params or {})}
+    apply_search_params(vectordb.index, params)
+    return vectordb, config
@@ -0,0 +1,27 @@
+"""
+Configuración común de los tests: modelos simulados sin latencia y los
+módulos de src/ importables como en los benchmarks. Las variables se fijan
+antes de importar cualquier agente (la configuración se lee al importar).
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TMP = Path(tempfile.mkdtemp(prefix="vetcare-tests-"))
+
+os.environ.update({
+    "VETCARE_FAKE_MODELS": "1",
+    "VETCARE_FAKE_LATENCY_MS": "0",
+    "VETCARE_FAKE_TOKENS_PER_SEC": "1000000",
+    "VETCARE_FAKE_EMBED_LATENCY_MS": "0",
+    "VETCARE_STATE_BACKEND": "memory",
+    # Nada de lo que generan los modelos simulados termina en data/
+    "VETCARE_FAQ": "0",
+    "VETCARE_FAQ_AUTOBUILD": "0",
+    "VETCARE_FAQ_STORE": str(_TMP / "faq_answers.json"),
+    "VETCARE_CHECKPOINT_DB": str(_TMP / "checkpoints.sqlite"),
+})
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from state_backends import BookingLedger, MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / "state.db"))
+
+
+def test_concurrent_holds_only_one_wins(backend):
+    ledger = BookingLedger(backend)
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def hold(owner):
+        barrier.wait()
+        results[owner] = ledger.hold("lunes", "10:00", owner)
+
+    threads = [threading.Thread(target=hold, args=(f"sesion-{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    winners = [owner for owner, ok in results.items() if ok]
+    assert len(winners) == 1
+    assert backend.get(BookingLedger.slot_key("lunes", "10:00")) == winners[0]
+
+
+def test_confirm_only_by_holder(backend):
+    ledger = BookingLedger(backend)
+    assert ledger.hold("Martes", "11:00", "a")
+    # Misma sesión: retener de nuevo es idempotente; otra sesión no puede
+    assert ledger.hold("martes", "11:00", "a")
+    assert not ledger.hold("martes", "11:00", "b")
+
+    assert not ledger.confirm("martes", "11:00", "b")
+    assert not ledger.confirm("martes", "11:00", "")
+    assert ledger.confirm("martes", "11:00", "a")
+    assert not ledger.hold("martes", "11:00", "b")
+
+
+def test_confirm_after_hold_expired_takes_free_slot(backend):
+    ledger = BookingLedger(backend, hold_ttl=1)
+    assert ledger.confirm("miércoles", "9:00", "a")
+    assert not ledger.confirm("miércoles", "9:00", "b")
@@ -0,0 +1,71 @@
+from langchain_core.documents import Document
+
+from chunking import HEADING_SEPARATOR, markdown_sections, pdf_sections, split_documents
+
+SAMPLE_MD = """# Cuidados del perro
+
+## Vacunación
+
+Los cachorros reciben la primera dosis de la vacuna polivalente entre las seis y ocho semanas de vida.
+Luego se aplican refuerzos cada tres o cuatro semanas hasta completar el esquema, y después uno anual.
+
+**Desparasitación:**
+
+Se recomienda desparasitar cada tres meses, o con más frecuencia si convive con niños.
+
+Alimentación
+------------
+
+Dividir la ración diaria en dos comidas y evitar restos de comida humana.
+
+# Cuidados del gato
+
+## Vacunación
+
+La trivalente felina se aplica desde las ocho semanas.
+"""
+
+
+def test_markdown_sections_follow_headings():
+    sections = markdown_sections(SAMPLE_MD)
+    paths = [path for path, _ in sections]
+
+    assert paths == [
+        ["Cuidados del perro", "Vacunación"],
+        ["Cuidados del perro", "Vacunación", "Desparasitación"],
+        ["Cuidados del perro", "Alimentación"],
+        ["Cuidados del gato", "Vacunación"],
+    ]
+
+
+def test_chunks_carry_heading_path_and_do_not_mix_top_sections():
+    chunks = split_documents([Document(page_content=SAMPLE_MD, metadata={"source": "guia.md"})], ".md")
+
+    assert chunks
+    for chunk in chunks:
+        heading = chunk.metadata["heading_path"]
+        assert chunk.metadata["source"] == "guia.md"
+        assert chunk.page_content.startswith(heading + "\n\n")
+        # Las secciones cortas se agrupan, pero nunca a través de secciones de primer nivel
+        top = heading.split(HEADING_SEPARATOR)[0]
+        other = "Cuidados del gato" if top == "Cuidados del perro" else "Cuidados del perro"
+        assert other not in chunk.page_content
+
+    cat = [c for c in chunks if c.metadata["heading_path"].startswith("Cuidados del gato")]
+    assert len(cat) == 1 and "trivalente" in cat[0].page_content
+
+
+def test_pdf_page_drops_page_numbers_and_detects_sections():
+    page = (
+        "I.- VACUNACIÓN\n\n"
+        "1.- Calendario\n\n"
+        "La primera dosis se aplica a las seis semanas de vida del cachorro.\n\n"
+        "12"
+    )
+    sections = pdf_sections([page])
+
+    assert sections
+    path, text, _ = sections[0]
+    assert path == ["VACUNACIÓN", "Calendario"]
+    assert "seis semanas" in text
+    assert "12" not in text.split()
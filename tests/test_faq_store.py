@@ -0,0 +1,46 @@
+from faq_store import FAQStore, content_words, lexical_score
+
+
+def _store(*questions) -> FAQStore:
+    return FAQStore({"entries": [
+        {"question": q, "answer": f"respuesta: {q}", "source": "curated", "vetted": True} for q in questions
+    ]})
+
+
+def test_same_question_for_another_species_is_not_served():
+    dog = "¿Cada cuánto tiempo debo vacunar a mi perro contra la rabia?"
+    cat = "¿Cada cuánto tiempo debo vacunar a mi gato contra la rabia?"
+    # El solapamiento léxico por sí solo superaría el umbral
+    assert lexical_score(content_words(dog), content_words(cat)) >= 0.8
+
+    assert _store(dog).lookup(cat, match="lexical") is None
+    entry, score = _store(dog).lookup(dog, match="lexical")
+    assert entry["question"] == dog and score == 1.0
+
+
+def test_species_guard_picks_the_matching_species():
+    dog = "¿Cada cuánto debo desparasitar a mi perro?"
+    rabbit = "¿Cada cuánto debo desparasitar a mi conejo?"
+    assert _store(dog).lookup(rabbit, match="lexical") is None
+
+    entry, _ = _store(dog, rabbit).lookup(rabbit, match="lexical")
+    assert entry["question"] == rabbit
+
+
+def test_questions_without_species_only_match_general_faqs():
+    general = "¿Qué deberes impone la ley de tenencia responsable?"
+    store = _store(general, "¿Qué deberes impone la ley de tenencia responsable a dueños de perros?")
+    entry, _ = store.lookup("¿Qué deberes impone la ley de tenencia responsable?", match="lexical")
+    assert entry["question"] == general
+
+
+def test_rag_looks_up_faq_with_the_raw_user_question(monkeypatch):
+    import faq_store
+    from rag_agent import build_rag
+
+    question = "¿Cada cuánto tiempo debo vacunar a mi perro contra la rabia?"
+    monkeypatch.setattr(faq_store, "_store", _store(question))
+    run_rag = build_rag()
+
+    enriched = f"{question} (en contexto de rabia en mascotas)"
+    assert run_rag(enriched, faq_question=question).content == f"respuesta: {question}"
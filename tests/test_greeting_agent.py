@@ -0,0 +1,42 @@
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from greeting_agent import GREETING_TEMPLATES, create_greeting_agent, needs_llm
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("hola", False),
+    ("Buenas tardes!", False),
+    ("hola, ¿cómo estás?", False),
+    ("buenos días, qué tal", False),
+    ("hola, ¿atienden gatos?", True),
+    ("hola atienden gatos", True),
+    ("Hola! Quiero saber los horarios", True),
+    ("hola tengo una duda sobre vacunas", True),
+])
+def test_needs_llm(query, expected):
+    assert needs_llm(query) is expected
+
+
+def test_plain_greeting_uses_templates_without_the_model():
+    def fail(prompt):
+        raise AssertionError("un saludo simple no debe llamar al modelo")
+
+    agent = create_greeting_agent(llm=RunnableLambda(fail))
+    assert agent("hola") in GREETING_TEMPLATES
+
+
+def test_greeting_with_question_asks_the_model_to_answer_it():
+    prompts = []
+
+    def model(prompt):
+        prompts.append(prompt.to_messages())
+        return AIMessage(content="Sí, atendemos gatos.")
+
+    agent = create_greeting_agent(llm=RunnableLambda(model))
+    assert agent("hola atienden gatos") == "Sí, atendemos gatos."
+
+    system, human = prompts[0]
+    assert "Responde primero su pregunta" in system.content
+    assert "hola atienden gatos" in human.content
@@ -0,0 +1,102 @@
+import time
+import asyncio
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from history_manager import (
+    MAX_HISTORY_TOKENS,
+    count_message_tokens,
+    create_history_manager,
+    deserialize_messages,
+    is_summary_message,
+    serialize_messages,
+)
+
+
+def _turns(n: int, start: int = 0) -> list:
+    messages = []
+    for i in range(start, start + n):
+        messages.append(HumanMessage(content=f"pregunta {i} sobre vacunas"))
+        messages.append(AIMessage(content=f"respuesta {i}"))
+    return messages
+
+
+def _wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def test_compact_bounds_window_and_tokens():
+    compact = create_history_manager(max_messages=6, summarizer=lambda previous, messages: "resumen")
+    history = []
+    for i in range(30):
+        history.extend(_turns(1, start=i))
+        compact(history)
+        assert len(history) <= 7
+    assert is_summary_message(history[0])
+    assert history[-1].content == "respuesta 29"
+
+    long_history = [HumanMessage(content="palabra " * 3000), AIMessage(content="ok")]
+    compact(long_history)
+    assert count_message_tokens(long_history[1:]) <= MAX_HISTORY_TOKENS
+
+
+def test_refresh_reaches_a_copy_saved_before_it_finished():
+    compact = create_history_manager(max_messages=4, summarizer=lambda previous, messages: "resumen del modelo")
+    history = compact(_turns(4))
+    # El historial se guarda antes de que termine el refresco en segundo plano
+    saved = serialize_messages(history)
+
+    assert _wait_for(lambda: deserialize_messages(saved)[0].additional_kwargs["summary_text"] == "resumen del modelo")
+    assert deserialize_messages(saved)[0].content.endswith("resumen del modelo")
+
+
+def test_server_session_store_keeps_llm_summary():
+    from server import FlowService
+    from state_backends import SessionStore
+
+    service = FlowService(workers=1, orchestrator="traditional")
+
+    async def run():
+        for i in range(10):
+            await service.chat("summary-test", f"¿Qué vacunas necesita mi perro número {i}?")
+
+    asyncio.run(run())
+
+    def load():
+        return deserialize_messages(SessionStore().load("summary-test")["history"])
+
+    def refreshed():
+        state = load()[0].additional_kwargs
+        return state["folded"] == state["batches"]
+
+    assert _wait_for(refreshed)
+    summary = load()[0]
+    assert is_summary_message(summary)
+    assert summary.additional_kwargs["summary_text"].startswith("Resumen simulado")
+    assert "Resumen simulado" in summary.content
+
+
+def test_graph_checkpoint_picks_up_refreshed_summary():
+    from graph_flow import create_graph_session, drop_session, get_compiled_graph
+
+    flow = create_graph_session("graph-summary-test")
+    config = {"configurable": {"thread_id": "graph-summary-test"}}
+    try:
+        for i in range(8):
+            flow(f"¿Qué vacunas necesita mi perro número {i}?")
+
+        def checkpoint_summary():
+            return get_compiled_graph().get_state(config).values["chat_history"][0]
+
+        assert _wait_for(lambda: deserialize_messages(serialize_messages([checkpoint_summary()]))[0]
+                         .additional_kwargs["summary_text"].startswith("Resumen simulado"))
+        # El turno siguiente guarda el resumen refrescado en el checkpoint
+        flow("gracias")
+        assert checkpoint_summary().additional_kwargs["summary_text"].startswith("Resumen simulado")
+    finally:
+        drop_session("graph-summary-test")
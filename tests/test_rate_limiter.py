@@ -0,0 +1,144 @@
+import time
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import rate_limiter
+from rate_limiter import RateLimiter, RateLimitedEmbeddings, rate_limited
+
+
+class _Response:
+    def __init__(self, status_code: int, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after: str = None):
+        super().__init__("429 Too Many Requests")
+        self.status_code = 429
+        self.response = _Response(429, {"retry-after": retry_after} if retry_after else {})
+
+
+class InternalServerError(Exception):
+    status_code = 500
+
+
+class _Flaky:
+    """Falla las primeras `failures` llamadas con `error()` y luego retorna `value`."""
+
+    def __init__(self, failures: int, error, value="ok"):
+        self.failures, self.error, self.value, self.calls = failures, error, value, 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error()
+        return self.value
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "BACKOFF_BASE_S", 0.01)
+
+
+def test_429_pauses_the_limiter_halves_concurrency_and_retries():
+    limiter = RateLimiter("test-429", rpm=0, tpm=0, max_concurrency=8)
+    fn = _Flaky(1, lambda: RateLimitError(retry_after="0.2"))
+
+    start = time.monotonic()
+    assert limiter.call(fn, tokens=10) == "ok"
+
+    assert fn.calls == 2
+    # El reintento esperó el Retry-After antes de volver a salir de la cola
+    assert time.monotonic() - start >= 0.2
+    assert limiter.limit < 5
+
+
+def test_server_errors_are_retried_without_touching_the_limit():
+    limiter = RateLimiter("test-5xx", rpm=0, tpm=0, max_concurrency=8)
+    fn = _Flaky(2, InternalServerError)
+    assert limiter.call(fn, tokens=10) == "ok"
+    assert fn.calls == 3
+    assert limiter.limit == 8
+
+
+def test_client_errors_are_not_retried():
+    limiter = RateLimiter("test-4xx", rpm=0, tpm=0)
+    fn = _Flaky(1, lambda: ValueError("400 Bad Request"))
+    with pytest.raises(ValueError):
+        limiter.call(fn, tokens=10)
+    assert fn.calls == 1
+
+
+class _FlakyEmbeddings(Embeddings):
+    model = "test-embeddings"
+
+    def __init__(self):
+        self.fail = _Flaky(1, RateLimitError, value=None)
+
+    def embed_documents(self, texts):
+        self.fail()
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_ingestion_uses_the_shared_limiter_once(monkeypatch, tmp_path):
+    from embedding_pipeline import embed_corpus_batches
+
+    limiter = RateLimiter("test-ingest", rpm=0, tpm=0, max_concurrency=8)
+    monkeypatch.setattr(rate_limiter, "get_limiter", lambda model: limiter)
+    embeddings = RateLimitedEmbeddings(_FlakyEmbeddings())
+
+    chunks = [Document(page_content=f"chunk {i}") for i in range(3)]
+    [(embedded, vectors)] = embed_corpus_batches([chunks], embeddings, checkpoint_dir=tmp_path, concurrency=1)
+
+    assert embedded == chunks
+    assert np.asarray(vectors).shape == (3, 2)
+    # Un solo 429 reduce el límite compartido una sola vez
+    assert 4 <= limiter.limit < 5
+
+
+class _AsyncModel(BaseChatModel):
+    model_name: str = "test-async"
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "test-async"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise AssertionError("la llamada async no debe pasar por _generate")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RateLimitError()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+def test_async_calls_go_through_the_limiter(monkeypatch):
+    limiter = RateLimiter("test-async", rpm=0, tpm=0, max_concurrency=8)
+    monkeypatch.setattr(rate_limiter, "get_limiter", lambda model: limiter)
+    model = rate_limited(_AsyncModel)()
+
+    assert asyncio.run(model.ainvoke([HumanMessage(content="hola")])).content == "ok"
+    assert model.calls == 2
+    assert limiter.limit < 5
+
+
+def test_default_async_and_streaming_are_not_wrapped():
+    from fake_models import FakeChatModel
+
+    limited = rate_limited(FakeChatModel)
+    # Las versiones por defecto delegan en _generate, que ya pasa por el limitador
+    for name in ("_agenerate", "_stream", "_astream"):
+        assert getattr(limited, name) is getattr(BaseChatModel, name)
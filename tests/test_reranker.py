@@ -0,0 +1,41 @@
+from langchain_core.documents import Document
+
+from reranker import LexicalReranker, NoReranker, get_reranker
+
+
+def _doc(text, heading=""):
+    return Document(page_content=text, metadata={"heading_path": heading})
+
+
+DOCS = [
+    _doc("Consejos generales para el baño del gato y el cepillado del pelo.", "Higiene"),
+    _doc("Paseos diarios y juego para reducir la ansiedad.", "Conducta"),
+    _doc("El calendario de vacunación del perro empieza a las seis semanas; la vacuna antirrábica es anual.",
+         "Perros > Vacunación"),
+]
+
+
+def test_lexical_promotes_matching_document():
+    ranked = LexicalReranker().rerank("¿Cuándo vacunar a mi perro?", DOCS, top_n=2)
+
+    assert ranked[0] is DOCS[2]
+    assert len(ranked) == 2
+
+
+def test_lexical_keeps_vector_order_without_matches():
+    ranked = LexicalReranker().rerank("xyz", DOCS, top_n=3)
+
+    assert ranked == DOCS
+
+
+def test_heading_match_breaks_ties():
+    docs = [_doc("vacuna anual", "Gatos"), _doc("vacuna anual", "Perros > Vacunación")]
+    scores = LexicalReranker().scores("vacunación", docs)
+
+    assert scores[1] > scores[0]
+
+
+def test_get_reranker_by_name():
+    assert isinstance(get_reranker("none"), NoReranker)
+    assert get_reranker("none").rerank("q", DOCS, top_n=1) == DOCS[:1]
+    assert isinstance(get_reranker("lexical"), LexicalReranker)
@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+from server import FlowService, create_app
+
+
+def test_websocket_rejects_malformed_payloads_without_closing():
+    app = create_app(FlowService(workers=1))
+    with TestClient(app) as client, client.websocket_connect("/ws/ws-test") as ws:
+        for payload in ('{"message": 5}', '["hola"]', '{"text": "hola"}'):
+            ws.send_text(payload)
+            assert "Formato inválido" in ws.receive_json()["error"]
+
+        ws.send_text('{"message": "   "}')
+        assert ws.receive_json()["error"] == "Mensaje vacío"
+
+        # La conexión sigue abierta y atiende el siguiente turno
+        ws.send_text('{"message": "hola"}')
+        reply = ws.receive_json()
+        assert reply["session_id"] == "ws-test"
+        assert reply["response"]
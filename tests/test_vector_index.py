@@ -0,0 +1,63 @@
+import numpy as np
+
+from vector_index import build_vectorstore_streaming, create_faiss_index
+
+
+def _batches(vectors, size):
+    for start in range(0, len(vectors), size):
+        block = vectors[start:start + size]
+        yield [f"chunk {start + i}" for i in range(len(block))], block
+
+
+def test_flat_adds_each_batch_without_buffering(monkeypatch):
+    import vector_index
+
+    def fail(*args, **kwargs):
+        raise AssertionError("flat no debería pasar por la muestra de entrenamiento")
+
+    monkeypatch.setattr(vector_index, "create_faiss_index", fail)
+    vectors = np.random.default_rng(0).random((30, 8), dtype=np.float32)
+
+    vectordb, config = build_vectorstore_streaming(_batches(vectors, 10), None, "flat", train_size=1000)
+
+    assert config["index_type"] == "flat"
+    assert vectordb.index.ntotal == 30
+
+
+def test_ivf_trains_on_sample_then_adds_rest():
+    vectors = np.random.default_rng(1).random((400, 8), dtype=np.float32)
+
+    vectordb, config = build_vectorstore_streaming(_batches(vectors, 50), None, "ivf_flat", train_size=100)
+
+    assert config["index_type"] == "ivf_flat"
+    assert vectordb.index.ntotal == 400
+
+
+def test_create_faiss_index_matches_streaming_for_hnsw():
+    vectors = np.random.default_rng(2).random((60, 8), dtype=np.float32)
+    index, actual_type, _ = create_faiss_index(vectors, "hnsw")
+    vectordb, config = build_vectorstore_streaming(_batches(vectors, 20), None, "hnsw")
+
+    assert actual_type == config["index_type"] == "hnsw"
+    assert index.ntotal == vectordb.index.ntotal == 60
+
+
+def test_ivf_records_nlist_capped_by_training_sample():
+    vectors = np.random.default_rng(3).random((2000, 8), dtype=np.float32)
+
+    _, config = build_vectorstore_streaming(_batches(vectors, 100), None, "ivf_flat", train_size=200)
+
+    params = config["params"]
+    assert params["train_size"] == 200
+    assert params["nlist"] == 200 // 39
+    assert params["nlist_target"] == int(4 * np.sqrt(2000))
+
+
+def test_ivf_nlist_sized_from_expected_total():
+    from vector_index import ivf_nlist
+
+    assert ivf_nlist(100_000) == (int(4 * np.sqrt(100_000)),) * 2
+    # La muestra limita lo que se puede entrenar, pero el objetivo es el corpus
+    nlist, target = ivf_nlist(50_000, expected_total=4_000_000)
+    assert target == 8000
+    assert nlist == 50_000 // 39